@@ -0,0 +1,84 @@
+"""Measures how long importing tin takes, with python -X importtime
+
+Run from the repository root:
+
+    python bench/importtime.py [--module tin.api] [--runs 5] [--max-ms 50]
+
+Prints the cumulative import time of the module, the slowest imports it pulls in,
+and fails if it imports any of the modules tin defers until first use, or takes
+longer than --max-ms.
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+
+# Imported by tin only when first needed
+DEFERRED = ["requests", "urllib3", "yaml", "simplejson", "deepmerge"]
+
+
+def importtime(module):
+    """Imports module in a fresh interpreter
+
+    Returns:
+        list: (module name, self us, cumulative us) tuples, in import order
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import {}".format(module)],
+        capture_output=True,
+        text=True,
+        check=True,
+        cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    )
+
+    imports = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:") :].split("|")
+        imports.append((name.strip(), int(self_us), int(cumulative_us)))
+    return imports
+
+
+def deferred_imports(imports):
+    """Returns the deferred modules, or their submodules, that were imported"""
+    return sorted(
+        name
+        for name, _, _ in imports
+        if any(name == d or name.startswith(d + ".") for d in DEFERRED)
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--module", default="tin.api")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=10)
+    parser.add_argument("--max-ms", type=float, default=None)
+    args = parser.parse_args()
+
+    # The fastest run is the least disturbed by everything else on the machine
+    runs = [importtime(args.module) for i in range(args.runs)]
+    best = min(runs, key=lambda imports: imports[-1][2])
+    total_ms = best[-1][2] / 1000
+
+    print("import {}: {:.1f} ms (best of {})".format(args.module, total_ms, args.runs))
+    print("Slowest imports, by self time:")
+    for name, self_us, cumulative_us in sorted(best, key=lambda i: -i[1])[: args.top]:
+        print("  {:>8.1f} ms  {}".format(self_us / 1000, name))
+
+    failed = False
+    deferred = deferred_imports(best)
+    if deferred:
+        print("Imported modules that should be deferred: {}".format(deferred))
+        failed = True
+    if args.max_ms is not None and total_ms > args.max_ms:
+        print("Slower than {} ms".format(args.max_ms))
+        failed = True
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
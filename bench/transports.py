@@ -0,0 +1,144 @@
+"""Compares the time tin's transports take per call, against a local HTTP server
+
+Run from the repository root:
+
+    python bench/transports.py [--calls 2000] [--runs 5] [--transport urllib3]
+
+Calls a method answering with a small JSON list, over keep-alive connections, and
+prints the best run's wall and CPU time per call for each transport. The server
+runs in a child process, so its work isn't counted as the client's CPU time. It
+speaks plain HTTP/1.1, so the http2 transport is timed over HTTP/1.1 too, and is
+skipped if httpx isn't installed.
+"""
+
+import argparse
+import http.server
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tin.api import TinApi  # noqa: E402
+from tin.exceptions import TinError  # noqa: E402
+from tin.transports import TRANSPORTS  # noqa: E402
+
+BODY = b'[{"id": 1, "name": "one"}, {"id": 2, "name": "two"}]'
+
+API = """---
+things:
+  methods:
+    list:
+      method: GET
+      path: /things
+"""
+
+CONFIG = """---
+host: 127.0.0.1
+scheme: http
+port: {port}
+basepath: /api
+auth_type: basic
+credentials: '{{"username": "bench", "password": "bench"}}'
+api_file: {api_file}
+transport: {transport}
+headers:
+  x-bench: "yes"
+default_params:
+  per_page: 100
+"""
+
+
+class Handler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Sent in one write, so delayed ACKs don't stall every call
+    wbufsize = -1
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(BODY)))
+        self.end_headers()
+        self.wfile.write(BODY)
+
+    def log_message(self, *args):
+        pass
+
+
+def serve(ready):
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    ready.put(server.server_address[1])
+    server.serve_forever()
+
+
+def api_for(transport, port, workdir):
+    api_file = os.path.join(workdir, "api.yml")
+    with open(api_file, "w") as fh:
+        fh.write(API)
+    config_file = os.path.join(workdir, "{}.yml".format(transport))
+    with open(config_file, "w") as fh:
+        fh.write(CONFIG.format(port=port, api_file=api_file, transport=transport))
+    return TinApi(config_file=config_file)
+
+
+def timed(method, calls):
+    """Makes calls, returning the wall and CPU seconds they took"""
+    wall = time.perf_counter()
+    cpu = time.process_time()
+    for _ in range(calls):
+        method()
+    return time.perf_counter() - wall, time.process_time() - cpu
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--calls", type=int, default=2000)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument(
+        "--transport",
+        action="append",
+        choices=sorted(TRANSPORTS),
+        help="A transport to time, may be repeated. Defaults to all of them.",
+    )
+    args = parser.parse_args()
+
+    ready = multiprocessing.Queue()
+    server = multiprocessing.Process(target=serve, args=(ready,), daemon=True)
+    server.start()
+    port = ready.get(timeout=10)
+
+    results = {}
+    try:
+        with tempfile.TemporaryDirectory() as workdir:
+            for transport in args.transport or sorted(TRANSPORTS):
+                try:
+                    method = api_for(transport, port, workdir).things.list
+                except TinError as e:
+                    print("Skipping {}: {}".format(transport, e))
+                    continue
+                # Connects, and builds anything built on first use
+                timed(method, 10)
+                runs = [timed(method, args.calls) for _ in range(args.runs)]
+                results[transport] = min(runs)
+    finally:
+        server.terminate()
+
+    baseline = results.get("requests", None)
+    print("{} calls, best of {}".format(args.calls, args.runs))
+    for transport, (wall, cpu) in results.items():
+        line = "  {:<10} {:>8.1f} us/call  {:>8.1f} us CPU/call".format(
+            transport, wall / args.calls * 1e6, cpu / args.calls * 1e6
+        )
+        if baseline and transport != "requests":
+            line += "  {:.2f}x requests".format(baseline[0] / wall)
+        print(line)
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
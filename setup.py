@@ -32,5 +32,7 @@ setup(
         "simplejson~=3.17.2",
         "pyyaml>=5.4",
         "deepmerge~=0.3.0",
-    ]
+    ],
+    extras_require={"http2": ["httpx[http2]>=0.23"]},
+    entry_points={"console_scripts": ["tin=tin.cli:main"]},
 )
@@ -1,7 +1,10 @@
 from tin.api import TinApi
 from tin.auth import HTTPGenericHeaderAuth, HTTPGenericParameterAuth
+import json
+import os
 import pytest
 import requests
+import threading
 
 
 @pytest.mark.parametrize(
@@ -69,6 +72,17 @@ def test_set_headers():
     assert myapi.headers == {"otherheader": "differentvalue"}
 
 
+def test_set_headers_after_methods_built():
+    myapi = TinApi(config_file="test/data/api/testservice.yml", environment="basic")
+    built = myapi.hasmethods.list
+    myapi.set_headers({"X-Tenant": "t1"})
+
+    # Methods keep the headers the API was built with, whenever they're built
+    assert "X-Tenant" not in built.headers
+    assert "X-Tenant" not in myapi.payloads.upload.headers
+    assert myapi.payloads.upload.headers["someheader"] == "somevalue"
+
+
 def test_method_headers():
     myapi = TinApi(config_file="test/data/api/testservice.yml", environment="basic")
 
@@ -108,3 +122,85 @@ def test_set_auth():
     fakeauth = object()
     myapi.set_auth(fakeauth)
     assert myapi.auth is fakeauth
+
+
+def in_child(func):
+    """Runs func in a forked child, returning what it returns"""
+    read_fd, write_fd = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.close(read_fd)
+        try:
+            os.write(write_fd, json.dumps(func()).encode())
+        finally:
+            os._exit(0)
+    os.close(write_fd)
+    with os.fdopen(read_fd) as fh:
+        result = fh.read()
+    os.waitpid(pid, 0)
+    return json.loads(result)
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="Needs os.fork")
+def test_new_session_after_fork():
+    myapi = TinApi(config_file="test/data/api/testservice.yml", environment="basic")
+    parent_session = myapi.request
+    parent_session.cookies.set("flavour", "oat")
+
+    def check():
+        return [
+            myapi.request is not parent_session,
+            type(myapi.request) is requests.Session,
+            myapi.request.cookies.get("flavour"),
+        ]
+
+    assert in_child(check) == [True, True, "oat"]
+    # The parent keeps its own
+    assert myapi.request is parent_session
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="Needs os.fork")
+def test_no_session_after_fork():
+    myapi = TinApi(
+        config_file="test/data/api/testservice.yml", environment="no_session"
+    )
+
+    assert in_child(lambda: myapi.request is requests) is True
+
+
+def test_classes_built_on_access():
+    myapi = TinApi(config_file="test/data/api/testservice.yml", environment="basic")
+    assert "container" not in myapi.__dict__
+
+    subcontainer = myapi.container.subcontainer
+    assert "container" in myapi.__dict__
+    assert subcontainer.list.obj_path == "testservice.container.subcontainer.list"
+    # Siblings are left alone
+    assert "hasmethods" not in myapi.__dict__
+    assert myapi.container.subcontainer is subcontainer
+
+    with pytest.raises(AttributeError):
+        myapi.nothere
+
+
+def test_classes_listed_in_order():
+    myapi = TinApi(config_file="test/data/api/testservice.yml", environment="basic")
+    myapi.paginated
+    names = [cls.basename() for cls in myapi.classes()]
+    assert names == list(myapi.conf.apidata.keys())
+
+
+def test_classes_built_once_across_threads():
+    myapi = TinApi(config_file="test/data/api/testservice.yml", environment="basic")
+    found = []
+    threads = [
+        threading.Thread(target=lambda: found.append(myapi.hasmethods))
+        for i in range(8)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(found) == 8
+    assert all(cls is found[0] for cls in found)
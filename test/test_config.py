@@ -1,7 +1,19 @@
+import copy
 import os
+import pickle
 import pytest
-
-from tin.config import TinConfig
+import shutil
+import yaml
+
+from tin.config import (
+    TinConfig,
+    TinReadOnlyDict,
+    TinReadOnlyList,
+    SafeLoader,
+    SUPPORTED_ENCODINGS,
+    env_overlay,
+    readonly,
+)
 from tin.exceptions import TinError, TinConfigNotFound
 
 
@@ -450,3 +462,283 @@ class TestEnvBasedConfigs:
     def test_get(self, config):
         assert config.get("host") == "localhost"
         assert config.get("doesntexist") is None
+
+
+def test_accept_encoding():
+    clear_env()
+    ac = TinConfig("test/data/api/testservice.yml", "accept_encoding")
+    accepted = ac.headers["Accept-Encoding"].split(", ")
+
+    assert accepted[0] == "gzip"
+    assert "nonsense" not in accepted
+    for encoding in ["br", "zstd"]:
+        assert (encoding in accepted) is (encoding in SUPPORTED_ENCODINGS)
+
+
+def test_no_accept_encoding():
+    clear_env()
+    ac = TinConfig("test/data/api/testservice.yml", "basic")
+    assert "Accept-Encoding" not in ac.headers
+
+
+@pytest.fixture
+def config_copy(tmp_path):
+    """A copy of the test service config that can be changed"""
+    for name in [
+        "testservice.yml",
+        "testservice-api.yml",
+        "testservice-models.yml",
+        "credentials.yml",
+    ]:
+        shutil.copy(os.path.join("test/data/api", name), tmp_path / name)
+    return tmp_path
+
+
+def count_loads(monkeypatch):
+    loaded = []
+    loadfile = TinConfig._loadfile
+
+    def counting_loadfile(self, filepath):
+        loaded.append(os.path.basename(filepath))
+        return loadfile(self, filepath)
+
+    monkeypatch.setattr(TinConfig, "_loadfile", counting_loadfile)
+    return loaded
+
+
+def test_cached_config(config_copy, tmp_path, monkeypatch):
+    clear_env()
+    cache_dir = str(tmp_path / "cache")
+    config_file = str(config_copy / "testservice.yml")
+
+    uncached = TinConfig(config_file, "basic")
+    first = TinConfig(config_file, "basic", cache_dir=cache_dir)
+    assert len(os.listdir(cache_dir)) == 1
+
+    loaded = count_loads(monkeypatch)
+    cached = TinConfig(config_file, "basic", cache_dir=cache_dir)
+    # Only the credentials are loaded again
+    assert loaded == ["credentials.yml"]
+
+    for conf in [first, cached]:
+        assert conf.api_name == uncached.api_name
+        assert conf.apidata == uncached.apidata
+        assert conf.models == uncached.models
+        assert conf.headers == uncached.headers
+        assert conf._api_config == uncached._api_config
+        assert conf.credentials == {"username": "fakeuser", "password": "fakepassword"}
+
+    # Credentials are never written to the cache
+    with open(os.path.join(cache_dir, os.listdir(cache_dir)[0]), "rb") as fh:
+        assert b"fakepassword" not in fh.read()
+
+
+def test_cached_config_file_changed(config_copy, tmp_path):
+    clear_env()
+    cache_dir = str(tmp_path / "cache")
+    config_file = str(config_copy / "testservice.yml")
+    TinConfig(config_file, "basic", cache_dir=cache_dir)
+
+    api_file = config_copy / "testservice-api.yml"
+    with open(api_file, "a") as fh:
+        fh.write("added:\n  methods:\n    get:\n      method: GET\n      path: /a\n")
+
+    assert "added" in TinConfig(config_file, "basic", cache_dir=cache_dir).apidata
+
+
+def test_cached_config_env_vars(config_copy, tmp_path):
+    clear_env()
+    cache_dir = str(tmp_path / "cache")
+    config_file = str(config_copy / "testservice.yml")
+    TinConfig(config_file, "basic", cache_dir=cache_dir)
+
+    os.environ["TIN__ENVIRONMENTS__BASIC__HOST"] = "elsewhere"
+    assert TinConfig(config_file, "basic", cache_dir=cache_dir).host == "elsewhere"
+    assert len(os.listdir(cache_dir)) == 2
+    clear_env()
+    assert TinConfig(config_file, "basic", cache_dir=cache_dir).host == "localhost"
+
+
+def test_cached_config_from_env(config_copy, tmp_path, monkeypatch):
+    clear_env()
+    cache_dir = str(tmp_path / "cache")
+    os.environ["TIN_CACHE_DIR"] = cache_dir
+    os.environ["TIN_CONFIG"] = str(config_copy / "testservice.yml")
+    os.environ["TIN_ENV"] = "basic"
+    TinConfig()
+
+    loaded = count_loads(monkeypatch)
+    assert TinConfig().api_name == "testservice"
+    assert loaded == ["credentials.yml"]
+    clear_env()
+
+
+def test_cached_config_inline_credentials(config_copy, tmp_path):
+    clear_env()
+    cache_dir = str(tmp_path / "cache")
+    os.environ["TIN__ENVIRONMENTS__BASIC__CREDENTIALS"] = '{"username": "inline"}'
+
+    conf = TinConfig(str(config_copy / "testservice.yml"), "basic", cache_dir=cache_dir)
+    assert conf.credentials == {"username": "inline"}
+    assert not os.path.exists(cache_dir)
+    clear_env()
+
+
+def test_cached_config_unreadable(config_copy, tmp_path):
+    clear_env()
+    cache_dir = tmp_path / "cache"
+    config_file = str(config_copy / "testservice.yml")
+    TinConfig(config_file, "basic", cache_dir=str(cache_dir))
+
+    cached = cache_dir / os.listdir(cache_dir)[0]
+    cached.write_bytes(b"not a pickle")
+
+    assert TinConfig(config_file, "basic", cache_dir=str(cache_dir)).apidata
+
+
+def test_cached_config_writable_by_others(config_copy, tmp_path, monkeypatch):
+    clear_env()
+    cache_dir = tmp_path / "cache"
+    config_file = str(config_copy / "testservice.yml")
+    TinConfig(config_file, "basic", cache_dir=str(cache_dir))
+    cached = cache_dir / os.listdir(cache_dir)[0]
+    assert cached.stat().st_mode & 0o777 == 0o600
+
+    # Neither the file nor the directory may be writable by anyone else
+    for path, mode in [(cached, 0o620), (cache_dir, 0o707)]:
+        old_mode = path.stat().st_mode
+        path.chmod(mode)
+        loaded = count_loads(monkeypatch)
+        TinConfig(config_file, "basic", cache_dir=str(cache_dir))
+        assert "testservice.yml" in loaded
+        path.chmod(old_mode)
+
+    loaded = count_loads(monkeypatch)
+    TinConfig(config_file, "basic", cache_dir=str(cache_dir))
+    assert loaded == ["credentials.yml"]
+
+
+def test_spec_files_shared():
+    clear_env()
+    basic = TinConfig("test/data/api/testservice.yml", "basic")
+    param = TinConfig("test/data/api/testservice.yml", "param")
+
+    # Parsed once, for every config in the process
+    assert basic.apidata is param.apidata
+    assert basic.models is param.models
+    assert type(basic.apidata) is TinReadOnlyDict
+
+
+def test_spec_files_read_only():
+    conf = arg_config_yml()
+
+    with pytest.raises(TypeError):
+        conf.apidata["new"] = {}
+    with pytest.raises(TypeError):
+        conf.apidata["hasmethods"].update({"model": "other"})
+    with pytest.raises(TypeError):
+        conf.apidata.pop("hasmethods")
+
+    methods = conf.apidata["hasmethods"]["methods"]
+    assert copy.deepcopy(methods) is methods
+    assert pickle.loads(pickle.dumps(methods)) == methods
+
+
+def test_spec_file_changed(config_copy):
+    clear_env()
+    config_file = str(config_copy / "testservice.yml")
+    before = TinConfig(config_file, "basic").apidata
+
+    with open(config_copy / "testservice-api.yml", "a") as fh:
+        fh.write("added:\n  methods:\n    get:\n      method: GET\n      path: /a\n")
+
+    after = TinConfig(config_file, "basic").apidata
+    assert "added" in after
+    assert "added" not in before
+
+
+def test_readonly():
+    data = readonly({"a": [1, {"b": 2}], "c": "d"})
+    assert data == {"a": [1, {"b": 2}], "c": "d"}
+    assert type(data["a"]) is TinReadOnlyList
+    assert type(data["a"][1]) is TinReadOnlyDict
+
+    with pytest.raises(TypeError):
+        data["a"].append(3)
+    with pytest.raises(TypeError):
+        data["a"][1]["b"] = 3
+
+
+@pytest.mark.skipif(not yaml.__with_libyaml__, reason="Needs libyaml")
+def test_libyaml_loader():
+    assert SafeLoader is yaml.CSafeLoader
+
+
+def test_env_overlay():
+    clear_env()
+    os.environ["TIN__ENVIRONMENTS__BASIC__HOST"] = "fakehost"
+    os.environ["TIN__ENVIRONMENTS__BASIC__SSL__VERIFY"] = "false"
+    os.environ["TIN__COMMON__BASEPATH"] = "/v2"
+
+    overlay = env_overlay("TIN")
+    assert overlay == {
+        "common": {"basepath": "/v2"},
+        "environments": {"basic": {"host": "fakehost", "ssl": {"verify": "false"}}},
+    }
+    # Parsed once, until the env vars change
+    assert env_overlay("TIN") is overlay
+
+    os.environ["TIN__ENVIRONMENTS__BASIC__PORT"] = "9000"
+    assert env_overlay("TIN")["environments"]["basic"]["port"] == "9000"
+    clear_env()
+    assert env_overlay("TIN") == {}
+
+
+def test_env_overrides_shared():
+    clear_env()
+    os.environ["TIN__ENVIRONMENTS__BASIC__HEADERS__X-EXTRA"] = "yes"
+    try:
+        first = TinConfig("test/data/api/testservice.yml", "basic")
+        first.config_data["environments"]["basic"]["headers"]["x-extra"] = "changed"
+        second = TinConfig("test/data/api/testservice.yml", "basic")
+    finally:
+        clear_env()
+
+    # Configs don't share the parsed env vars' dicts
+    assert second.headers["x-extra"] == "yes"
+
+
+def test_env_overrides_environment_case(config_copy):
+    clear_env()
+    config_file = str(config_copy / "testservice.yml")
+    with open(config_file) as fh:
+        config = fh.read().replace("  basic:", "  Basic:")
+    with open(config_file, "w") as fh:
+        fh.write(config)
+
+    os.environ["TIN__ENVIRONMENTS__BASIC__HOST"] = "fakehost"
+    # Only a var for exactly this environment applies
+    os.environ["TIN__ENVIRONMENTS__BASICALLY__PORT"] = "9000"
+    try:
+        ac = TinConfig(config_file, "Basic")
+    finally:
+        clear_env()
+
+    assert ac.host == "fakehost"
+    assert ac.port == 5000
+    assert list(ac.config_data["environments"]).count("Basic") == 1
+    assert "basic" not in ac.config_data["environments"]
+
+
+def test_env_ssl_verify_not_shared():
+    clear_env()
+    first = TinConfig("test/data/api/testservice.yml", "basic")
+    os.environ["TIN__ENVIRONMENTS__BASIC__SSL__VERIFY"] = "False"
+    try:
+        second = TinConfig("test/data/api/testservice.yml", "basic")
+    finally:
+        clear_env()
+
+    # Read as a bool, not a CA bundle path, and only by the config it was set for
+    assert second.ssl["verify"] is False
+    assert first.ssl["verify"] is True
@@ -0,0 +1,217 @@
+import importlib.util
+import os
+import pickle
+import pytest
+import shutil
+
+from pytest_httpserver import HTTPServer
+
+from tin.api import TinApi, TinApiMethod
+from tin.cli import main
+from tin.config import TinConfig
+from tin.exceptions import TinError
+from tin.generate import api_class_name, generate, python_name
+
+
+def clear_env():
+    for k in os.environ.keys():
+        if k.startswith("TIN"):
+            os.environ.pop(k)
+
+
+def api_inst(env="basic", config="test/data/api/testservice.yml"):
+    clear_env()
+    # Just a shortcut to keep the repeating text down
+    return TinApi(config_file=config, environment=env)
+
+
+@pytest.fixture(scope="session")
+def httpserver_listen_address():
+    return ("127.0.0.1", 5000)
+
+
+def load_module(path, name="generated_testservice"):
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+@pytest.fixture
+def generated(tmp_path):
+    """A module generated for the test service's basic environment"""
+    clear_env()
+    path = str(tmp_path / "generated_testservice.py")
+    assert (
+        main(["generate", "test/data/api/testservice.yml", "-e", "basic", "-o", path])
+        == 0
+    )
+    return load_module(path)
+
+
+def test_generated_api(generated):
+    testservice = generated.TestserviceApi()
+    reference = api_inst()
+
+    assert isinstance(testservice, TinApi)
+    assert testservice.tree(strings=True) == reference.tree(strings=True)
+    assert testservice.conf._api_config == reference.conf._api_config
+    assert testservice.conf.headers == reference.conf.headers
+    assert testservice.conf.credentials == {
+        "username": "fakeuser",
+        "password": "fakepassword",
+    }
+    assert testservice.paginated.offset.url == reference.paginated.offset.url
+
+    # Built on the module's classes
+    assert isinstance(testservice.hasmethods, generated.testservice_hasmethods)
+    model = testservice.container.subcontainer.model
+    assert issubclass(model, generated.testservice_container_subcontainer_mymodel)
+    assert model.__name__ == "mymodel"
+    assert model.id_attr == "id"
+
+
+def test_generated_method_settings(generated, monkeypatch):
+    reference = api_inst()
+    reference.tree()
+
+    def no_settings(apiobj, method_data):
+        raise AssertionError("settings worked out again")
+
+    monkeypatch.setattr(TinApiMethod, "settings", staticmethod(no_settings))
+    testservice = generated.TestserviceApi()
+    testservice.tree()
+
+    method = testservice.hasmethods.get
+    expected = reference.hasmethods.get
+    assert method.url == expected.url
+    assert method.headers == expected.headers
+    assert method.path_tokens() == expected.path_tokens() == ["id"]
+    assert method.default_params == expected.default_params
+    assert type(method.paginator) is type(expected.paginator)
+
+    # Instances don't share settings that can be changed
+    method.headers["X-Changed"] = "yes"
+    assert "X-Changed" not in generated.TestserviceApi().hasmethods.get.headers
+
+    # With another config, they're worked out again
+    with pytest.raises(AssertionError):
+        generated.TestserviceApi(config=reference.conf).hasmethods
+
+
+def test_generated_api_reads_no_config(generated, monkeypatch):
+    loaded = []
+    loadfile = TinConfig._loadfile
+
+    def counting_loadfile(self, filepath):
+        loaded.append(os.path.basename(filepath))
+        return loadfile(self, filepath)
+
+    monkeypatch.setattr(TinConfig, "_loadfile", counting_loadfile)
+    os.environ["TIN__ENVIRONMENTS__BASIC__HOST"] = "ignored.example.com"
+    try:
+        testservice = generated.TestserviceApi()
+    finally:
+        clear_env()
+
+    # Only the credentials, and env vars are resolved at generation
+    assert loaded == ["credentials.yml"]
+    assert testservice.conf.host == "localhost"
+
+
+def test_generated_api_credentials(generated):
+    testservice = generated.TestserviceApi(credentials={"username": "other"})
+    assert testservice.conf.credentials == {"username": "other"}
+
+    # The module's config isn't changed by an instance
+    testservice.conf.set("host", "changed")
+    assert generated.TestserviceApi().conf.host == "localhost"
+
+    # The API and model data are read-only, and shared by every instance
+    assert testservice.conf.apidata is generated.TestserviceApi().conf.apidata
+    assert testservice.conf.models is generated.TestserviceApi().conf.models
+
+
+def test_generated_api_calls(generated, httpserver: HTTPServer):
+    httpserver.expect_request("/api/stuff/whatnot", method="GET").respond_with_json(
+        {"mymodels": [{"id": 1, "name": "one"}, {"id": 2, "name": "two"}]}
+    )
+    testservice = generated.TestserviceApi()
+
+    things = testservice.container.subcontainer.list()["mymodels"]
+    assert [thing.name for thing in things] == ["one", "two"]
+    assert isinstance(things[0], generated.testservice_container_subcontainer_mymodel)
+
+    loaded = pickle.loads(pickle.dumps(things[0]))
+    assert loaded.id == 1
+
+
+def test_generate_inline_credentials(tmp_path):
+    clear_env()
+    shutil.copy("test/data/api/testservice-api.yml", tmp_path / "api.yml")
+    with open(tmp_path / "inline.yml", "w") as fh:
+        fh.write(
+            "api_name: inline\n"
+            "host: localhost\n"
+            "basepath: /api\n"
+            "api_file: api.yml\n"
+            'credentials: \'{"token": "secret"}\'\n'
+        )
+
+    source = generate(TinConfig(str(tmp_path / "inline.yml")))
+    assert "secret" not in source
+    assert "CREDENTIALS = None" in source
+    assert "class InlineApi(TinApi):" in source
+
+
+def test_generate_line_width():
+    source = generate(api_inst().conf)
+    assert [line for line in source.splitlines() if len(line) > 88] == []
+    short = "        'testservice.paginated.mymodel': testservice_paginated_mymodel,\n"
+    assert short in source
+    assert (
+        "        'testservice.container.subcontainer2.mymodel_otherid': (\n"
+        "            testservice_container_subcontainer2_mymodel_otherid\n"
+        "        ),\n"
+    ) in source
+
+
+def test_generate_no_prewarm(monkeypatch):
+    conf = api_inst().conf
+    conf._api_config["prewarm"] = 2
+
+    def prewarm(self, prewarm):
+        raise AssertionError("prewarmed while generating")
+
+    monkeypatch.setattr(TinApi, "_prewarm", prewarm)
+    source = generate(conf)
+    # Left in the config, for the generated API
+    assert conf.prewarm == 2
+    assert "'prewarm': 2" in source
+
+
+def test_generate_class_name():
+    conf = api_inst().conf
+    assert "class Things(TinApi):" in generate(conf, class_name="Things")
+    with pytest.raises(TinError):
+        generate(conf, class_name="not valid")
+
+
+def test_generate_stdout(capsys):
+    clear_env()
+    assert main(["generate", "test/data/api/testservice.yml", "-e", "basic"]) == 0
+    assert "class TestserviceApi(TinApi):" in capsys.readouterr().out
+
+
+def test_generate_bad_environment(capsys):
+    clear_env()
+    assert main(["generate", "test/data/api/testservice.yml", "-e", "nope"]) == 1
+    assert "nope" in capsys.readouterr().err
+
+
+def test_names():
+    assert python_name("myapi.things.list") == "myapi_things_list"
+    assert python_name("2things") == "_2things"
+    assert python_name("class") == "_class"
+    assert api_class_name("my_service") == "MyServiceApi"
+    assert api_class_name("my-service") == "MyServiceApi"
@@ -0,0 +1,250 @@
+import concurrent.futures
+import http.server
+import json
+import os
+import pytest
+import socket
+import socketserver
+import ssl
+import threading
+import time
+import urllib.parse
+
+pytest.importorskip("httpx")
+h2 = pytest.importorskip("h2")
+
+import h2.config  # noqa: E402
+import h2.connection  # noqa: E402
+import h2.events  # noqa: E402
+
+from tin import pool, transports  # noqa: E402
+from tin.api import TinApi  # noqa: E402
+
+TLS_DIR = os.path.abspath("test/data/tls")
+RECORDS = [{"id": i} for i in range(1, 8)]
+
+
+def clear_env():
+    for k in os.environ.keys():
+        if k.startswith("TIN"):
+            os.environ.pop(k)
+
+
+def answer(method, target, authority, http_version):
+    """The JSON body for a request. Offset pages of RECORDS under /api/paged,
+    anything else echoes the request."""
+    url = urllib.parse.urlsplit(target)
+    args = dict(urllib.parse.parse_qsl(url.query))
+    if url.path == "/api/paged/offset":
+        offset, limit = int(args["offset"]), int(args["limit"])
+        body = {
+            "results": RECORDS[offset : offset + limit],
+            "meta": {"total": len(RECORDS)},
+        }
+    else:
+        body = {
+            "method": method,
+            "path": target,
+            "host": authority,
+            "http": http_version,
+        }
+    return json.dumps(body).encode()
+
+
+class HTTP1Handler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        body = answer("GET", self.path, self.headers["Host"], "1.1")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class Handler(socketserver.BaseRequestHandler):
+    """Speaks HTTP/2 if it was negotiated, and HTTP/1.1 otherwise"""
+
+    def handle(self):
+        if self.request.selected_alpn_protocol() != "h2":
+            HTTP1Handler(self.request, self.client_address, self.server)
+            return
+
+        conn = h2.connection.H2Connection(
+            config=h2.config.H2Configuration(client_side=False, header_encoding="utf-8")
+        )
+        conn.initiate_connection()
+        self.request.sendall(conn.data_to_send())
+
+        requests_seen = {}
+        while True:
+            data = self.request.recv(65535)
+            if not data:
+                break
+            for event in conn.receive_data(data):
+                if isinstance(event, h2.events.RequestReceived):
+                    requests_seen[event.stream_id] = dict(event.headers)
+                elif isinstance(event, h2.events.StreamEnded):
+                    headers = requests_seen.pop(event.stream_id)
+                    body = answer(
+                        headers[":method"], headers[":path"], headers[":authority"], "2"
+                    )
+                    conn.send_headers(
+                        event.stream_id,
+                        [
+                            (":status", "200"),
+                            ("content-type", "application/json"),
+                            ("content-length", str(len(body))),
+                        ],
+                    )
+                    conn.send_data(event.stream_id, body, end_stream=True)
+            self.request.sendall(conn.data_to_send())
+
+
+class Server(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+    accepted = 0
+
+    def get_request(self):
+        request = super().get_request()
+        self.accepted += 1
+        return request
+
+
+def tls_server(alpn):
+    server = Server(("127.0.0.1", 0), Handler)
+    context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+    context.load_cert_chain(
+        os.path.join(TLS_DIR, "server.pem"), os.path.join(TLS_DIR, "server.key")
+    )
+    context.set_alpn_protocols(alpn)
+    server.socket = context.wrap_socket(server.socket, server_side=True)
+
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    pool.reset()
+    return server
+
+
+@pytest.fixture
+def h2_server():
+    server = tls_server(["h2", "http/1.1"])
+    yield server
+    server.shutdown()
+    server.server_close()
+    pool.reset()
+
+
+@pytest.fixture
+def http1_server():
+    server = tls_server(["http/1.1"])
+    yield server
+    server.shutdown()
+    server.server_close()
+    pool.reset()
+
+
+def h2_api(server, env="basic", port=None):
+    clear_env()
+    prefix = "TIN__ENVIRONMENTS__{}__".format(env.upper())
+    os.environ[prefix + "TRANSPORT"] = "http2"
+    os.environ[prefix + "SCHEME"] = "https"
+    os.environ[prefix + "PORT"] = str(port or server.server_address[1])
+    os.environ[prefix + "SSL__VERIFY"] = os.path.join(TLS_DIR, "ca.pem")
+    try:
+        return TinApi(config_file="test/data/api/testservice.yml", environment=env)
+    finally:
+        clear_env()
+
+
+def test_http2(h2_server):
+    testservice = h2_api(h2_server)
+    assert type(testservice.transport) is transports.HTTP2Transport
+
+    response = testservice.hasmethods.list()
+    assert response == {
+        "method": "GET",
+        "path": "/api/things?thing=stuff",
+        "host": "localhost:{}".format(h2_server.server_address[1]),
+        "http": "2",
+    }
+    assert response.response.raw.http_version == "HTTP/2"
+    assert response.response.headers["content-type"] == "application/json"
+
+
+def test_http2_param_auth(h2_server):
+    response = h2_api(h2_server, "param").hasmethods.list()
+    assert response["path"] == (
+        "/api/things?thing=stuff&username=fakeuser&password=fakepassword"
+    )
+
+
+def test_http1_fallback(http1_server):
+    response = h2_api(http1_server).hasmethods.list()
+    assert response["http"] == "1.1"
+    assert response.response.raw.http_version == "HTTP/1.1"
+
+
+def test_http2_parallel_pages(h2_server):
+    testservice = h2_api(h2_server)
+
+    response = testservice.paginated.offset_total(nomodel=True, parallel_pages=4)
+    assert [r["id"] for r in response["results"]] == list(range(1, 8))
+    # Every page over one connection
+    assert h2_server.accepted == 1
+
+
+def test_http2_fan_out(h2_server):
+    testservice = h2_api(h2_server)
+    # Connected first, so the calls below find the connection to share
+    testservice.hasmethods.list()
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=8) as executor:
+        results = list(executor.map(lambda i: testservice.hasmethods.get(i), range(16)))
+
+    assert [r["path"] for r in results] == [
+        "/api/things/{}?thing=stuff".format(i) for i in range(16)
+    ]
+    assert h2_server.accepted == 1
+
+
+def test_http2_slow_origin(h2_server):
+    testservice = h2_api(h2_server)
+    testservice.hasmethods.list()
+
+    # Takes connections, but never answers the TLS handshake
+    stalled = socket.socket()
+    stalled.bind(("127.0.0.1", 0))
+    stalled.listen()
+    stalled_api = h2_api(h2_server, port=stalled.getsockname()[1])
+    client = testservice.transport._http2_client()
+    assert stalled_api.transport._http2_client() is client
+
+    executor = concurrent.futures.ThreadPoolExecutor(max_workers=2)
+    try:
+        stuck = executor.submit(stalled_api.hasmethods.list)
+        time.sleep(0.2)
+        assert not stuck.done()
+
+        # Calls to other origins aren't held up by it
+        response = executor.submit(testservice.hasmethods.list).result(timeout=5)
+        assert response["http"] == "2"
+    finally:
+        # Which fails the stalled call
+        stalled.close()
+        executor.shutdown(wait=True)
+
+
+def test_http2_shared(h2_server):
+    basic = h2_api(h2_server)
+    header = h2_api(h2_server, "header")
+
+    assert basic.transport._http2_client() is header.transport._http2_client()
+    basic.hasmethods.list()
+    header.hasmethods.list()
+    assert h2_server.accepted == 1
@@ -0,0 +1,83 @@
+import subprocess
+import sys
+
+import pytest
+
+# Imported by tin only when first needed
+DEFERRED = ["requests", "urllib3", "yaml", "simplejson", "deepmerge"]
+
+
+def run(code):
+    return subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+
+
+def imported(stderr):
+    return [
+        line.split("|")[-1].strip()
+        for line in stderr.splitlines()
+        if line.startswith("import time:")
+    ]
+
+
+@pytest.mark.parametrize("module", ["tin", "tin.api", "tin.config"])
+def test_heavy_imports_deferred(module):
+    names = imported(run("import {}".format(module)).stderr)
+    assert module in names
+    assert [
+        n for n in names if any(n == d or n.startswith(d + ".") for d in DEFERRED)
+    ] == []
+
+
+def test_deferred_imports_load_when_used():
+    result = run(
+        "from tin.api import TinApi\n"
+        "api = TinApi(config_file='test/data/api/testservice.yml', "
+        "environment='basic')\n"
+        "print(type(api.request).__name__)"
+    )
+    assert result.stdout.strip() == "Session"
+    assert "requests.sessions" in imported(result.stderr)
+
+
+def test_deferred_imports_leave_sys_modules():
+    result = run(
+        "import sys\n"
+        "import tin.api\n"
+        "print([name for name in {!r} if name in sys.modules])".format(DEFERRED)
+    )
+    assert result.stdout.strip() == "[]"
+
+
+def test_deferred_imports_thread_safe():
+    result = run(
+        "import threading\n"
+        "import tin.api\n"
+        "start = threading.Barrier(16)\n"
+        "loaded = []\n"
+        "def load():\n"
+        "    start.wait()\n"
+        "    loaded.append(tin.api.json.loads('[1]'))\n"
+        "threads = [threading.Thread(target=load) for _ in range(16)]\n"
+        "for thread in threads:\n"
+        "    thread.start()\n"
+        "for thread in threads:\n"
+        "    thread.join()\n"
+        "print(len(loaded))"
+    )
+    assert result.stdout.strip() == "16"
+
+
+def test_no_logging_side_effects():
+    result = run(
+        "import logging\n"
+        "import tin.api\n"
+        "root = logging.getLogger()\n"
+        "print(root.level, len(root.handlers))"
+    )
+    # WARNING, and no handlers, as Python leaves it
+    assert result.stdout.split() == ["30", "0"]
@@ -1,3 +1,5 @@
+import gzip
+import io
 import json
 import os
 import pytest
@@ -9,10 +11,13 @@ from tin.base import TinApiClass
 from tin.exceptions import TinObjectNotFound, TinError, TinInvalidArgs
 from tin.models import TinApiModel
 from tin.response import (
+    TinApiResponseBinary,
     TinApiResponseNoContent,
+    TinApiResponseStream,
 )
 from pytest_httpserver import HTTPServer
-from types import ModuleType
+from werkzeug import Response
+from types import GeneratorType, ModuleType
 
 
 def clear_env():
@@ -330,3 +335,243 @@ def test_form_payload(httpserver: HTTPServer):
     assert testservice.payloads.form(data={"first": "data", "second": "value"}) == [
         "hello"
     ]
+
+
+def test_ndjson(httpserver: HTTPServer):
+    httpserver.expect_request("/api/exports/things", method="GET").respond_with_data(
+        '{"id": 1, "name": "one"}\n\n{"id": 2, "name": "two"}\n',
+        content_type="application/x-ndjson",
+    )
+    testservice = api_inst()
+    response = testservice.exports.ndjson()
+
+    assert type(response) is TinApiResponseStream
+    items = list(response)
+    assert [i.name for i in items] == ["one", "two"]
+    assert all(type(i) is testservice.exports.model for i in items)
+
+    assert list(testservice.exports.ndjson(nomodel=True)) == [
+        {"id": 1, "name": "one"},
+        {"id": 2, "name": "two"},
+    ]
+
+
+def test_ndjson_paginate(httpserver: HTTPServer):
+    httpserver.expect_request("/api/exports/things", method="GET").respond_with_data(
+        '{"id": 1}\n',
+        headers={"link": ('<http://localhost:5000/api/exports/things/2>; rel="next"')},
+    )
+    httpserver.expect_request(
+        "/api/exports/things/2", method="GET"
+    ).respond_with_data('{"id": 2}\n{"id": 3}\n')
+    testservice = api_inst()
+
+    assert [i["id"] for i in testservice.exports.ndjson(nomodel=True)] == [1, 2, 3]
+    assert [
+        i["id"] for i in testservice.exports.ndjson(nomodel=True, paginate=False)
+    ] == [1]
+
+
+def test_ndjson_bad_line(httpserver: HTTPServer):
+    httpserver.expect_request("/api/exports/things", method="GET").respond_with_data(
+        '{"id": 1}\nthis is not JSON\n'
+    )
+    testservice = api_inst()
+    response = testservice.exports.ndjson(nomodel=True)
+    assert next(response) == {"id": 1}
+    with pytest.raises(TinError):
+        next(response)
+
+
+@pytest.mark.parametrize("kind", ["default", "path", "fileobj", "bytearray"])
+def test_binary(httpserver: HTTPServer, tmp_path, kind):
+    body = bytes(range(256)) * 4
+    httpserver.expect_request("/api/exports/archive", method="GET").respond_with_data(
+        body, content_type="application/octet-stream"
+    )
+    testservice = api_inst()
+
+    if kind == "default":
+        response = testservice.exports.binary()
+        assert response.output.read() == body
+        assert response.mmap()[:] == body
+    elif kind == "path":
+        response = testservice.exports.binary(output=str(tmp_path / "archive"))
+        assert (tmp_path / "archive").read_bytes() == body
+    elif kind == "fileobj":
+        buf = io.BytesIO()
+        response = testservice.exports.binary(output=buf)
+        assert buf.getvalue() == body
+    else:
+        buf = bytearray()
+        response = testservice.exports.binary(output=buf)
+        assert bytes(buf) == body
+
+    assert type(response) is TinApiResponseBinary
+    assert response.size == len(body)
+    assert response.headers["content-type"] == "application/octet-stream"
+
+
+def test_binary_404_writes_nothing(httpserver: HTTPServer, tmp_path):
+    httpserver.expect_request("/api/exports/archive", method="GET").respond_with_data(
+        "Not Found", status=404
+    )
+    testservice = api_inst()
+    with pytest.raises(TinObjectNotFound):
+        testservice.exports.binary(output=str(tmp_path / "archive"))
+    assert not (tmp_path / "archive").exists()
+
+
+def test_binary_bad_output():
+    testservice = api_inst()
+    with pytest.raises(TinInvalidArgs):
+        testservice.exports.binary(output=12)
+
+
+def upload_handler(received):
+    def handler(request):
+        received["body"] = request.get_data()
+        received["headers"] = dict(request.headers)
+        return Response('["ok"]', content_type="application/json")
+
+    return handler
+
+
+@pytest.mark.parametrize(
+    "data",
+    [
+        b"some raw bytes",
+        io.BytesIO(b"some raw bytes"),
+        (chunk for chunk in [b"some ", b"raw ", b"bytes"]),
+    ],
+)
+def test_upload_body(httpserver: HTTPServer, data):
+    received = {}
+    httpserver.expect_request("/api/things/upload", method="POST").respond_with_handler(
+        upload_handler(received)
+    )
+    testservice = api_inst()
+    assert testservice.payloads.upload(data=data) == ["ok"]
+    assert received["body"] == b"some raw bytes"
+
+    if isinstance(data, GeneratorType):
+        assert received["headers"]["Transfer-Encoding"] == "chunked"
+    else:
+        assert received["headers"]["Content-Length"] == "14"
+
+
+def test_upload_sized_generator(httpserver: HTTPServer):
+    received = {}
+    httpserver.expect_request("/api/things/upload", method="POST").respond_with_handler(
+        upload_handler(received)
+    )
+    testservice = api_inst()
+    data = (chunk for chunk in [b"some ", b"raw ", b"bytes"])
+    assert testservice.payloads.upload(
+        data=data, headers={"Content-Length": "14"}
+    ) == ["ok"]
+    assert received["body"] == b"some raw bytes"
+    assert received["headers"]["Content-Length"] == "14"
+    assert "Transfer-Encoding" not in received["headers"]
+
+
+def paged_upload_handler(received):
+    def handler(request):
+        received.append(request.get_data())
+        headers = {}
+        if len(received) == 1:
+            headers["link"] = '<http://localhost:5000/api/things/upload>; rel="next"'
+        return Response(
+            json.dumps([len(received)]),
+            content_type="application/json",
+            headers=headers,
+        )
+
+    return handler
+
+
+def test_upload_body_paginated(httpserver: HTTPServer):
+    received = []
+    httpserver.expect_request("/api/things/upload", method="POST").respond_with_handler(
+        paged_upload_handler(received)
+    )
+    testservice = api_inst()
+    data = io.BytesIO(b"skipped, hello world")
+    data.seek(9)
+
+    # Sent again from where it started for every page
+    assert testservice.payloads.upload(data=data, paginate=True) == [1, 2]
+    assert received == [b"hello world", b"hello world"]
+
+
+def test_upload_generator_paginated(httpserver: HTTPServer):
+    received = []
+    httpserver.expect_request("/api/things/upload", method="POST").respond_with_handler(
+        paged_upload_handler(received)
+    )
+    testservice = api_inst()
+    data = (chunk for chunk in [b"hello ", b"world"])
+
+    with pytest.raises(TinInvalidArgs):
+        testservice.payloads.upload(data=data, paginate=True)
+    assert received == [b"hello world"]
+
+
+def test_json_body_serialized_once(httpserver: HTTPServer, monkeypatch):
+    httpserver.expect_request(
+        "/api/things/payloadtest", method="POST", data='{"json": "data"}'
+    ).respond_with_json(
+        ["one"],
+        headers={
+            "link": ('<http://localhost:5000/api/things/payloadtest2>; rel="next"')
+        },
+    )
+    httpserver.expect_request(
+        "/api/things/payloadtest2", method="POST", data='{"json": "data"}'
+    ).respond_with_json(["two"])
+
+    calls = []
+    dumps = json.dumps
+
+    def counting_dumps(*args, **kwargs):
+        calls.append(args)
+        return dumps(*args, **kwargs)
+
+    monkeypatch.setattr("tin.api.json.dumps", counting_dumps)
+    testservice = api_inst()
+    assert testservice.payloads.json(data={"json": "data"}) == ["one", "two"]
+    assert len(calls) == 1
+
+
+def test_compressed_request(httpserver: HTTPServer):
+    received = {}
+    httpserver.expect_request(
+        "/api/things/payloadtest", method="POST"
+    ).respond_with_handler(upload_handler(received))
+    testservice = api_inst()
+    data = {"things": ["thing"] * 100}
+
+    response = testservice.payloads.compressed(data=data)
+    assert response == ["ok"]
+    assert received["headers"]["Content-Encoding"] == "gzip"
+    assert json.loads(gzip.decompress(received["body"])) == data
+
+    assert response.timing["elapsed"] > 0
+    assert response.timing["uncompressed_size"] == len(json.dumps(data))
+    assert response.timing["compressed_size"] == len(received["body"])
+    assert 0 < response.timing["compress_ratio"] < 1
+    assert response.timing["compress_time"] >= 0
+
+
+def test_compressed_request_below_threshold(httpserver: HTTPServer):
+    received = {}
+    httpserver.expect_request(
+        "/api/things/payloadtest", method="POST"
+    ).respond_with_handler(upload_handler(received))
+    testservice = api_inst()
+
+    response = testservice.payloads.compressed(data={"small": "data"})
+    assert response == ["ok"]
+    assert "Content-Encoding" not in received["headers"]
+    assert received["body"] == b'{"small": "data"}'
+    assert "compress_ratio" not in response.timing
@@ -0,0 +1,609 @@
+import json
+import os
+import pytest
+import threading
+import time
+
+from tin.api import TinApi
+from tin.config import TinConfig
+from tin.exceptions import TinError, TinInvalidArgs, TinObjectNotFound
+from tin.pagination import TinCursorPaginator, build_paginator, lookup
+from tin.response import TinApiResponseSpilled
+from tin.spill import TinSpilledList
+from pytest_httpserver import HTTPServer
+from werkzeug import Response
+
+RECORDS = [{"id": i, "name": "record {}".format(i)} for i in range(1, 8)]
+
+
+def clear_env():
+    for k in os.environ.keys():
+        if k.startswith("TIN"):
+            os.environ.pop(k)
+
+
+def api_inst(env="basic", config="test/data/api/testservice.yml"):
+    clear_env()
+    # Just a shortcut to keep the repeating text down
+    return TinApi(config_file=config, environment=env)
+
+
+def api_at(port, env="basic", config="test/data/api/testservice.yml"):
+    clear_env()
+    conf = TinConfig(config, env)
+    conf.set("port", port)
+    return TinApi(config=conf)
+
+
+@pytest.fixture(scope="session")
+def httpserver_listen_address():
+    return ("127.0.0.1", 5000)
+
+
+@pytest.fixture
+def threaded_httpserver():
+    server = HTTPServer(host="127.0.0.1", port=5001, threaded=True)
+    server.start()
+    yield server
+    server.clear()
+    server.stop()
+
+
+class InFlight(object):
+    """Counts how many requests a handler is serving at once"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.current = 0
+        self.most = 0
+
+    def __enter__(self):
+        with self.lock:
+            self.current += 1
+            self.most = max(self.most, self.current)
+
+    def __exit__(self, *args):
+        with self.lock:
+            self.current -= 1
+
+
+def json_response(data, headers=None):
+    return Response(json.dumps(data), content_type="application/json", headers=headers)
+
+
+def offset_handler(requests_seen, total_in="none", cap=None):
+    def handler(request):
+        requests_seen.append(dict(request.args))
+        offset = int(request.args["offset"])
+        limit = min(int(request.args.get("limit", 3)), cap or len(RECORDS))
+        body = {"results": RECORDS[offset : offset + limit]}
+        headers = {}
+        if total_in == "body":
+            body["meta"] = {"total": len(RECORDS)}
+        elif total_in == "header":
+            headers["X-Total"] = str(len(RECORDS))
+        return json_response(body, headers)
+
+    return handler
+
+
+def page_handler(requests_seen):
+    def handler(request):
+        requests_seen.append(dict(request.args))
+        page = int(request.args["page"])
+        size = int(request.args.get("per_page", 3))
+        return json_response(
+            {
+                "results": RECORDS[(page - 1) * size : page * size],
+                "pages": -(-len(RECORDS) // size),
+            }
+        )
+
+    return handler
+
+
+def cursor_handler(requests_seen):
+    def handler(request):
+        requests_seen.append(dict(request.args))
+        start = int(request.args.get("after", 0))
+        end = min(start + 3, len(RECORDS))
+        return json_response(
+            {
+                "results": RECORDS[start:end],
+                "meta": {"next_cursor": str(end) if end < len(RECORDS) else None},
+            }
+        )
+
+    return handler
+
+
+@pytest.mark.parametrize(
+    "method,total_in,requests_made",
+    [
+        # 7 records, 2 per page: the last page is short, so no extra request
+        ("offset", "none", 4),
+        ("offset_total", "body", 4),
+        ("header_count", "header", 4),
+    ],
+)
+def test_offset(httpserver: HTTPServer, method, total_in, requests_made):
+    seen = []
+    httpserver.expect_request("/api/paged/offset").respond_with_handler(
+        offset_handler(seen, total_in)
+    )
+    testservice = api_inst()
+
+    response = getattr(testservice.paginated, method)(nomodel=True)
+    assert response["results"] == RECORDS
+    assert len(seen) == requests_made
+    assert [r["offset"] for r in seen] == ["0", "2", "4", "6"]
+    assert all(r["limit"] == "2" for r in seen)
+
+
+def test_offset_stops_at_total(httpserver: HTTPServer):
+    # The total is an exact multiple of the page size, so without a total an empty
+    # request would be needed
+    seen = []
+
+    def handler(request):
+        seen.append(dict(request.args))
+        offset = int(request.args["offset"])
+        return json_response(
+            {"results": RECORDS[offset : min(offset + 2, 6)], "meta": {"total": 6}}
+        )
+
+    httpserver.expect_request("/api/paged/offset").respond_with_handler(handler)
+    testservice = api_inst()
+
+    assert testservice.paginated.offset_total(nomodel=True)["results"] == RECORDS[:6]
+    assert len(seen) == 3
+
+
+def test_offset_caller_params(httpserver: HTTPServer):
+    seen = []
+    httpserver.expect_request("/api/paged/offset").respond_with_handler(
+        offset_handler(seen)
+    )
+    testservice = api_inst()
+
+    response = testservice.paginated.offset(nomodel=True, params={"offset": 4})
+    assert response["results"] == RECORDS[4:]
+    assert [r["offset"] for r in seen] == ["4", "6"]
+
+
+def test_page(httpserver: HTTPServer):
+    seen = []
+    httpserver.expect_request("/api/paged/page").respond_with_handler(
+        page_handler(seen)
+    )
+    testservice = api_inst()
+
+    assert testservice.paginated.page(nomodel=True)["results"] == RECORDS
+    assert [r["page"] for r in seen] == ["1", "2", "3", "4"]
+
+    seen.clear()
+    assert testservice.paginated.page_total(nomodel=True)["results"] == RECORDS
+    assert [r["page"] for r in seen] == ["1", "2", "3"]
+
+
+def test_cursor(httpserver: HTTPServer):
+    seen = []
+    httpserver.expect_request("/api/paged/cursor").respond_with_handler(
+        cursor_handler(seen)
+    )
+    testservice = api_inst()
+
+    assert testservice.paginated.cursor(nomodel=True)["results"] == RECORDS
+    assert [r.get("after") for r in seen] == [None, "3", "6"]
+
+    seen.clear()
+    response = testservice.paginated.cursor(nomodel=True, paginate=False)
+    assert response["results"] == RECORDS[:3]
+    assert len(seen) == 1
+
+
+def test_pages(httpserver: HTTPServer):
+    seen = []
+    httpserver.expect_request("/api/paged/cursor").respond_with_handler(
+        cursor_handler(seen)
+    )
+    testservice = api_inst()
+
+    pages = testservice.paginated.cursor.pages()
+    assert seen == []
+
+    first = next(pages)
+    assert len(seen) == 1
+    assert [m.id for m in first["results"]] == [1, 2, 3]
+    assert len(list(pages)) == 2
+    assert len(seen) == 3
+
+
+def test_items(httpserver: HTTPServer):
+    seen = []
+    httpserver.expect_request("/api/paged/offset").respond_with_handler(
+        offset_handler(seen)
+    )
+    testservice = api_inst()
+
+    items = list(testservice.paginated.offset.items())
+    assert [i.id for i in items] == [r["id"] for r in RECORDS]
+    assert all(type(i) is testservice.paginated.model for i in items)
+
+    assert list(testservice.paginated.offset.items(nomodel=True)) == RECORDS
+
+
+def test_items_without_list(httpserver: HTTPServer):
+    httpserver.expect_request("/api/paged/bad").respond_with_json({"not": "a list"})
+    testservice = api_inst()
+
+    with pytest.raises(TinError):
+        list(testservice.paginated.bad.items())
+
+
+def test_items_not_json():
+    testservice = api_inst()
+
+    with pytest.raises(TinError):
+        testservice.exports.ndjson.items()
+
+
+def test_build_paginator():
+    testservice = api_inst()
+    method = testservice.paginated.cursor
+
+    assert type(build_paginator(method, "cursor")) is TinCursorPaginator
+    assert type(build_paginator(method, {"type": "cursor"})) is TinCursorPaginator
+    with pytest.raises(TinError):
+        build_paginator(method, "nonsense")
+
+
+def test_lookup():
+    assert lookup({"meta": {"next": "abc"}}, "meta.next") == "abc"
+    assert lookup({"meta": {"next": "abc"}}, "meta.missing") is None
+    assert lookup({"meta": "abc"}, "meta.next") is None
+
+
+@pytest.mark.parametrize("method", ["offset_total", "header_count", "page_total"])
+def test_parallel_pages(threaded_httpserver: HTTPServer, method):
+    seen = []
+    in_flight = InFlight()
+    if method == "page_total":
+        path, handler = "/api/paged/page", page_handler(seen)
+    else:
+        path = "/api/paged/offset"
+        handler = offset_handler(seen, "header" if method == "header_count" else "body")
+
+    def slow_handler(request):
+        with in_flight:
+            # Later pages answer first, to check they're reassembled in order
+            time.sleep(0.3 / len(seen) if seen else 0)
+            return handler(request)
+
+    threaded_httpserver.expect_request(path).respond_with_handler(slow_handler)
+    testservice = api_at(threaded_httpserver.port)
+
+    call = getattr(testservice.paginated, method)
+    response = call(nomodel=True, parallel_pages=4)
+    assert response["results"] == RECORDS
+    assert in_flight.most > 1
+
+    requests_made = len(seen)
+    seen.clear()
+    assert [p["results"] for p in call.pages(nomodel=True, parallel_pages=4)] == [
+        p["results"] for p in call.pages(nomodel=True)
+    ]
+    assert len(seen) == requests_made * 2
+
+
+@pytest.mark.parametrize("parallel_pages", [1, 4])
+def test_offset_capped_page_size(httpserver: HTTPServer, parallel_pages):
+    # Asked for 2 per page, the API sends at most 1, and pages step by what it sent
+    seen = []
+    httpserver.expect_request("/api/paged/offset").respond_with_handler(
+        offset_handler(seen, "body", cap=1)
+    )
+    testservice = api_inst()
+
+    response = testservice.paginated.offset_total(
+        nomodel=True, parallel_pages=parallel_pages
+    )
+    assert response["results"] == RECORDS
+    assert [r["offset"] for r in seen] == [str(i) for i in range(7)]
+
+
+def test_parallel_pages_needs_total(httpserver: HTTPServer):
+    # Without a total, pages are fetched one after another
+    seen = []
+    httpserver.expect_request("/api/paged/cursor").respond_with_handler(
+        cursor_handler(seen)
+    )
+    testservice = api_inst()
+
+    response = testservice.paginated.cursor(nomodel=True, parallel_pages=4)
+    assert response["results"] == RECORDS
+    assert len(seen) == 3
+
+
+def wait_for(condition, timeout=2):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if condition():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+def test_read_ahead(httpserver: HTTPServer):
+    seen = []
+    httpserver.expect_request("/api/paged/cursor").respond_with_handler(
+        cursor_handler(seen)
+    )
+    testservice = api_inst()
+
+    pages = testservice.paginated.cursor.pages(nomodel=True, read_ahead=1)
+    first = next(pages)
+    assert first["results"] == RECORDS[:3]
+
+    # The second page is requested while the first is still being looked at
+    assert wait_for(lambda: len(seen) == 2)
+    assert not wait_for(lambda: len(seen) > 2, timeout=0.2)
+    assert [p["results"] for p in pages] == [RECORDS[3:6], RECORDS[6:]]
+    assert len(seen) == 3
+
+
+def test_no_read_ahead(httpserver: HTTPServer):
+    seen = []
+    httpserver.expect_request("/api/paged/cursor").respond_with_handler(
+        cursor_handler(seen)
+    )
+    testservice = api_inst()
+
+    items = testservice.paginated.cursor.items(nomodel=True)
+    assert next(items) == RECORDS[0]
+    assert not wait_for(lambda: len(seen) > 1, timeout=0.2)
+    assert list(items) == RECORDS[1:]
+
+
+def test_read_ahead_error(httpserver: HTTPServer):
+    httpserver.expect_request(
+        "/api/paged/cursor", query_string={"thing": "stuff"}
+    ).respond_with_json({"results": RECORDS[:3], "meta": {"next_cursor": "3"}})
+    httpserver.expect_request("/api/paged/cursor").respond_with_data(
+        "Not Found", status=404
+    )
+    testservice = api_inst()
+
+    items = testservice.paginated.cursor.items(nomodel=True, read_ahead=2)
+    assert [next(items) for i in range(3)] == RECORDS[:3]
+    with pytest.raises(TinObjectNotFound):
+        next(items)
+
+
+def test_read_ahead_stops_when_closed(httpserver: HTTPServer):
+    seen = []
+    httpserver.expect_request("/api/paged/cursor").respond_with_handler(
+        cursor_handler(seen)
+    )
+    testservice = api_inst()
+
+    pages = testservice.paginated.cursor.pages(nomodel=True, read_ahead=1)
+    next(pages)
+    pages.close()
+    requests_made = len(seen)
+    assert not wait_for(lambda: len(seen) > requests_made, timeout=0.2)
+
+
+def test_limit(httpserver: HTTPServer):
+    seen = []
+    httpserver.expect_request("/api/paged/offset").respond_with_handler(
+        offset_handler(seen)
+    )
+    testservice = api_inst()
+
+    response = testservice.paginated.offset(nomodel=True, limit=3)
+    assert response["results"] == RECORDS[:3]
+    # The second page only asks for the one item still needed
+    assert [(r["offset"], r["limit"]) for r in seen] == [("0", "2"), ("2", "1")]
+
+    seen.clear()
+    items = list(testservice.paginated.offset.items(nomodel=True, limit=5))
+    assert items == RECORDS[:5]
+    assert len(seen) == 3
+
+
+def test_limit_page_number(httpserver: HTTPServer):
+    seen = []
+    httpserver.expect_request("/api/paged/page").respond_with_handler(
+        page_handler(seen)
+    )
+    testservice = api_inst()
+
+    assert testservice.paginated.page(nomodel=True, limit=1)["results"] == RECORDS[:1]
+    assert [(r["page"], r["per_page"]) for r in seen] == [("1", "1")]
+
+    # Later pages keep their size, and the result is trimmed instead
+    seen.clear()
+    assert testservice.paginated.page(nomodel=True, limit=3)["results"] == RECORDS[:3]
+    assert [(r["page"], r["per_page"]) for r in seen] == [("1", "2"), ("2", "2")]
+
+
+def test_limit_no_shrink(httpserver: HTTPServer):
+    seen = []
+    httpserver.expect_request("/api/paged/cursor").respond_with_handler(
+        cursor_handler(seen)
+    )
+    testservice = api_inst()
+
+    response = testservice.paginated.cursor(nomodel=True, limit=4)
+    assert response["results"] == RECORDS[:4]
+    assert len(seen) == 2
+
+
+def test_max_pages(httpserver: HTTPServer):
+    seen = []
+    httpserver.expect_request("/api/paged/cursor").respond_with_handler(
+        cursor_handler(seen)
+    )
+    testservice = api_inst()
+
+    response = testservice.paginated.cursor(nomodel=True, max_pages=2)
+    assert response["results"] == RECORDS[:6]
+    assert len(seen) == 2
+
+    seen.clear()
+    assert len(list(testservice.paginated.cursor.pages(max_pages=1))) == 1
+    assert len(seen) == 1
+
+
+def test_limit_ndjson(httpserver: HTTPServer):
+    httpserver.expect_request("/api/exports/things").respond_with_data(
+        '{"id": 1}\n{"id": 2}\n',
+        headers={"link": '<http://localhost:5000/api/exports/things/2>; rel="next"'},
+    )
+    httpserver.expect_request("/api/exports/things/2").respond_with_data(
+        '{"id": 3}\n{"id": 4}\n'
+    )
+    testservice = api_inst()
+
+    lines = testservice.exports.ndjson(nomodel=True, limit=3)
+    assert [i["id"] for i in lines] == [1, 2, 3]
+    assert len(httpserver.log) == 2
+
+    httpserver.clear_log()
+    lines = testservice.exports.ndjson(nomodel=True, limit=2)
+    assert [i["id"] for i in lines] == [1, 2]
+    assert len(httpserver.log) == 1
+
+    httpserver.clear_log()
+    lines = testservice.exports.ndjson(nomodel=True, max_pages=1)
+    assert [i["id"] for i in lines] == [1, 2]
+    assert len(httpserver.log) == 1
+
+    with pytest.raises(TinInvalidArgs):
+        testservice.exports.binary(limit=1)
+
+
+def test_limit_parallel(threaded_httpserver: HTTPServer):
+    seen = []
+    threaded_httpserver.expect_request("/api/paged/offset").respond_with_handler(
+        offset_handler(seen, "body")
+    )
+    testservice = api_at(threaded_httpserver.port)
+
+    response = testservice.paginated.offset_total(
+        nomodel=True, limit=5, parallel_pages=4
+    )
+    assert response["results"] == RECORDS[:5]
+    assert len(seen) == 3
+
+
+def test_first(httpserver: HTTPServer):
+    seen = []
+    httpserver.expect_request("/api/paged/offset").respond_with_handler(
+        offset_handler(seen)
+    )
+    testservice = api_inst()
+
+    first = testservice.paginated.offset.first()
+    assert type(first) is testservice.paginated.model
+    assert first.id == 1
+    assert [r["limit"] for r in seen] == ["1"]
+
+    assert testservice.paginated.offset.first(params={"offset": 100}) is None
+
+
+@pytest.mark.parametrize("value", [0, -1, "1"])
+def test_bad_limit(value):
+    testservice = api_inst()
+
+    with pytest.raises(TinInvalidArgs):
+        testservice.paginated.offset(limit=value)
+    with pytest.raises(TinInvalidArgs):
+        testservice.paginated.offset(max_pages=value)
+
+
+def test_spill(httpserver: HTTPServer):
+    seen = []
+    httpserver.expect_request("/api/paged/cursor").respond_with_handler(
+        cursor_handler(seen)
+    )
+    testservice = api_inst()
+
+    # Past the first page, items are moved out to a file in spill_dir
+    response = testservice.paginated.cursor(spill_threshold=1)
+    results = response["results"]
+    assert type(results) is TinSpilledList
+    assert len(results) == len(RECORDS)
+    assert type(results[0]) is testservice.paginated.model
+    assert [r.id for r in results] == [r["id"] for r in RECORDS]
+    assert results[-1].id == RECORDS[-1]["id"]
+    assert [r.id for r in results[1:3]] == [2, 3]
+    assert response["meta"] == {"next_cursor": None}
+
+    # Below the threshold nothing changes
+    response = testservice.paginated.cursor(nomodel=True, spill_threshold=1000000)
+    assert type(response["results"]) is list
+    assert response["results"] == RECORDS
+
+
+def test_spill_list(httpserver: HTTPServer):
+    def handler(request):
+        if "p" in request.args:
+            return json_response(RECORDS[4:])
+        return json_response(
+            RECORDS[:4],
+            {"link": '<http://localhost:5000/api/paged/link?p=2>; rel="next"'},
+        )
+
+    httpserver.expect_request("/api/paged/link").respond_with_handler(handler)
+    testservice = api_inst()
+
+    response = testservice.paginated.link(nomodel=True, spill_threshold=0)
+    assert type(response) is TinApiResponseSpilled
+    assert len(response) == len(RECORDS)
+    assert list(response) == RECORDS
+    assert response == RECORDS
+    assert response[4] == RECORDS[4]
+    response.close()
+
+
+def test_spill_limit(httpserver: HTTPServer):
+    httpserver.expect_request("/api/paged/cursor").respond_with_handler(
+        cursor_handler([])
+    )
+    testservice = api_inst()
+
+    response = testservice.paginated.cursor(nomodel=True, spill_threshold=0, limit=4)
+    assert list(response["results"]) == RECORDS[:4]
+
+
+def test_spill_list_class(tmp_path):
+    spilled = TinSpilledList(str(tmp_path))
+    spilled.extend([{"a": 1}, [1, 2], "three", None])
+    spilled.append({"b": "é\n"})
+
+    assert len(spilled) == 5
+    assert list(spilled) == [{"a": 1}, [1, 2], "three", None, {"b": "é\n"}]
+    assert spilled[-1] == {"b": "é\n"}
+    assert "three" in spilled
+    with pytest.raises(IndexError):
+        spilled[5]
+
+    # Reading by index while iterating doesn't lose the iterator's place
+    iterated = []
+    for item in spilled:
+        iterated.append(item)
+        spilled[0]
+    assert iterated == list(spilled)
+
+    spilled.close()
+    with pytest.raises(TinError):
+        list(spilled)
+
+
+def test_bad_spill_threshold():
+    testservice = api_inst()
+
+    with pytest.raises(TinInvalidArgs):
+        testservice.paginated.cursor(spill_threshold="1mb")
@@ -0,0 +1,566 @@
+import http.server
+import json
+import os
+import pytest
+import select
+import signal
+import socketserver
+import ssl
+import threading
+import time
+
+import requests
+
+from pytest_httpserver import HTTPServer
+
+from tin import adapters, base, config, pool
+from tin.api import TinApi
+from tin.exceptions import TinError, TinInvalidArgs
+
+
+def clear_env():
+    for k in os.environ.keys():
+        if k.startswith("TIN"):
+            os.environ.pop(k)
+
+
+def api_inst(env="basic", config="test/data/api/testservice.yml"):
+    clear_env()
+    # Just a shortcut to keep the repeating text down
+    return TinApi(config_file=config, environment=env)
+
+
+@pytest.fixture(scope="session")
+def httpserver_listen_address():
+    return ("127.0.0.1", 5000)
+
+
+def in_child(func, timeout=None):
+    """Runs func in a forked child, returning what it returns. Fails if the child
+    hasn't answered within timeout seconds."""
+    read_fd, write_fd = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.close(read_fd)
+        try:
+            os.write(write_fd, json.dumps(func()).encode())
+        finally:
+            os._exit(0)
+    os.close(write_fd)
+    if not select.select([read_fd], [], [], timeout)[0]:
+        os.kill(pid, signal.SIGKILL)
+        os.waitpid(pid, 0)
+        os.close(read_fd)
+        pytest.fail("The child didn't answer in {}s".format(timeout))
+    with os.fdopen(read_fd) as fh:
+        result = fh.read()
+    os.waitpid(pid, 0)
+    return json.loads(result)
+
+
+def adapter(api, method="hasmethods.list"):
+    cls_name, mth_name = method.split(".")
+    url = getattr(api.get_class(cls_name), mth_name).url
+    return api.request.get_adapter(url)
+
+
+def warmed_pool(api):
+    """The one connection pool of the API's adapter"""
+    pools = adapter(api).poolmanager.pools
+    (key,) = pools.keys()
+    return pools[key]
+
+
+def test_pool_key():
+    assert pool.pool_key("HTTPS", "Example.com", "443") == (
+        "https",
+        "example.com",
+        443,
+        True,
+        None,
+        None,
+    )
+    assert pool.pool_key("https", "example.com", 443) != pool.pool_key(
+        "https", "example.com", 443, verify=False
+    )
+    assert pool.pool_key("https", "example.com", 443, cert=["a.pem", "a.key"]) == (
+        pool.pool_key("https", "example.com", 443, cert=("a.pem", "a.key"))
+    )
+
+
+def test_mount_prefixes():
+    assert pool.mount_prefixes("https", "Example.com", 443) == [
+        "https://example.com:443/",
+        "https://example.com/",
+    ]
+    assert pool.mount_prefixes("http", "example.com", 5000) == [
+        "http://example.com:5000/"
+    ]
+
+
+def test_shared_between_apis():
+    basic = api_inst("basic")
+    header = api_inst("header")
+
+    assert basic.request is not header.request
+    assert adapter(basic) is adapter(header)
+    assert adapter(basic) is pool.shared_adapter(
+        pool.pool_key("http", "localhost", 5000)
+    )
+    # Unknown origins get the session's own adapter
+    assert basic.request.get_adapter("http://elsewhere/") is not adapter(basic)
+
+
+def test_not_shared_with_other_tls_settings():
+    basic = api_inst("basic")
+    os.environ["TIN__ENVIRONMENTS__BASIC__SSL__VERIFY"] = "/path/to/ca.pem"
+    try:
+        other_ca = TinApi(
+            config_file="test/data/api/testservice.yml", environment="basic"
+        )
+    finally:
+        clear_env()
+
+    assert adapter(basic) is not adapter(other_ca)
+
+
+def test_not_shared(tmp_path):
+    clear_env()
+    config_file = tmp_path / "noshare.yml"
+    config_file.write_text(
+        "host: localhost\n"
+        "scheme: http\n"
+        "port: 5000\n"
+        "basepath: /api\n"
+        "auth_type: none\n"
+        "share_connections: false\n"
+        "api_file: {}\n".format(os.path.abspath("test/data/api/testservice-api.yml"))
+    )
+    noshare = TinApi(config_file=str(config_file))
+
+    assert adapter(noshare) is not adapter(api_inst("basic"))
+    assert adapter(noshare) is not pool.shared_adapter(
+        pool.pool_key("http", "localhost", 5000)
+    )
+
+
+def test_shared_calls(httpserver: HTTPServer):
+    httpserver.expect_request("/api/things", method="GET").respond_with_json(["one"])
+    basic = api_inst("basic")
+    header = api_inst("header")
+
+    assert basic.hasmethods.list() == ["one"]
+    assert header.hasmethods.list() == ["one"]
+    assert len(adapter(basic).poolmanager.pools) == 1
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="Needs os.fork")
+def test_new_adapters_after_fork():
+    testservice = api_inst()
+    parent_adapter = adapter(testservice)
+
+    def check():
+        child_adapter = adapter(testservice)
+        return [
+            child_adapter is not parent_adapter,
+            child_adapter is adapter(api_inst("header")),
+        ]
+
+    assert in_child(check) == [True, True]
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="Needs os.fork")
+def test_fork_while_locked():
+    locks = [
+        pool._adapters_lock,
+        base._build_lock,
+        pool._ssl_contexts_lock,
+        config._spec_cache_lock,
+        config._env_overlays_lock,
+    ]
+    held = threading.Event()
+    release = threading.Event()
+
+    def hold():
+        for lock in locks:
+            lock.acquire()
+        held.set()
+        release.wait()
+        for lock in locks:
+            lock.release()
+
+    # Held by another thread at the fork, e.g. one warming connections
+    thread = threading.Thread(target=hold)
+    thread.start()
+    held.wait()
+    try:
+        result = in_child(lambda: type(adapter(api_inst())).__name__, timeout=5)
+    finally:
+        release.set()
+        thread.join()
+    assert result == "TinHTTPAdapter"
+
+
+class CountingServer(http.server.ThreadingHTTPServer):
+    """Answers every GET with an empty JSON list, counting connections. Threaded,
+    as warmed connections stay open without sending anything."""
+
+    daemon_threads = True
+    accepted = 0
+
+    def get_request(self):
+        request = super().get_request()
+        self.accepted += 1
+        return request
+
+
+class EmptyListHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", "2")
+        self.end_headers()
+        self.wfile.write(b"[]")
+
+    def log_message(self, *args):
+        pass
+
+
+def accepted(server, count, wait=1):
+    """The server's count of connections, once it reaches count or after wait
+    seconds. Clients can connect before the server thread gets to accept."""
+    deadline = time.monotonic() + wait
+    while server.accepted < count and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return server.accepted
+
+
+@pytest.fixture
+def counting_server():
+    server = CountingServer(("127.0.0.1", 0), EmptyListHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    # Warmed connections are only ever to this server
+    pool.reset()
+    yield server
+    server.shutdown()
+    server.server_close()
+    pool.reset()
+
+
+def warm_api(server, **env):
+    """An API calling the counting server"""
+    clear_env()
+    os.environ["TIN__ENVIRONMENTS__BASIC__HOST"] = "127.0.0.1"
+    os.environ["TIN__ENVIRONMENTS__BASIC__PORT"] = str(server.server_address[1])
+    for name, value in env.items():
+        os.environ["TIN__ENVIRONMENTS__BASIC__{}".format(name)] = value
+    try:
+        return TinApi(config_file="test/data/api/testservice.yml", environment="basic")
+    finally:
+        clear_env()
+
+
+def test_origins():
+    testservice = api_inst()
+    assert testservice.origins() == [("http", "localhost", 5000)]
+    # Found from the config, without building classes
+    assert testservice._pending
+
+
+def test_warm(counting_server):
+    testservice = warm_api(counting_server)
+
+    assert testservice.warm(connections=2) == 2
+    assert accepted(counting_server, 2) == 2
+
+    # Calls use the warmed connections
+    assert testservice.hasmethods.list() == []
+    assert testservice.hasmethods.list() == []
+    assert accepted(counting_server, 2) == 2
+
+    # Connections still in the pool aren't opened again
+    assert testservice.warm(connections=2) == 0
+    assert accepted(counting_server, 2) == 2
+
+
+def test_warm_urllib3_transport(counting_server):
+    testservice = warm_api(counting_server, TRANSPORT="urllib3")
+
+    assert testservice.warm(connections=2) == 2
+    assert testservice.hasmethods.list() == []
+    assert accepted(counting_server, 2) == 2
+
+
+def test_warm_background(counting_server):
+    testservice = warm_api(counting_server)
+
+    thread = testservice.warm(connections=3, background=True)
+    thread.join()
+    assert accepted(counting_server, 3) == 3
+
+
+def test_warm_unreachable():
+    pool.reset()
+    os.environ["TIN__ENVIRONMENTS__BASIC__PORT"] = "1"
+    try:
+        testservice = TinApi(
+            config_file="test/data/api/testservice.yml", environment="basic"
+        )
+    finally:
+        clear_env()
+
+    assert testservice.warm(connections=1) == 0
+
+
+def test_warm_bad_args():
+    testservice = api_inst()
+    with pytest.raises(TinInvalidArgs):
+        testservice.warm(connections=0)
+
+
+def test_prewarm(counting_server):
+    warm_api(counting_server, PREWARM__CONNECTIONS="3")
+    assert accepted(counting_server, 3) == 3
+
+
+TLS_DIR = os.path.abspath("test/data/tls")
+
+
+@pytest.fixture
+def https_server():
+    """The counting server over TLS, requiring a client cert signed by the test
+    CA"""
+    server = CountingServer(("127.0.0.1", 0), EmptyListHandler)
+    context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+    context.load_cert_chain(
+        os.path.join(TLS_DIR, "server.pem"), os.path.join(TLS_DIR, "server.key")
+    )
+    context.load_verify_locations(os.path.join(TLS_DIR, "ca.pem"))
+    context.verify_mode = ssl.CERT_REQUIRED
+    server.socket = context.wrap_socket(server.socket, server_side=True)
+
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    pool.reset()
+    yield server
+    server.shutdown()
+    server.server_close()
+    pool.reset()
+
+
+def tls_api(server, cert=True):
+    clear_env()
+    os.environ["TIN__ENVIRONMENTS__BASIC__SCHEME"] = "https"
+    os.environ["TIN__ENVIRONMENTS__BASIC__PORT"] = str(server.server_address[1])
+    os.environ["TIN__ENVIRONMENTS__BASIC__SSL__VERIFY"] = os.path.join(
+        TLS_DIR, "ca.pem"
+    )
+    try:
+        testservice = TinApi(
+            config_file="test/data/api/testservice.yml", environment="basic"
+        )
+    finally:
+        clear_env()
+    if cert:
+        testservice.conf.ssl["cert"] = [
+            os.path.join(TLS_DIR, "client.pem"),
+            os.path.join(TLS_DIR, "client.key"),
+        ]
+    return testservice
+
+
+def test_ssl_context():
+    ca = os.path.join(TLS_DIR, "ca.pem")
+    context = adapters.ssl_context(ca)
+    assert context.verify_mode == ssl.CERT_REQUIRED
+    assert context.check_hostname is True
+    assert adapters.ssl_context(ca) is context
+    assert adapters.ssl_context(ca, alpn=("h2", "http/1.1")).check_hostname is True
+    client_cert = (
+        os.path.join(TLS_DIR, "client.pem"),
+        os.path.join(TLS_DIR, "client.key"),
+    )
+    assert adapters.ssl_context(ca, client_cert) is not context
+    assert adapters.ssl_context(ca, list(client_cert)) is adapters.ssl_context(
+        ca, client_cert
+    )
+
+    insecure = adapters.ssl_context(False)
+    assert insecure.verify_mode == ssl.CERT_NONE
+
+    with pytest.raises(OSError):
+        adapters.ssl_context("/no/such/ca.pem")
+
+
+def test_tls_context_shared(https_server, monkeypatch):
+    testservice = tls_api(https_server)
+    context = adapters.ssl_context(*testservice.conf.ssl.values())
+
+    loads = []
+    load_verify_locations = ssl.SSLContext.load_verify_locations
+
+    def counting(self, *args, **kwargs):
+        loads.append(args)
+        return load_verify_locations(self, *args, **kwargs)
+
+    monkeypatch.setattr(ssl.SSLContext, "load_verify_locations", counting)
+
+    assert testservice.warm(connections=3) == 3
+    assert testservice.hasmethods.list() == []
+    assert accepted(https_server, 3) == 3
+
+    # Every connection used the one context, and nothing was loaded again
+    assert loads == []
+    conn_pool = warmed_pool(testservice)
+    assert conn_pool.conn_kw["ssl_context"] is context
+    assert conn_pool.ca_certs is None
+    assert conn_pool.cert_file is None
+
+
+def test_tls_other_settings(https_server):
+    testservice = tls_api(https_server)
+    tls_adapter = adapter(testservice)
+
+    url = testservice.hasmethods.list.url
+    context = adapters.ssl_context(*testservice.conf.ssl.values())
+
+    def connection(verify, cert):
+        if hasattr(tls_adapter, "get_connection_with_tls_context"):
+            conn_pool = tls_adapter.get_connection_with_tls_context(
+                requests.Request("GET", url).prepare(), verify, cert=cert
+            )
+        else:
+            conn_pool = tls_adapter.get_connection(url)
+        tls_adapter.cert_verify(conn_pool, url, verify, cert)
+        return conn_pool
+
+    # Anything but the adapter's own settings is left to requests
+    conn_pool = connection(True, None)
+    assert "ssl_context" not in conn_pool.conn_kw
+    assert conn_pool.ca_certs is not None
+
+    # Which leaves the context as it was for the adapter's own
+    conn_pool = connection(*testservice.conf.ssl.values())
+    assert conn_pool.conn_kw["ssl_context"] is context
+    assert conn_pool.ca_certs is None
+    assert testservice.hasmethods.list() == []
+
+
+def test_tls_client_cert_required(https_server):
+    testservice = tls_api(https_server, cert=False)
+    with pytest.raises(requests.exceptions.ConnectionError):
+        testservice.hasmethods.list()
+
+
+class UnixCountingServer(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+    accepted = 0
+
+    def get_request(self):
+        request = super().get_request()
+        self.accepted += 1
+        return request
+
+
+class EchoHandler(EmptyListHandler):
+    """Answers with the Host header and path it got"""
+
+    def do_GET(self):
+        body = json.dumps({"host": self.headers["Host"], "path": self.path}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+@pytest.fixture
+def unix_server(tmp_path):
+    server = UnixCountingServer(str(tmp_path / "sidecar.sock"), EchoHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    pool.reset()
+    yield server
+    server.shutdown()
+    server.server_close()
+    pool.reset()
+
+
+def unix_api(socket_path, **env):
+    clear_env()
+    os.environ["TIN__ENVIRONMENTS__BASIC__SOCKET_PATH"] = socket_path
+    for name, value in env.items():
+        os.environ["TIN__ENVIRONMENTS__BASIC__{}".format(name)] = value
+    try:
+        return TinApi(config_file="test/data/api/testservice.yml", environment="basic")
+    finally:
+        clear_env()
+
+
+def test_socket_path(unix_server):
+    testservice = unix_api(unix_server.server_address)
+
+    # The URL, and so the Host header, are still the API's
+    assert testservice.hasmethods.list.url == "http://localhost:5000/api/things"
+    assert testservice.hasmethods.list() == {
+        "host": "localhost:5000",
+        "path": "/api/things?thing=stuff",
+    }
+    assert testservice.hasmethods.list()["host"] == "localhost:5000"
+    assert accepted(unix_server, 1) == 1
+
+    assert isinstance(adapter(testservice), adapters.UnixSocketAdapter)
+    assert adapter(testservice) is not adapter(api_inst("basic"))
+
+
+def test_socket_path_urllib3_transport(unix_server):
+    testservice = unix_api(unix_server.server_address, TRANSPORT="urllib3")
+
+    assert testservice.hasmethods.list()["host"] == "localhost:5000"
+    assert testservice.hasmethods.list()["host"] == "localhost:5000"
+    assert accepted(unix_server, 1) == 1
+
+
+def test_socket_path_ignores_proxies(unix_server):
+    os.environ["HTTP_PROXY"] = "http://127.0.0.1:1"
+    try:
+        testservice = unix_api(unix_server.server_address)
+        assert testservice.hasmethods.list()["host"] == "localhost:5000"
+    finally:
+        os.environ.pop("HTTP_PROXY")
+
+
+def test_socket_path_warm(unix_server):
+    testservice = unix_api(unix_server.server_address)
+
+    assert testservice.warm(connections=2) == 2
+    assert testservice.hasmethods.list()["host"] == "localhost:5000"
+    assert accepted(unix_server, 2) == 2
+
+
+def test_socket_path_missing(tmp_path):
+    pool.reset()
+    testservice = unix_api(str(tmp_path / "nothing.sock"))
+    with pytest.raises(requests.exceptions.ConnectionError):
+        testservice.hasmethods.list()
+
+
+def test_socket_path_needs_session(tmp_path):
+    clear_env()
+    config_file = tmp_path / "nosession.yml"
+    config_file.write_text(
+        "host: localhost\n"
+        "basepath: /api\n"
+        "auth_type: none\n"
+        "use_session: false\n"
+        "socket_path: {}\n"
+        "api_file: {}\n".format(
+            tmp_path / "sidecar.sock",
+            os.path.abspath("test/data/api/testservice-api.yml"),
+        )
+    )
+    with pytest.raises(TinError):
+        TinApi(config_file=str(config_file))
@@ -0,0 +1,144 @@
+import concurrent.futures
+import gc
+import multiprocessing
+import os
+import pickle
+import pytest
+
+from tin.api import TinApi
+from tin.config import TinConfig
+from tin.exceptions import TinError
+from tin.models import TinApiModelFactory
+from tin.registry import get_api, registry_key, resolve
+
+
+def clear_env():
+    for k in os.environ.keys():
+        if k.startswith("TIN"):
+            os.environ.pop(k)
+
+
+def api_inst(env="basic", config="test/data/api/testservice.yml"):
+    clear_env()
+    # Just a shortcut to keep the repeating text down
+    return TinApi(config_file=config, environment=env)
+
+
+def rename(thing):
+    # Runs in a worker process
+    thing.name = "renamed {}".format(thing.id)
+    return thing
+
+
+def test_pickle_api():
+    testservice = api_inst()
+    testservice.set_headers({"X-Extra": "yes"})
+
+    loaded = pickle.loads(pickle.dumps(testservice))
+    assert type(loaded) is TinApi
+    assert loaded is not testservice
+    assert loaded.headers["X-Extra"] == "yes"
+    assert loaded.tree(strings=True) == testservice.tree(strings=True)
+    assert loaded.paginated.offset.url == testservice.paginated.offset.url
+
+    # The API it was pickled from stays registered while it's alive
+    assert get_api(testservice._registry_key) is testservice
+    assert get_api(loaded._registry_key) is loaded
+
+    # Elsewhere, the unpickled API is the registered one
+    data = pickle.dumps((testservice, testservice.paginated.offset))
+    key = testservice._registry_key
+    del testservice, loaded
+    gc.collect()
+    loaded, method = pickle.loads(data)
+    assert get_api(key) is loaded
+    assert method is loaded.paginated.offset
+
+
+def test_pickle_tree_objects():
+    testservice = api_inst()
+
+    assert pickle.loads(pickle.dumps(testservice.paginated)) is testservice.paginated
+    method = pickle.loads(pickle.dumps(testservice.paginated.offset))
+    assert method is testservice.paginated.offset
+
+
+def test_pickle_model():
+    testservice = api_inst()
+    thing = testservice.paginated.model({"id": 3, "name": "three"})
+
+    loaded = pickle.loads(pickle.dumps(thing))
+    assert type(loaded) is testservice.paginated.model
+    assert loaded.to_dict() == {"id": 3, "name": "three"}
+    assert loaded.name == "three"
+
+
+def test_pickle_model_api_collected():
+    testservice = api_inst()
+    data = pickle.dumps(testservice.paginated.model({"id": 3}))
+    del testservice
+    gc.collect()
+
+    # The API is built again from the config pickled with the model
+    loaded = pickle.loads(data)
+    assert loaded.id == 3
+    assert type(loaded).__name__ == "mymodel"
+
+
+def test_models_across_processes():
+    testservice = api_inst()
+    things = [testservice.paginated.model({"id": i}) for i in range(4)]
+
+    with concurrent.futures.ProcessPoolExecutor(
+        max_workers=2, mp_context=multiprocessing.get_context("fork")
+    ) as pool:
+        renamed = list(pool.map(rename, things))
+
+    assert [t.name for t in renamed] == ["renamed {}".format(i) for i in range(4)]
+    assert all(type(t) is testservice.paginated.model for t in renamed)
+
+
+def test_pickle_unregistered_model():
+    model = TinApiModelFactory()("loose", {})
+
+    with pytest.raises(TinError):
+        pickle.dumps(model({"id": 1}))
+
+
+def test_pickle_per_api():
+    # Two APIs for the same API and environment, like one per tenant
+    clear_env()
+    first = TinApi(config=TinConfig("test/data/api/testservice.yml", "basic"))
+    conf = TinConfig("test/data/api/testservice.yml", "basic")
+    conf.set("host", "tenant2.example.com")
+    second = TinApi(config=conf)
+
+    method = pickle.loads(pickle.dumps(first.paginated.offset))
+    assert method is first.paginated.offset
+    thing = pickle.loads(pickle.dumps(first.paginated.model({"id": 1})))
+    assert type(thing) is first.paginated.model
+
+    data = pickle.dumps(second.paginated.offset)
+    del second
+    gc.collect()
+    assert "tenant2.example.com" in pickle.loads(data).url
+
+
+def test_get_api_unregistered():
+    clear_env()
+    key = registry_key(TinConfig("test/data/api/testservice.yml", "basic"))
+
+    api = get_api(key)
+    assert api._registry_key == key
+    assert get_api(key) is api
+
+
+def test_resolve():
+    testservice = api_inst()
+
+    assert resolve(testservice, "testservice.paginated.offset") is (
+        testservice.paginated.offset
+    )
+    assert resolve(testservice, "testservice.paginated") is testservice.paginated
+    with pytest.raises(TinError):
+        resolve(testservice, "testservice.nothere")
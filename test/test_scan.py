@@ -0,0 +1,150 @@
+import json
+import os
+import pytest
+
+from tin.api import TinApi
+from tin.exceptions import TinError
+from tin.scan import TinCheckpoint, TinScan
+from pytest_httpserver import HTTPServer
+from werkzeug import Response
+
+RECORDS = [{"id": i, "name": "record {}".format(i)} for i in range(1, 8)]
+
+
+def clear_env():
+    for k in os.environ.keys():
+        if k.startswith("TIN"):
+            os.environ.pop(k)
+
+
+def api_inst(env="basic", config="test/data/api/testservice.yml"):
+    clear_env()
+    # Just a shortcut to keep the repeating text down
+    return TinApi(config_file=config, environment=env)
+
+
+@pytest.fixture(scope="session")
+def httpserver_listen_address():
+    return ("127.0.0.1", 5000)
+
+
+def serve_cursor(httpserver, seen):
+    def handler(request):
+        seen.append(request.args.get("after"))
+        start = int(request.args.get("after", 0))
+        end = min(start + 3, len(RECORDS))
+        return Response(
+            json.dumps(
+                {
+                    "results": RECORDS[start:end],
+                    "meta": {"next_cursor": str(end) if end < len(RECORDS) else None},
+                }
+            ),
+            content_type="application/json",
+        )
+
+    httpserver.expect_request("/api/paged/cursor").respond_with_handler(handler)
+
+
+def serve_offset(httpserver, seen):
+    def handler(request):
+        seen.append(request.args["offset"])
+        offset = int(request.args["offset"])
+        return Response(
+            json.dumps({"results": RECORDS[offset : offset + 2]}),
+            content_type="application/json",
+        )
+
+    httpserver.expect_request("/api/paged/offset").respond_with_handler(handler)
+
+
+def test_scan(httpserver: HTTPServer):
+    seen = []
+    serve_cursor(httpserver, seen)
+    testservice = api_inst()
+
+    scan = testservice.paginated.cursor.scan(nomodel=True)
+    assert type(scan) is TinScan
+    assert scan.checkpoint.number == 1
+    assert not scan.checkpoint.done
+
+    assert [p["results"] for p in scan] == [RECORDS[:3], RECORDS[3:6], RECORDS[6:]]
+    assert scan.checkpoint.done
+    assert scan.checkpoint.fetched == len(RECORDS)
+
+    # A finished scan has nothing left
+    assert list(scan) == []
+    assert len(seen) == 3
+
+
+def test_resume(httpserver: HTTPServer):
+    seen = []
+    serve_cursor(httpserver, seen)
+    testservice = api_inst()
+
+    scan = testservice.paginated.cursor.scan(nomodel=True)
+    pages = iter(scan)
+    next(pages)
+    next(pages)
+    # The second page isn't finished with until the third is asked for, so the
+    # checkpoint still points at it
+    checkpoint = TinCheckpoint.from_json(scan.checkpoint.to_json())
+    assert checkpoint.params["after"] == "3"
+    assert checkpoint.number == 2
+
+    seen.clear()
+    resumed = testservice.paginated.cursor.scan(checkpoint=checkpoint, nomodel=True)
+    assert list(resumed.items()) == RECORDS[3:]
+    assert seen == ["3", "6"]
+
+
+def test_resume_offset_from_file(httpserver: HTTPServer, tmp_path):
+    seen = []
+    serve_offset(httpserver, seen)
+    testservice = api_inst()
+    checkpoint_file = str(tmp_path / "checkpoint.json")
+
+    items = testservice.paginated.offset.scan(
+        checkpoint_file=checkpoint_file, nomodel=True
+    ).items()
+    assert [next(items) for i in range(5)] == RECORDS[:5]
+    items.close()
+    assert TinCheckpoint.load(checkpoint_file).params["offset"] == 4
+
+    # A new scan, as if from a restarted process, carries on from the file
+    seen.clear()
+    scan = api_inst().paginated.offset.scan(
+        checkpoint_file=checkpoint_file, nomodel=True
+    )
+    assert list(scan.items()) == RECORDS[4:]
+    assert seen == ["4", "6"]
+    assert TinCheckpoint.load(checkpoint_file).done
+
+
+def test_resume_with_read_ahead(httpserver: HTTPServer):
+    seen = []
+    serve_cursor(httpserver, seen)
+    testservice = api_inst()
+
+    scan = testservice.paginated.cursor.scan(nomodel=True, read_ahead=2)
+    pages = iter(scan)
+    next(pages)
+    # Pages fetched ahead don't move the checkpoint on
+    assert scan.checkpoint.number == 1
+    next(pages)
+    assert scan.checkpoint.number == 2
+    pages.close()
+
+
+def test_checkpoint_wrong_method():
+    testservice = api_inst()
+    checkpoint = TinCheckpoint("testservice.paginated.offset", "http://x", {})
+
+    with pytest.raises(TinError):
+        testservice.paginated.cursor.scan(checkpoint=checkpoint)
+
+
+@pytest.mark.parametrize("data", ["not json", '{"version": 99}', "[]"])
+def test_bad_checkpoint(data):
+    with pytest.raises(TinError):
+        TinCheckpoint.from_json(data)
@@ -0,0 +1,141 @@
+import json
+import os
+import pickle
+import pytest
+
+from tin.api import TinApi
+from tin.config import TinConfig
+from tin.exceptions import TinError, TinInvalidArgs
+from tin.shard import scan_sharded, shard_ranges
+from pytest_httpserver import HTTPServer
+from werkzeug import Response
+
+RECORDS = [{"id": i, "name": "record {}".format(i)} for i in range(1, 22)]
+
+
+def clear_env():
+    for k in os.environ.keys():
+        if k.startswith("TIN"):
+            os.environ.pop(k)
+
+
+def api_inst(env="basic", config="test/data/api/testservice.yml"):
+    clear_env()
+    # Just a shortcut to keep the repeating text down
+    return TinApi(config_file=config, environment=env)
+
+
+@pytest.fixture(scope="session")
+def httpserver_listen_address():
+    return ("127.0.0.1", 5000)
+
+
+def serve_offset(httpserver, seen, total=True):
+    def handler(request):
+        seen.append((int(request.args["offset"]), int(request.args["limit"])))
+        offset = int(request.args["offset"])
+        limit = int(request.args["limit"])
+        body = {"results": RECORDS[offset : offset + limit]}
+        if total:
+            body["meta"] = {"total": len(RECORDS)}
+        return Response(json.dumps(body), content_type="application/json")
+
+    httpserver.expect_request("/api/paged/offset").respond_with_handler(handler)
+
+
+def double_id(thing):
+    # Runs in the worker, with the item as a model
+    return (os.getpid(), thing.id * 2)
+
+
+def fail(thing):
+    raise TinError("failed on {}".format(thing["id"]))
+
+
+def test_scan_sharded(httpserver: HTTPServer):
+    seen = []
+    serve_offset(httpserver, seen)
+    testservice = api_inst()
+
+    things = list(scan_sharded(testservice.paginated.offset_total, shards=3))
+    assert sorted(t.id for t in things) == [r["id"] for r in RECORDS]
+    assert all(type(t) is testservice.paginated.model for t in things)
+
+    # The probe for the total, then 21 items in 2 item pages over 3 shards of 8
+    assert seen[0] == (0, 1)
+    assert sorted(seen[1:]) == sorted([(o, 2) for o in range(0, 20, 2)] + [(20, 1)])
+
+
+def test_scan_sharded_func(httpserver: HTTPServer):
+    serve_offset(httpserver, [])
+    testservice = api_inst()
+
+    results = list(
+        scan_sharded(testservice.paginated.offset_total, shards=2, func=double_id)
+    )
+    assert sorted(r[1] for r in results) == [r["id"] * 2 for r in RECORDS]
+    pids = {r[0] for r in results}
+    assert os.getpid() not in pids
+    assert len(pids) == 2
+
+
+def test_scan_sharded_limit(httpserver: HTTPServer):
+    seen = []
+    serve_offset(httpserver, seen)
+    testservice = api_inst()
+
+    things = scan_sharded(
+        testservice.paginated.offset_total,
+        shards=2,
+        nomodel=True,
+        limit=5,
+        params={"offset": 10},
+    )
+    assert sorted(t["id"] for t in things) == [11, 12, 13, 14, 15]
+    assert all(offset < 15 for offset, limit in seen)
+
+
+def test_scan_sharded_worker_error(httpserver: HTTPServer):
+    serve_offset(httpserver, [])
+    testservice = api_inst()
+
+    with pytest.raises(TinError, match="failed on"):
+        list(scan_sharded(testservice.paginated.offset_total, nomodel=True, func=fail))
+
+
+def test_scan_sharded_stop_early(httpserver: HTTPServer):
+    serve_offset(httpserver, [])
+    testservice = api_inst()
+
+    things = scan_sharded(testservice.paginated.offset_total, shards=2)
+    next(things)
+    things.close()
+
+
+def test_scan_sharded_needs_total(httpserver: HTTPServer):
+    serve_offset(httpserver, [], total=False)
+    testservice = api_inst()
+
+    with pytest.raises(TinError):
+        scan_sharded(testservice.paginated.offset_total)
+    with pytest.raises(TinError):
+        scan_sharded(testservice.paginated.cursor)
+    with pytest.raises(TinInvalidArgs):
+        scan_sharded(testservice.paginated.offset_total, shards=0)
+
+
+def test_shard_ranges():
+    assert shard_ranges(0, 21, 3, 2) == [(0, 8), (8, 16), (16, 21)]
+    assert shard_ranges(0, 21, 3) == [(0, 7), (7, 14), (14, 21)]
+    assert shard_ranges(10, 12, 4) == [(10, 11), (11, 12)]
+
+
+def test_config_pickles():
+    clear_env()
+    conf = TinConfig("test/data/api/testservice.yml", "basic")
+    loaded = pickle.loads(pickle.dumps(conf))
+
+    assert loaded.api_name == conf.api_name
+    assert loaded.host == conf.host
+    assert loaded.apidata == conf.apidata
+    assert loaded.credentials == conf.credentials
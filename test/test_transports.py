@@ -0,0 +1,197 @@
+import os
+import pytest
+import sys
+
+import requests
+
+from pytest_httpserver import HTTPServer
+from werkzeug import Response
+
+from tin import transports
+from tin.api import TinApi
+from tin.exceptions import TinError, TinObjectNotFound
+
+TRANSPORTS = ["requests", "urllib3"]
+
+
+def clear_env():
+    for k in os.environ.keys():
+        if k.startswith("TIN"):
+            os.environ.pop(k)
+
+
+def api_inst(env="basic", transport=None, config="test/data/api/testservice.yml"):
+    clear_env()
+    if transport is not None:
+        os.environ["TIN__ENVIRONMENTS__{}__TRANSPORT".format(env.upper())] = transport
+    try:
+        return TinApi(config_file=config, environment=env)
+    finally:
+        clear_env()
+
+
+@pytest.fixture(scope="session")
+def httpserver_listen_address():
+    return ("127.0.0.1", 5000)
+
+
+def seen(httpserver):
+    """The requests the server got, as comparable tuples"""
+    return [
+        (
+            request.method,
+            request.full_path,
+            {k.lower(): v for k, v in request.headers.items()},
+            request.get_data(),
+        )
+        for request, _ in httpserver.log
+    ]
+
+
+class Custom(requests.auth.AuthBase):
+    def __call__(self, r):
+        r.headers["X-Custom"] = "yes"
+        return r
+
+
+def test_build_transport():
+    assert type(api_inst().transport) is transports.RequestsTransport
+    assert type(api_inst(transport="urllib3").transport) is (
+        transports.Urllib3Transport
+    )
+    assert type(api_inst(transport="tin.transports.Urllib3Transport").transport) is (
+        transports.Urllib3Transport
+    )
+
+    with pytest.raises(TinError):
+        api_inst(transport="nonsense")
+    with pytest.raises(TinError):
+        api_inst(transport="tin.api.TinApi")
+
+
+def test_http2_needs_httpx(monkeypatch):
+    monkeypatch.setitem(sys.modules, "httpx", None)
+    with pytest.raises(TinError):
+        api_inst(transport="http2")
+
+
+def test_add_query():
+    assert transports.add_query("http://h/p", "") == "http://h/p"
+    assert transports.add_query("http://h/p", "a=1") == "http://h/p?a=1"
+    assert transports.add_query("http://h/p?b=2#top", "a=1") == "http://h/p?b=2&a=1#top"
+
+
+@pytest.mark.parametrize("env", ["basic", "param", "header", "no_auth"])
+@pytest.mark.parametrize(
+    "method,kwargs",
+    [
+        ("hasmethods.list", {"params": {"q": "a b/c"}}),
+        ("payloads.json", {"data": {"send": "this"}}),
+        ("payloads.form", {"data": {"field": ["one", "two"]}}),
+        ("payloads.upload", {"data": b"\x00\x01binary"}),
+    ],
+)
+def test_same_requests(httpserver: HTTPServer, env, method, kwargs):
+    httpserver.expect_request("/api/things").respond_with_json([])
+    httpserver.expect_request("/api/things/payloadtest").respond_with_json({})
+    httpserver.expect_request("/api/things/upload").respond_with_json({})
+
+    sent = {}
+    for transport in TRANSPORTS:
+        httpserver.clear_log()
+        cls_name, mth_name = method.split(".")
+        api = api_inst(env, transport)
+        getattr(api.get_class(cls_name), mth_name)(**dict(kwargs))
+        sent[transport] = seen(httpserver)
+
+    assert sent["urllib3"] == sent["requests"]
+    assert len(sent["urllib3"]) == 1
+
+
+def test_same_requests_custom_auth(httpserver: HTTPServer):
+    httpserver.expect_request("/api/things").respond_with_json([])
+
+    sent = {}
+    for transport in TRANSPORTS:
+        httpserver.clear_log()
+        api = api_inst("no_auth", transport)
+        api.set_auth(Custom())
+        api.hasmethods.list()
+        sent[transport] = seen(httpserver)
+
+    assert sent["urllib3"] == sent["requests"]
+    assert sent["urllib3"][0][2]["x-custom"] == "yes"
+
+
+def test_param_auth(httpserver: HTTPServer):
+    httpserver.expect_request(
+        "/api/things",
+        query_string="thing=stuff&username=fakeuser&password=fakepassword",
+    ).respond_with_json(["one"])
+
+    for transport in TRANSPORTS:
+        assert api_inst("param", transport).hasmethods.list() == ["one"]
+
+
+def test_urllib3_response(httpserver: HTTPServer):
+    httpserver.expect_request("/api/things").respond_with_json(
+        ["one"], headers={"X-Thing": "yes"}
+    )
+    testservice = api_inst(transport="urllib3")
+
+    things = testservice.hasmethods.list()
+    assert things == ["one"]
+    assert type(things.response) is requests.Response
+    assert things.response.headers["x-thing"] == "yes"
+    assert things.response.url == ("http://localhost:5000/api/things?thing=stuff")
+    assert things.timing["elapsed"] > 0
+
+
+def test_urllib3_errors(httpserver: HTTPServer):
+    httpserver.expect_request("/api/things/1").respond_with_data("nope", status=404)
+    testservice = api_inst(transport="urllib3")
+
+    with pytest.raises(TinObjectNotFound):
+        testservice.hasmethods.get(1)
+
+    testservice.conf.set("port", 1)
+    unreachable = TinApi(config=testservice.conf)
+    with pytest.raises(requests.exceptions.ConnectionError):
+        unreachable.hasmethods.list()
+
+
+def test_urllib3_redirect(httpserver: HTTPServer):
+    httpserver.expect_request("/api/things").respond_with_response(
+        Response(status=302, headers={"Location": "/api/other"})
+    )
+    httpserver.expect_request("/api/other").respond_with_json(["moved"])
+
+    things = api_inst(transport="urllib3").hasmethods.list()
+    assert things == ["moved"]
+    assert things.response.url == "http://localhost:5000/api/other"
+
+
+def test_urllib3_pagination(httpserver: HTTPServer):
+    httpserver.expect_request(
+        "/api/paged/link", query_string="p=2&thing=stuff"
+    ).respond_with_json({"results": [{"id": 3}]})
+    httpserver.expect_request("/api/paged/link").respond_with_json(
+        {"results": [{"id": 1}, {"id": 2}]},
+        headers={"link": '<http://localhost:5000/api/paged/link?p=2>; rel="next"'},
+    )
+    testservice = api_inst(transport="urllib3")
+
+    response = testservice.paginated.link(nomodel=True)
+    assert [r["id"] for r in response["results"]] == [1, 2, 3]
+
+
+def test_urllib3_streams(httpserver: HTTPServer):
+    httpserver.expect_request("/api/exports/things").respond_with_data(
+        '{"id": 1}\n{"id": 2}\n'
+    )
+    httpserver.expect_request("/api/exports/archive").respond_with_data(b"abcdefghij")
+    testservice = api_inst(transport="urllib3")
+
+    assert list(testservice.exports.ndjson(nomodel=True)) == [{"id": 1}, {"id": 2}]
+    download = testservice.exports.binary(output=bytearray())
+    assert download.output == bytearray(b"abcdefghij")
@@ -0,0 +1,305 @@
+import logging
+import os
+import socket
+import ssl
+
+import requests
+import requests.adapters
+import requests.utils
+import urllib3.connection
+import urllib3.connectionpool
+import urllib3.exceptions
+import urllib3.poolmanager
+import urllib3.util.timeout
+from urllib3.util.ssl_ import create_urllib3_context
+
+from . import pool
+
+logger = logging.getLogger(__name__)
+
+
+def ssl_context(verify=True, cert=None, alpn=None):
+    """Returns the process's TLS context for ssl settings, building it once
+
+    Args:
+        verify (bool|str): The ssl verify setting, True for requests' CA bundle,
+            False, or a CA bundle file or directory
+        cert (str|list|None): The ssl cert setting, a client cert path, or cert
+            and key paths
+        alpn (tuple|None): Protocols to offer in ALPN, e.g. ("h2", "http/1.1").
+            Contexts offering them are kept apart from those that don't, as
+            urllib3 sets its own on the contexts it's given.
+
+    Returns:
+        ssl.SSLContext
+
+    Raises:
+        OSError|ssl.SSLError: If the CA bundle or client cert can't be loaded
+    """
+    key = (pool._hashable(verify), pool._hashable(cert), pool._hashable(alpn))
+    with pool._ssl_contexts_lock:
+        context = pool._ssl_contexts.get(key, None)
+        if context is not None:
+            return context
+
+        if verify:
+            context = create_urllib3_context(cert_reqs=ssl.CERT_REQUIRED)
+            location = (
+                requests.utils.DEFAULT_CA_BUNDLE_PATH if verify is True else verify
+            )
+            if os.path.isdir(location):
+                context.load_verify_locations(capath=location)
+            else:
+                context.load_verify_locations(cafile=location)
+            # urllib3 1.x leaves it off to match hostnames itself, which httpx
+            # doesn't do
+            context.check_hostname = True
+        else:
+            context = create_urllib3_context(cert_reqs=ssl.CERT_NONE)
+
+        if cert:
+            if isinstance(cert, (list, tuple)):
+                context.load_cert_chain(*cert)
+            else:
+                context.load_cert_chain(cert)
+
+        if alpn:
+            context.set_alpn_protocols(list(alpn))
+
+        pool._ssl_contexts[key] = context
+        return context
+
+
+def pool_manager(verify=True, cert=None, socket_path=None):
+    """Returns a new urllib3 pool manager whose HTTPS connections use the TLS
+    context for ssl settings, sized as requests' adapters are
+
+    Args:
+        verify (bool|str): The ssl verify setting
+        cert (str|list|None): The ssl cert setting
+        socket_path (str|None): A Unix domain socket to connect over
+
+    Returns:
+        urllib3.PoolManager
+    """
+    kwargs = {
+        "num_pools": requests.adapters.DEFAULT_POOLSIZE,
+        "maxsize": requests.adapters.DEFAULT_POOLSIZE,
+        "cert_reqs": "CERT_REQUIRED" if verify else "CERT_NONE",
+    }
+    try:
+        kwargs["ssl_context"] = ssl_context(verify, cert)
+    except (OSError, ssl.SSLError) as e:
+        # Given as files instead, so HTTPS connections report it as requests'
+        # would, and plain HTTP ones still work
+        logger.debug("Could not build a TLS context: {}".format(e))
+        if isinstance(verify, str):
+            kwargs["ca_cert_dir" if os.path.isdir(verify) else "ca_certs"] = verify
+        if isinstance(cert, (list, tuple)):
+            kwargs["cert_file"], kwargs["key_file"] = cert
+        elif cert:
+            kwargs["cert_file"] = cert
+
+    if socket_path is not None:
+        return UnixSocketPoolManager(socket_path, **kwargs)
+    return urllib3.poolmanager.PoolManager(**kwargs)
+
+
+class TinHTTPAdapter(requests.adapters.HTTPAdapter):
+    """An HTTPAdapter for one set of ssl settings, whose HTTPS connections share a
+    single TLS context
+
+    urllib3 loads the CA bundle, and any client cert, for every new connection
+    it's given file names for. This adapter gives connections a context with them
+    already loaded instead. Requests with other settings than the adapter's, e.g.
+    a CA bundle from REQUESTS_CA_BUNDLE, are made as HTTPAdapter makes them.
+
+    Args:
+        verify (bool|str): The ssl verify setting
+        cert (str|list|None): The ssl cert setting
+        **kwargs: Passed to HTTPAdapter
+    """
+
+    def __init__(self, verify=True, cert=None, **kwargs):
+        self.verify = verify
+        self.cert = cert
+        self._ssl_context = None
+        self._ssl_context_built = False
+        super().__init__(**kwargs)
+
+    @property
+    def ssl_context(self):
+        """The TLS context, built when first needed, or None if it can't be"""
+        if not self._ssl_context_built:
+            try:
+                self._ssl_context = ssl_context(self.verify, self.cert)
+            except (OSError, ssl.SSLError) as e:
+                # Left for the requests themselves to report
+                logger.debug("Could not build a TLS context: {}".format(e))
+            self._ssl_context_built = True
+        return self._ssl_context
+
+    def _uses_context(self, url, verify, cert):
+        """Whether a request's connection should use the adapter's context"""
+        return (
+            url.lower().startswith("https:")
+            and pool._hashable(verify) == pool._hashable(self.verify)
+            and pool._hashable(cert) == pool._hashable(self.cert)
+            and self.ssl_context is not None
+        )
+
+    def init_poolmanager(self, connections, maxsize, block=False, **pool_kwargs):
+        # Given to every HTTPS pool, as requests before 2.32 make them all alike
+        if self.ssl_context is not None:
+            pool_kwargs.setdefault("ssl_context", self.ssl_context)
+        super().init_poolmanager(connections, maxsize, block=block, **pool_kwargs)
+
+    def build_connection_pool_key_attributes(self, request, verify, cert=None):
+        # Only called by requests 2.32 and later, which keep pools apart by ssl
+        # settings
+        host_params, pool_kwargs = super().build_connection_pool_key_attributes(
+            request, verify, cert
+        )
+        if self._uses_context(request.url, verify, cert):
+            # The context has them loaded already
+            for name in ["ca_certs", "ca_cert_dir", "cert_file", "key_file"]:
+                pool_kwargs.pop(name, None)
+            pool_kwargs["ssl_context"] = self.ssl_context
+        else:
+            # Removes the pool manager's, so a pool of its own is made
+            pool_kwargs["ssl_context"] = None
+        return host_params, pool_kwargs
+
+    def cert_verify(self, conn, url, verify, cert):
+        if not self._uses_context(url, verify, cert):
+            # Older requests share pools between ssl settings, and set them on
+            # the pool for each request. The files are then loaded for each
+            # connection, rather than into the shared context.
+            if self.ssl_context is not None and (
+                conn.conn_kw.get("ssl_context", None) is self.ssl_context
+            ):
+                del conn.conn_kw["ssl_context"]
+            return super().cert_verify(conn, url, verify, cert)
+
+        conn.conn_kw["ssl_context"] = self.ssl_context
+        conn.cert_reqs = "CERT_REQUIRED" if verify else "CERT_NONE"
+        conn.ca_certs = None
+        conn.ca_cert_dir = None
+        conn.cert_file = None
+        conn.key_file = None
+
+
+class UnixSocketConnectionMixin(object):
+    """Makes a urllib3 connection connect to a Unix domain socket rather than to
+    its host and port, which are still used for the Host header and TLS"""
+
+    def __init__(self, *args, socket_path=None, **kwargs):
+        self.socket_path = socket_path
+        super().__init__(*args, **kwargs)
+
+    def _new_conn(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            # Left as the socket module's default unless one was given, as
+            # urllib3 does for the connections it makes
+            if self.timeout is not urllib3.util.timeout.Timeout.DEFAULT_TIMEOUT:
+                sock.settimeout(self.timeout)
+            sock.connect(self.socket_path)
+        except socket.timeout as e:
+            sock.close()
+            raise urllib3.exceptions.ConnectTimeoutError(
+                self,
+                "Connection to {} timed out. (connect timeout={})".format(
+                    self.socket_path, self.timeout
+                ),
+            ) from e
+        except OSError as e:
+            sock.close()
+            raise urllib3.exceptions.NewConnectionError(
+                self,
+                "Failed to establish a new connection to {}: {}".format(
+                    self.socket_path, e
+                ),
+            ) from e
+        return sock
+
+
+class UnixHTTPConnection(UnixSocketConnectionMixin, urllib3.connection.HTTPConnection):
+    pass
+
+
+class UnixHTTPSConnection(
+    UnixSocketConnectionMixin, urllib3.connection.HTTPSConnection
+):
+    pass
+
+
+class UnixHTTPConnectionPool(urllib3.connectionpool.HTTPConnectionPool):
+    ConnectionCls = UnixHTTPConnection
+
+
+class UnixHTTPSConnectionPool(urllib3.connectionpool.HTTPSConnectionPool):
+    ConnectionCls = UnixHTTPSConnection
+
+
+class UnixSocketPoolManager(urllib3.poolmanager.PoolManager):
+    """A PoolManager whose pools all connect to one Unix domain socket. Pools are
+    still kept per scheme, host and port, as requests are sent with them."""
+
+    def __init__(self, socket_path, **kwargs):
+        self.socket_path = socket_path
+        super().__init__(**kwargs)
+        self.pool_classes_by_scheme = {
+            "http": UnixHTTPConnectionPool,
+            "https": UnixHTTPSConnectionPool,
+        }
+
+    def _new_pool(self, scheme, host, port, request_context=None):
+        if request_context is None:
+            request_context = self.connection_pool_kw.copy()
+        # Added here rather than to connection_pool_kw, which must only hold
+        # urllib3's pool key fields
+        request_context = dict(request_context, socket_path=self.socket_path)
+        return super()._new_pool(scheme, host, port, request_context)
+
+
+class UnixSocketAdapter(TinHTTPAdapter):
+    """A TinHTTPAdapter sending every request over a Unix domain socket, e.g. to
+    a local sidecar proxy
+
+    URLs keep their scheme, host and port, so the Host header, and for https the
+    server name and certificate checks, are those of the API. Proxies from the
+    environment are ignored, as the socket is the way to the API.
+
+    Args:
+        socket_path (str): Path of the socket
+        verify (bool|str): The ssl verify setting
+        cert (str|list|None): The ssl cert setting
+        **kwargs: Passed to HTTPAdapter
+    """
+
+    def __init__(self, socket_path, verify=True, cert=None, **kwargs):
+        # Needed by init_poolmanager(), which HTTPAdapter calls
+        self.socket_path = socket_path
+        super().__init__(verify=verify, cert=cert, **kwargs)
+
+    def init_poolmanager(self, connections, maxsize, block=False, **pool_kwargs):
+        if self.ssl_context is not None:
+            pool_kwargs.setdefault("ssl_context", self.ssl_context)
+        self._pool_connections = connections
+        self._pool_maxsize = maxsize
+        self._pool_block = block
+        self.poolmanager = UnixSocketPoolManager(
+            self.socket_path,
+            num_pools=connections,
+            maxsize=maxsize,
+            block=block,
+            **pool_kwargs,
+        )
+
+    def send(
+        self, request, stream=False, timeout=None, verify=True, cert=None, proxies=None
+    ):
+        return super().send(
+            request, stream=stream, timeout=timeout, verify=verify, cert=cert
+        )
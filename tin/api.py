@@ -1,16 +1,65 @@
+import collections
+import functools
+import gzip
+import itertools
+import logging
+import os
+import queue
 import re
-import requests
-import simplejson as json
-import urllib
-
-from .auth import HTTPGenericHeaderAuth, HTTPGenericParameterAuth
+import select
+import threading
+import time
+import urllib.parse
+import weakref
+import zlib
+
+from . import pool, transports
 from .base import TinApiBase, TinApiClass
 from .config import TinConfig
 from .exceptions import TinInvalidArgs, TinError, TinObjectNotFound
-from .models import TinApiModelFactory
+from .lazy import lazy_import
+from .models import TinApiModel, TinApiModelFactory
+from .pagination import TinPage, build_paginator
+from .registry import rebuild_api, rebuild_object, register, registry_key
 from .response import TinApiResponseFactory
+from .scan import TinScan
+from .spill import TinSpilledList
+
+# Loaded when first used, see lazy_import()
+deepmerge = lazy_import("deepmerge")
+futures = lazy_import("concurrent.futures")
+json = lazy_import("simplejson")
+requests = lazy_import("requests")
+ssl = lazy_import("ssl")
+tempfile = lazy_import("tempfile")
+
+RESPONSE_FORMATS = ["json", "ndjson", "binary"]
+DEFAULT_CHUNK_SIZE = 64 * 1024
+REQUEST_COMPRESSIONS = [None, "gzip", "deflate"]
+DEFAULT_COMPRESS_MIN_SIZE = 1024
+DEFAULT_PARALLEL_PAGES = 1
+DEFAULT_READ_AHEAD = 0
+DEFAULT_WARM_TIMEOUT = 10
+TLS_TICKET_WAIT = 0.05
+
+logger = logging.getLogger(__name__)
+
+# Every TinApi in the process, so their sessions can be replaced after a fork
+_live_apis = weakref.WeakSet()
 
-from deepmerge import always_merger
+
+def _reset_after_fork():
+    # After the hooks of the modules imported above, which give the child new
+    # locks. Before the sessions, so they mount new adapters.
+    pool.reset()
+    for api in list(_live_apis):
+        api._reset_session()
+        # Built again when next used, taking new shared pools
+        api._transport = None
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
 
 
 class TinApi(TinApiClass):
@@ -28,6 +77,13 @@ class TinApi(TinApiClass):
         tokenre (sre): Compiled regex for locating tokens in the url path string
     """
 
+    # Base types for the classes and models built from the config, by obj_path.
+    # Modules written by `tin generate` set these to their own classes, and the
+    # methods' settings, from TinApiMethod.settings(), to ones already worked out.
+    _class_bases = {}
+    _model_bases = {}
+    _method_settings = {}
+
     def __init__(self, config=None, **kwargs):
         super().__init__()
 
@@ -42,98 +98,366 @@ class TinApi(TinApiClass):
         self.obj_path = self.conf.api_name
 
         self._headers = self.conf.headers
+        # What methods' headers start from. Methods are built when first used,
+        # so this keeps set_headers() from reaching some of them but not others.
+        self._method_headers = dict(self._headers)
         self._auth_obj = self._default_auth()
 
         self._session = requests.Session() if self.conf.use_session else None
+        # Origins whose shared adapters are mounted on the session, see _mount()
+        self._mounted = set()
+        self._transport = transports.build_transport(self)
+        _live_apis.add(self)
 
         self.tokenre = re.compile(":([a-zA-Z0-9_-]+)")
 
         self._model_factory = TinApiModelFactory()
+        self._registry_key = registry_key(self.conf)
         self._recurse_build_method_path(self, self.conf.apidata, self.obj_path)
 
+        # So pickled classes, methods and models can find their way back here
+        register(self)
+
+        if self.conf.get("prewarm"):
+            self._prewarm(self.conf.prewarm)
+
+    def __reduce__(self):
+        # Pickles as the config, plus headers and auth that may have been changed
+        # since. The tree is built again when unpickled.
+        return (
+            rebuild_api,
+            (
+                self._registry_key,
+                {
+                    "_headers": self._headers,
+                    "_method_headers": self._method_headers,
+                    "_auth_obj": self._auth_obj,
+                },
+            ),
+        )
+
     def _recurse_build_method_path(self, obj, api_data, obj_path=None):
+        """Adds the classes in api_data to obj. Classes, and their methods and
+        models, are only built when first accessed, so a process pays only for the
+        parts of the API it uses.
+
+        Args:
+            obj (TinApiClass): The object to add classes to
+            api_data (dict): The API config for obj's children
+            obj_path (str): obj's obj_path
+        """
 
         if obj_path is None:
             obj_path = self.conf.api_name
 
         for cls_name, cls_data in api_data.items():
+            obj.add_pending_class(
+                cls_name,
+                functools.partial(self._build_class, obj, cls_name, cls_data, obj_path),
+            )
+
+    def _build_class(self, obj, cls_name, cls_data, obj_path):
+        """Builds one class of the API, with its model and methods, and adds it to
+        obj"""
+
+        container_path = "{}.{}".format(obj_path, cls_name)
+        new_type = type(
+            cls_name, (self._class_bases.get(container_path, TinApiClass),), {}
+        )
+        setattr(new_type, "_obj_path", container_path)
+        setattr(new_type, "_registry_key", self._registry_key)
 
-            new_type = type(cls_name, (TinApiClass,), {})
-            container_path = "{}.{}".format(obj_path, cls_name)
-            setattr(new_type, "_obj_path", container_path)
+        if cls_data.get("model"):
 
-            if cls_data.get("model"):
+            model_data = self.conf.models.get(cls_data["model"], {})
+            model_path = "{}.{}".format(container_path, cls_data["model"])
+            model_type = self._model_factory(
+                cls_data["model"],
+                model_data,
+                self._model_bases.get(model_path, TinApiModel),
+            )
+            setattr(new_type, "_model", model_type)
+            setattr(model_type, "_registry_key", self._registry_key)
+            setattr(model_type, "_obj_path", model_path)
 
-                model_data = self.conf.models.get(cls_data["model"], {})
-                model_type = self._model_factory(cls_data["model"], model_data)
-                setattr(new_type, "_model", model_type)
+        for attr in ["list_data_key", "singleton_data_key"]:
+            if cls_data.get(attr):
                 setattr(
-                    model_type,
-                    "_obj_path",
-                    "{}.{}".format(container_path, cls_data["model"]),
+                    new_type,
+                    attr,
+                    cls_data.get(attr),
                 )
 
-            for attr in ["list_data_key", "singleton_data_key"]:
-                if cls_data.get(attr):
-                    setattr(
-                        new_type,
-                        attr,
-                        cls_data.get(attr),
-                    )
+        new_obj = new_type()
 
-            new_obj = new_type()
+        if cls_data.get("methods"):
+            # If a child node has 'methods', it's an endpoint
 
-            obj.add_class(cls_name, new_obj)
+            crud_methods = ["create", "read", "update", "delete"]
 
-            if cls_data.get("methods"):
-                # If a child node has 'methods', it's an endpoint
-
-                crud_methods = ["create", "read", "update", "delete"]
-
-                # For each defined method, add an TinApiMethod as
-                # an attribute in the current TinApiClass instance
-                for mth, mth_data in cls_data["methods"].items():
-
-                    new_method = TinApiMethod(self, new_obj, mth, mth_data)
-                    new_method.obj_path = "{}.{}".format(container_path, mth)
-
-                    new_obj.add_method(mth, new_method)
-
-                    # If there is an associated model, it will get ome of the same
-                    # methods as the parent class
-                    if hasattr(new_type, "_model") and new_type._model is not None:
-                        if mth_data.get("model_method_add", None) is False:
-                            continue
-
-                        if (
-                            mth_data.get("model_method_add", None) is True
-                            or cls_data.get("model_methods_add_all", None) is True
-                        ):
-                            method_name = mth_data.get("model_method_name") or mth
-                            new_obj.model.add_method(method_name, new_method)
-
-                            if "crud_label" in mth_data:
-                                crud_method = mth_data["crud_label"].lower()
-                                if crud_method in crud_methods:
-                                    new_obj.model.CRUD_METHODS[
-                                        crud_method
-                                    ] = new_obj.model.get_method(method_name)
-
-                                    # There can be only one method assigned to each CRUD
-                                    # action. As we assign them, remove them from the
-                                    # list. If a second/duplicate label shows up in the
-                                    # config, it'll just be ignored for not being in
-                                    # crud_methods
-                                    crud_methods.remove(crud_method)
+            # For each defined method, add an TinApiMethod as
+            # an attribute in the current TinApiClass instance
+            for mth, mth_data in cls_data["methods"].items():
+
+                method_path = "{}.{}".format(container_path, mth)
+                new_method = TinApiMethod(
+                    self,
+                    new_obj,
+                    mth,
+                    mth_data,
+                    settings=self._method_settings.get(method_path, None),
+                )
+                new_method.obj_path = method_path
+
+                new_obj.add_method(mth, new_method)
+
+                # If there is an associated model, it will get ome of the same
+                # methods as the parent class
+                if hasattr(new_type, "_model") and new_type._model is not None:
+                    if mth_data.get("model_method_add", None) is False:
+                        continue
+
+                    if (
+                        mth_data.get("model_method_add", None) is True
+                        or cls_data.get("model_methods_add_all", None) is True
+                    ):
+                        method_name = mth_data.get("model_method_name") or mth
+                        new_obj.model.add_method(method_name, new_method)
+
+                        if "crud_label" in mth_data:
+                            crud_method = mth_data["crud_label"].lower()
+                            if crud_method in crud_methods:
+                                new_obj.model.CRUD_METHODS[
+                                    crud_method
+                                ] = new_obj.model.get_method(method_name)
+
+                                # There can be only one method assigned to each CRUD
+                                # action. As we assign them, remove them from the
+                                # list. If a second/duplicate label shows up in the
+                                # config, it'll just be ignored for not being in
+                                # crud_methods
+                                crud_methods.remove(crud_method)
+
+        else:
+            # If there are no methods, it's a container class
+            self._recurse_build_method_path(new_obj, cls_data, container_path)
+
+        # Only added once complete, so a failed build can be retried
+        obj.add_class(cls_name, new_obj)
+
+    def _reset_session(self):
+        """Replaces the session with a new one, keeping its cookies. Called in
+        forked children, so they don't share the parent's pooled connections."""
+        if self._session is None:
+            return
+        session = requests.Session()
+        session.cookies.update(self._session.cookies)
+        # The old session's sockets belong to the parent, so it isn't closed.
+        # Collecting it only closes this process's copies of them.
+        self._session = session
+
+        mounted = self._mounted
+        self._mounted = set()
+        for origin in mounted:
+            self._mount(*origin)
+
+    def _mount(self, scheme, host, port):
+        """Mounts the process's shared adapter for an origin on the session, so
+        every TinApi calling it with the same TLS settings uses the same pool of
+        connections. Headers and auth are still sent per request, by each API.
+        The adapter's HTTPS connections share one TLS context, see TinHTTPAdapter.
+        With socket_path set, it connects over that Unix domain socket.
+
+        Args:
+            scheme (str): http or https
+            host (str): The host name
+            port (int|str): The port
+        """
+        origin = (scheme, host, port)
+        if self._session is None or origin in self._mounted:
+            return
+
+        ssl = self.conf.ssl or {}
+        socket_path = self.conf.get("socket_path")
+        key = pool.pool_key(
+            scheme,
+            host,
+            port,
+            ssl.get("verify", True),
+            ssl.get("cert", None),
+            os.path.expanduser(socket_path) if socket_path else None,
+        )
+        if self.conf.get("share_connections") is False:
+            adapter = pool.new_adapter(key)
+        else:
+            adapter = pool.shared_adapter(key)
+        for prefix in pool.mount_prefixes(scheme, host, port):
+            self._session.mount(prefix, adapter)
+        self._mounted.add(origin)
+
+    def origins(self, api_data=None):
+        """Returns the distinct origins the API's methods call, worked out from
+        the config, so without building any classes
+
+        Args:
+            api_data (dict): Optional part of the API config to look in
+
+        Returns:
+            list: Sorted (scheme, host, port) tuples
+        """
+        if api_data is None:
+            api_data = self.conf.apidata
 
+        origins = set()
+        for cls_data in api_data.values():
+            if not isinstance(cls_data, dict):
+                continue
+            if cls_data.get("methods"):
+                for mth_data in cls_data["methods"].values():
+                    origins.add(
+                        (
+                            mth_data.get("scheme", self.conf.scheme),
+                            mth_data.get("host", self.conf.host),
+                            int(mth_data.get("port", self.conf.port)),
+                        )
+                    )
             else:
-                # If there are no methods, it's a container class
-                self._recurse_build_method_path(new_obj, cls_data, container_path)
+                origins.update(self.origins(cls_data))
+        return sorted(origins)
+
+    def warm(self, connections=1, background=False, timeout=DEFAULT_WARM_TIMEOUT):
+        """Opens keep-alive connections to each origin the API calls, so the
+        first calls don't wait for DNS, TCP and TLS set up
+
+        The connections are left in the session's pools, up to each pool's size,
+        where calls pick them up. Origins that can't be reached, or are reached
+        through a proxy, are skipped. Servers may still close connections that
+        stay idle for long.
+
+        Args:
+            connections (int): Number of connections to open to each origin
+            background (bool): If True, connect in a daemon thread and return it
+            timeout (float): Connect timeout, in seconds, for each connection
+
+        Returns:
+            int|threading.Thread: The number of connections opened, or the
+                thread opening them
+        """
+        if not self.transport.pooled:
+            raise TinError("warm() needs use_session, there's no pool to keep")
+        if not isinstance(connections, int) or connections < 1:
+            raise TinInvalidArgs("connections must be a positive integer")
+
+        if background:
+            thread = threading.Thread(
+                target=self.warm,
+                args=(connections, False, timeout),
+                name="tin-warm-{}".format(self.obj_path),
+                daemon=True,
+            )
+            thread.start()
+            return thread
+
+        opened = 0
+        for origin in self.origins():
+            self._mount(*origin)
+            try:
+                opened += self._warm_origin(*origin, connections, timeout)
+            except Exception as e:
+                # Only an optimization, the calls themselves will report it
+                logger.warning("Could not warm {}://{}:{}: {}".format(*origin, e))
+        return opened
+
+    def _warm_origin(self, scheme, host, port, connections, timeout):
+        """Opens connections to one origin, the way the session would for a call,
+        and returns how many were opened"""
+        conn_pool = self.transport.connection_pool(scheme, host, port)
+        if conn_pool is None:
+            logger.debug(
+                "Not warming {}://{}:{}, it's reached through a proxy, or its "
+                "transport has no pool to warm".format(scheme, host, port)
+            )
+            return 0
+
+        # Connections beyond the pool's size would only be thrown away
+        pool_size = getattr(getattr(conn_pool, "pool", None), "maxsize", connections)
+        held = []
+        opened = []
+        try:
+            for _ in range(min(connections, pool_size or connections)):
+                conn = conn_pool._get_conn()
+                held.append(conn)
+                if getattr(conn, "sock", None) is None:
+                    conn.timeout = timeout
+                    conn.connect()
+                    opened.append(conn)
+            self._read_tls_tickets(opened)
+        finally:
+            for conn in held:
+                conn_pool._put_conn(conn)
+
+        return len(opened)
+
+    def _read_tls_tickets(self, conns, wait=TLS_TICKET_WAIT):
+        """Reads the session tickets TLS 1.3 servers send just after the handshake.
+        Left unread, they make idle connections look readable, which urllib3
+        takes to mean the server closed them."""
+        socks = {
+            conn.sock: conn
+            for conn in conns
+            if isinstance(getattr(conn, "sock", None), ssl.SSLSocket)
+        }
+        deadline = time.monotonic() + wait
+        while socks and time.monotonic() < deadline:
+            readable, _, _ = select.select(
+                list(socks), [], [], max(deadline - time.monotonic(), 0)
+            )
+            for sock in readable:
+                timeout = sock.gettimeout()
+                sock.setblocking(False)
+                try:
+                    sock.recv(1)
+                except ssl.SSLWantReadError:
+                    # Only handshake messages, the connection is still idle
+                    continue
+                finally:
+                    sock.settimeout(timeout)
+                # Data or EOF before any request, so it can't be used
+                socks.pop(sock).close()
+
+    def _prewarm(self, prewarm):
+        """Warms the API as set by the prewarm config key, either a number of
+        connections or a dict of warm() arguments"""
+        if isinstance(prewarm, dict):
+            kwargs = dict(prewarm)
+        else:
+            kwargs = {"connections": prewarm}
+
+        # Values from env vars are strings
+        if "connections" in kwargs:
+            kwargs["connections"] = int(kwargs["connections"])
+        if isinstance(kwargs.get("background", None), str):
+            kwargs["background"] = kwargs["background"].lower() == "true"
+        if "timeout" in kwargs:
+            kwargs["timeout"] = float(kwargs["timeout"])
+
+        self.warm(**kwargs)
+
+    @property
+    def transport(self):
+        """The TinTransport the API's methods send requests with, as set by the
+        transport config key"""
+        if self._transport is None:
+            self._transport = transports.build_transport(self)
+        return self._transport
 
     @property
     def request(self):
         if self._session:
             return self._session
+        # The module itself, rather than its lazy stand-in
+        import requests
+
         return requests
 
     @property
@@ -162,15 +486,137 @@ class TinApi(TinApiClass):
                 self.conf.credentials.get("password", None),
             )
         elif self.conf.auth_type == "header":
+            # The auth module imports requests, so only import it when needed
+            from .auth import HTTPGenericHeaderAuth
+
             return HTTPGenericHeaderAuth(self.conf.credentials)
         elif self.conf.auth_type == "param":
+            from .auth import HTTPGenericParameterAuth
+
             return HTTPGenericParameterAuth(self.conf.credentials)
         else:
             return None
 
 
+class TinApiCall(object):
+    """The prepared arguments of one call to a TinApiMethod
+
+    Attributes:
+        url (str): The url, with path tokens replaced
+        params (dict): Query parameters
+        headers (dict): Request headers, with lowered key names
+        body (any): The encoded request body, if any
+        paginate (bool): Whether to follow further pages
+        nomodel (bool): If True, don't wrap response data in models
+        output (any): Where binary responses are written
+        timing (dict): Timing data gathered while preparing the request
+        parallel_pages (int): Number of pages that may be fetched concurrently
+        read_ahead (int): Number of pages that may be fetched ahead of the one
+            being consumed, when iterating
+        limit (int|None): Stop fetching pages once this many items are fetched
+        max_pages (int|None): Stop fetching pages after this many
+        spill_threshold (int|None): Bytes of page bodies after which merged items
+            are moved to a temporary file
+        resume_from (TinCheckpoint|None): Where to start fetching pages from,
+            instead of the first page
+    """
+
+    def __init__(
+        self,
+        url,
+        params,
+        headers,
+        body,
+        paginate=True,
+        nomodel=False,
+        output=None,
+        timing=None,
+        parallel_pages=DEFAULT_PARALLEL_PAGES,
+        read_ahead=DEFAULT_READ_AHEAD,
+        limit=None,
+        max_pages=None,
+        spill_threshold=None,
+    ):
+        self.url = url
+        self.params = params
+        self.headers = headers
+        self.body = body
+        self.paginate = paginate
+        self.nomodel = nomodel
+        self.output = output
+        self.timing = timing or {}
+        self.parallel_pages = parallel_pages
+        self.read_ahead = read_ahead
+        self.limit = limit
+        self.max_pages = max_pages
+        self.spill_threshold = spill_threshold
+        self.resume_from = None
+
+        # Bodies read as they're sent, which following pages must send again
+        self.streamed = (
+            hasattr(body, "read")
+            or hasattr(body, "__next__")
+            or isinstance(body, TinSizedIterable)
+        )
+        self._body_start = None
+        if hasattr(body, "seekable") and body.seekable():
+            self._body_start = body.tell()
+        self._body_sent = False
+
+    def request_body(self):
+        """Returns the body to send with a request of the call, rewinding a
+        seekable file body to where it started
+
+        Raises:
+            TinInvalidArgs: If a streamed body that can't be rewound, e.g. a
+                generator, was sent already
+        """
+        if self._body_start is not None:
+            self.body.seek(self._body_start)
+        elif self.streamed and self._body_sent:
+            raise TinInvalidArgs(
+                "The request body was streamed and can't be sent again for "
+                "the next page. Pass bytes or a seekable file to paginate."
+            )
+        self._body_sent = True
+        return self.body
+
+    def done(self, page):
+        """Returns True if no pages are wanted after the given one"""
+        if self.limit is not None and page.fetched >= self.limit:
+            return True
+        if self.max_pages is not None and page.number >= self.max_pages:
+            return True
+        return False
+
+    def trim_requests(self, requests_to_make, page):
+        """Drops precomputed page requests that the limits say aren't wanted,
+        guessing items per page from the given page"""
+        wanted = len(requests_to_make)
+        if self.max_pages is not None:
+            wanted = min(wanted, self.max_pages - page.number)
+        if self.limit is not None and page.count:
+            wanted = min(wanted, -(-(self.limit - page.fetched) // page.count))
+        return requests_to_make[: max(wanted, 0)]
+
+
+class TinSizedIterable(object):
+    """Wraps an iterable request body whose total length is known up front, so it
+    is sent with a content-length rather than chunked"""
+
+    def __init__(self, iterable, length):
+        self._iterable = iterable
+        self._length = length
+
+    def __iter__(self):
+        return iter(self._iterable)
+
+    def __len__(self):
+        return self._length
+
+
 class TinApiMethod(TinApiBase):
-    def __init__(self, apiobj, clsobj, name, method_data, obj_path=None):
+    def __init__(self, apiobj, clsobj, name, method_data, obj_path=None, settings=None):
         """
         The TinApiMethod represents an endpoint method to call on a remote REST API.
 
@@ -181,6 +627,8 @@ class TinApiMethod(TinApiBase):
             name (str): The name of this method
             method_data (dict): A set of information about this method as defined in
                 the config YAML
+            settings (dict): The method's settings, if already worked out, see
+                settings()
 
         Attributes:
             name (str): The method name
@@ -195,79 +643,141 @@ class TinApiMethod(TinApiBase):
         self._method_data = method_data
         self._response_factory = TinApiResponseFactory()
 
-        self.method = self._method_data["method"]
-        self.crud_label = self._method_data.get("crud_label", None)
-        self.singleton = self._method_data.get("singleton", False)
+        if settings is None:
+            settings = self.settings(apiobj, method_data)
+        self.__dict__.update(settings)
+        # Settings may be shared, so the ones that can be changed are copied
+        self._headers = dict(self._headers)
+        self.default_params = dict(self.default_params)
+        self.default_tokens = dict(self.default_tokens)
 
-        if self._method_data.get("nobase", False):
-            self.path = self._method_data["path"]
-        else:
-            self.path = "{}{}".format(self.api.conf.basepath, self._method_data["path"])
+        # How further pages are found
+        self.paginator = build_paginator(self, self._pagination)
 
-        if "scheme" in self._method_data:
-            self._scheme = self._method_data["scheme"]
-        else:
-            self._scheme = self.api.conf.scheme
+        self.api._mount(self._scheme, self._host, self._port)
 
-        if "host" in self._method_data:
-            self._host = self._method_data["host"]
-        else:
-            self._host = self.api.conf.host
+        super().__init__()
+
+    @staticmethod
+    def settings(apiobj, method_data):
+        """Works out a method's settings from its config and the API's. Modules
+        written by `tin generate` hold them already worked out.
+
+        Args:
+            apiobj (TinApi): The API
+            method_data (dict): The method's config
 
-        if "port" in self._method_data:
-            self._port = self._method_data["port"]
+        Returns:
+            dict: The settings, by attribute name
+        """
+        conf = apiobj.conf
+        settings = {
+            "method": method_data["method"],
+            "crud_label": method_data.get("crud_label", None),
+            "singleton": method_data.get("singleton", False),
+        }
+
+        if method_data.get("nobase", False):
+            path = method_data["path"]
         else:
-            self._port = self.api.conf.port
+            path = "{}{}".format(conf.basepath, method_data["path"])
+        settings["path"] = path
+        settings["_path_tokens"] = tuple(apiobj.tokenre.findall(path))
+
+        scheme = method_data["scheme"] if "scheme" in method_data else conf.scheme
+        host = method_data["host"] if "host" in method_data else conf.host
+        port = method_data["port"] if "port" in method_data else conf.port
+        settings.update(
+            {
+                "_scheme": scheme,
+                "_host": host,
+                "_port": port,
+                "url": "%s://%s:%s%s" % (scheme, host, port, path),
+            }
+        )
 
         # Merge headers for the method if any are set
-        method_headers = dict(self.api.headers)
-        self._headers = always_merger.merge(
-            method_headers, self._method_data.get("headers", {})
-        )
+        method_headers = dict(apiobj._method_headers)
+        if method_data.get("headers"):
+            method_headers = deepmerge.always_merger.merge(
+                method_headers, method_data["headers"]
+            )
+        settings["_headers"] = method_headers
 
         # If the method specifies an expected return code, grab it, otherwise
         # default to 200
-        if "expect" in self._method_data:
-            if isinstance(self._method_data["expect"], list):
-                self.expect_return_codes = [int(r) for r in self._method_data["expect"]]
+        if "expect" in method_data:
+            if isinstance(method_data["expect"], list):
+                expect = [int(r) for r in method_data["expect"]]
             else:
-                self.expect_return_codes = [self._method_data["expect"]]
+                expect = [method_data["expect"]]
         else:
-            self.expect_return_codes = [200]
+            expect = [200]
+        settings["expect_return_codes"] = expect
+
+        settings["_paginate"] = method_data.get("paginate", True)
 
-        if "paginate" in self._method_data:
-            self._paginate = self._method_data["paginate"]
+        # Method config overrides the service config
+        if "pagination" in method_data:
+            settings["_pagination"] = method_data["pagination"]
         else:
-            self._paginate = True
+            settings["_pagination"] = conf.get("pagination")
 
-        self.default_params = (
-            dict(self.api.conf.default_params)
-            if hasattr(self.api.conf, "default_params")
-            else {}
+        # With more than one, pages after the first are fetched concurrently when
+        # the paginator can tell what they are up front
+        settings["parallel_pages"] = int(
+            method_data.get("parallel_pages", DEFAULT_PARALLEL_PAGES)
         )
 
-        self.default_tokens = (
-            dict(self.api.conf.default_tokens)
-            if hasattr(self.api.conf, "default_tokens")
-            else {}
+        # In pages() and items(), how many pages may be fetched in the background
+        # ahead of the one being consumed
+        settings["read_ahead"] = int(method_data.get("read_ahead", DEFAULT_READ_AHEAD))
+
+        # Once this many bytes of pages have been fetched, merged items are moved
+        # to a temporary file in spill_dir and read back from there
+        settings["spill_threshold"] = method_data.get("spill_threshold", None)
+        settings["spill_dir"] = method_data.get("spill_dir", None)
+
+        # How the response body is read. "json" (the default) decodes the whole body,
+        # "ndjson" streams newline-delimited JSON and yields one object per line,
+        # "binary" streams the raw body in chunks to a file or buffer.
+        response_format = method_data.get("response_format", "json")
+        if response_format not in RESPONSE_FORMATS:
+            raise TinError(
+                "Invalid response_format for {}: {}".format(
+                    method_data["path"], response_format
+                )
+            )
+        settings["response_format"] = response_format
+        settings["chunk_size"] = int(method_data.get("chunk_size", DEFAULT_CHUNK_SIZE))
+
+        # Request bodies of at least compress_min_size bytes are compressed, if set
+        compress_request = method_data.get("compress_request", None)
+        if compress_request not in REQUEST_COMPRESSIONS:
+            raise TinError(
+                "Invalid compress_request for {}: {}".format(
+                    method_data["path"], compress_request
+                )
+            )
+        settings["compress_request"] = compress_request
+        settings["compress_min_size"] = int(
+            method_data.get("compress_min_size", DEFAULT_COMPRESS_MIN_SIZE)
         )
 
-        # If the method has additional default params, merge them in
-        if "default_params" in self._method_data:
-            self.default_params.update(self._method_data["default_params"])
-
-        # If the method has additional default tokens, merge them in
-        if "default_tokens" in self._method_data:
-            self.default_tokens.update(self._method_data["default_tokens"])
-
-        self.url = "%s://%s:%s%s" % (
-            self._scheme,
-            self._host,
-            self._port,
-            self.path,
+        default_params = (
+            dict(conf.default_params) if hasattr(conf, "default_params") else {}
+        )
+        default_tokens = (
+            dict(conf.default_tokens) if hasattr(conf, "default_tokens") else {}
         )
 
-        super().__init__()
+        # If the method has additional default params or tokens, merge them in
+        default_params.update(method_data.get("default_params", {}))
+        default_tokens.update(method_data.get("default_tokens", {}))
+        settings["default_params"] = default_params
+        settings["default_tokens"] = default_tokens
+
+        return settings
 
     @property
     def headers(self):
@@ -287,9 +797,198 @@ class TinApiMethod(TinApiBase):
         )
 
     def path_tokens(self):
-        return self.api.tokenre.findall(self.path)
+        return list(self._path_tokens)
+
+    def __reduce__(self):
+        # Unpickles as the method at the same obj_path in the registered API
+        return (rebuild_object, (self.api._registry_key, self.obj_path))
 
     def __call__(self, id=None, **kwargs):
+        call = self._prepare_call(id, kwargs)
+
+        if self.response_format == "ndjson":
+            # Only the first request is made here, so errors surface at call time.
+            # Lines, and any following pages, are read as the caller iterates.
+            url, params = call.url, call.params
+            if call.paginate:
+                url, params = self.paginator.first_request(url, params)
+                if call.limit is not None:
+                    url, params = self.paginator.shrink_request(
+                        url, params, call.limit, 1
+                    )
+            response = self._request(
+                url,
+                params,
+                call.headers,
+                call.request_body(),
+                stream=True,
+                timing=call.timing,
+            )
+            items = self._iter_ndjson(call, url, params, response)
+            return self._response_factory(items, response, self, call.nomodel)
+
+        if self.response_format == "binary":
+            if call.limit is not None or call.max_pages is not None:
+                raise TinInvalidArgs(
+                    "limit and max_pages are not supported for response_format binary"
+                )
+            response = self._request(
+                call.url,
+                call.params,
+                call.headers,
+                call.request_body(),
+                stream=True,
+                timing=call.timing,
+            )
+            return self._response_factory(
+                self._download(response, call.output), response, self, call.nomodel
+            )
+
+        response_data = None
+        spilled = None
+        fetched_bytes = 0
+
+        for page in self._iter_pages(call):
+            response = page.response
+
+            # If we're paginating, this recursively merges the current response
+            # with preceding ones
+            if response_data:
+                response_data = deepmerge.always_merger.merge(response_data, page.data)
+            else:
+                response_data = page.data
+
+            if call.spill_threshold is not None:
+                fetched_bytes += len(response.content)
+                spilled = self._spill(call, response_data, spilled, fetched_bytes)
+
+        if spilled is not None:
+            response_data = self.paginator.replace_items(response_data, spilled)
+
+        # The last page may have brought more items than were asked for
+        if call.limit is not None:
+            items = self.paginator.items(response_data)
+            if items is not None:
+                del items[call.limit :]
+
+        return self._response_factory(response_data, response, self, call.nomodel)
+
+    def pages(self, id=None, **kwargs):
+        """Calls the method, returning an iterator over its pages instead of merging
+        them. Each page is requested as the previous one is consumed.
+
+        Args:
+            Same as calling the method
+
+        Returns:
+            generator: Yields one response object per page, the same as calling the
+                method would return for that page alone
+        """
+        call = self._prepare_call(id, kwargs)
+        self._require_json("pages")
+        return self._wrap_pages(call, self._iter_pages_ahead(call))
+
+    def items(self, id=None, **kwargs):
+        """Calls the method, returning an iterator over the items of all its pages.
+        Each page is requested as the previous one's items are consumed.
+
+        Args:
+            Same as calling the method
+
+        Returns:
+            generator: Yields model instances, or the raw item data if the class
+                has no model or nomodel is set
+        """
+        call = self._prepare_call(id, kwargs)
+        self._require_json("items")
+        return self._wrap_items(call, self._iter_pages_ahead(call))
+
+    def scan(self, id=None, checkpoint=None, checkpoint_file=None, **kwargs):
+        """Calls the method as a resumable scan over its pages. The scan's
+        checkpoint records the next page to fetch, and can be used to start a
+        new scan from there, in this process or another.
+
+        Args:
+            checkpoint (TinCheckpoint|None): Where to start from
+            checkpoint_file (str|None): A file the checkpoint is saved to after
+                each page. If it exists and no checkpoint is given, the scan
+                starts from the checkpoint in it.
+            The rest are the same as calling the method
+
+        Returns:
+            TinScan: Iterates over pages, or over items with .items()
+        """
+        call = self._prepare_call(id, kwargs)
+        self._require_json("scan")
+        return TinScan(self, call, checkpoint, checkpoint_file)
+
+    def first(self, id=None, **kwargs):
+        """Calls the method for just its first item, requesting as little as the
+        pagination strategy allows
+
+        Args:
+            Same as calling the method
+
+        Returns:
+            The first item, as a model instance or raw data, or None if there are
+            no items
+        """
+        kwargs["limit"] = 1
+        items = self.items(id, **kwargs)
+        try:
+            return next(items, None)
+        finally:
+            items.close()
+
+    def _require_json(self, name):
+        if self.response_format != "json":
+            raise TinError(
+                "{}() is not supported for response_format {}".format(
+                    name, self.response_format
+                )
+            )
+
+    def _wrap_pages(self, call, pages):
+        for page in pages:
+            yield self._response_factory(page.data, page.response, self, call.nomodel)
+
+    def _wrap_items(self, call, pages):
+        model = None if call.nomodel else self.cls.model
+        remaining = call.limit
+        for page in pages:
+            if page.data is None:
+                continue
+
+            items = self.paginator.items(page.data)
+            if items is None:
+                raise TinError(
+                    "Can't find a list of items in the response from {}. Set "
+                    "list_data_key, or data_key in the pagination config".format(self)
+                )
+
+            if remaining is not None:
+                items = items[:remaining]
+                remaining -= len(items)
+
+            for obj_data in items:
+                if model and isinstance(obj_data, dict):
+                    yield model(obj_data)
+                else:
+                    yield obj_data
+
+            if remaining == 0:
+                break
+
+    def _prepare_call(self, id, kwargs):
+        """Builds a TinApiCall from the arguments a method was called with
+
+        Args:
+            id (any): The positional id argument, if any
+            kwargs (dict): The keyword arguments. Consumed in the process.
+
+        Returns:
+            TinApiCall
+        """
 
         # This is where we can put validations on the kwargs,
         # based off data in api.yml (not there yet)
@@ -309,7 +1008,9 @@ class TinApiMethod(TinApiBase):
 
         # allow header overrides
         call_headers = dict(self._headers)
-        call_headers = always_merger.merge(call_headers, kwargs.pop("headers", {}))
+        call_headers = deepmerge.always_merger.merge(
+            call_headers, kwargs.pop("headers", {})
+        )
 
         # lower header keys to make their names predictable so we can inspect them later
         call_headers = {k.lower(): v for k, v in call_headers.items()}
@@ -320,12 +1021,45 @@ class TinApiMethod(TinApiBase):
         else:
             data = None
 
+        # Where binary responses are written. A file object, path or bytearray. If
+        # None, the body is spooled to a temporary file
+        output = kwargs.pop("output", None)
+        if not (
+            output is None
+            or isinstance(output, (str, os.PathLike, bytearray))
+            or hasattr(output, "write")
+        ):
+            raise TinInvalidArgs(
+                "output must be a path, file object or bytearray, "
+                "not {}".format(type(output))
+            )
+
         # Support overriding default paginate behavior with a kwarg
         if "paginate" in kwargs:
             paginate = kwargs.pop("paginate")
         else:
             paginate = self._paginate
 
+        # Concurrent page fetches, when the pagination strategy allows it
+        parallel_pages = int(kwargs.pop("parallel_pages", self.parallel_pages))
+
+        # Background page fetches, for pages() and items()
+        read_ahead = int(kwargs.pop("read_ahead", self.read_ahead))
+
+        # Stop early, after this many items or pages
+        limit = kwargs.pop("limit", None)
+        max_pages = kwargs.pop("max_pages", None)
+        for name, value in [("limit", limit), ("max_pages", max_pages)]:
+            if value is not None and (not isinstance(value, int) or value < 1):
+                raise TinInvalidArgs("{} must be a positive integer".format(name))
+
+        # Bound the memory merged pages may take
+        spill_threshold = kwargs.pop("spill_threshold", self.spill_threshold)
+        if spill_threshold is not None and (
+            not isinstance(spill_threshold, int) or spill_threshold < 0
+        ):
+            raise TinInvalidArgs("spill_threshold must be a number of bytes")
+
         # If 'id' is passed as a positional, it overrides 'id' as a kwarg
         if id is not None:
             kwargs["id"] = id
@@ -346,117 +1080,496 @@ class TinApiMethod(TinApiBase):
         for k, v in tokens.items():
             url = url.replace(":%s" % k, str(v))
 
-        try:
-            response_data = None
+        # Serialize and compress once, so following pages reuse the same body
+        body = self._encode_body(data, call_headers)
+        body, timing = self._compress_body(body, call_headers)
+
+        return TinApiCall(
+            url,
+            params,
+            call_headers,
+            body,
+            paginate=paginate,
+            nomodel=nomodel,
+            output=output,
+            timing=timing,
+            parallel_pages=parallel_pages,
+            read_ahead=read_ahead,
+            limit=limit,
+            max_pages=max_pages,
+            spill_threshold=spill_threshold,
+        )
 
-            while True:
+    def _iter_pages(self, call):
+        """Requests and decodes the pages of a call, asking the method's paginator
+        for the next request after each.
+
+        If the call allows parallel pages and the paginator can work out every
+        remaining request from the first page, the rest are fetched concurrently,
+        and still yielded in order.
+
+        If the call has a checkpoint to resume from, pages start from there.
+
+        No more pages are requested once the call's limit of items or max_pages
+        is reached. Where the paginator allows it, the page size of the last
+        request is shrunk to the number of items still needed.
+
+        Args:
+            call (TinApiCall): The prepared call
+
+        Returns:
+            generator: Yields a TinPage per page
+        """
+        if call.resume_from is not None:
+            url, params = call.resume_from.url, call.resume_from.params
+            number = call.resume_from.number
+            fetched = call.resume_from.fetched
+        else:
+            url, params = call.url, call.params
+            if call.paginate:
+                url, params = self.paginator.first_request(url, params)
+            number = 1
+            fetched = 0
+
+        first = True
+
+        while True:
+            if call.paginate and call.limit is not None:
+                url, params = self.paginator.shrink_request(
+                    url, params, call.limit - fetched, number
+                )
+
+            page = self._fetch_page(call, url, params, number)
+            fetched += page.count or 0
+            page.fetched = fetched
+
+            remaining = None
+            if page.data is not None and call.paginate and not call.done(page):
+                # A streamed body is read by one request at a time
+                if first and call.parallel_pages > 1 and not call.streamed:
+                    remaining = self.paginator.remaining_requests(page)
+
+                if remaining is not None:
+                    remaining = call.trim_requests(remaining, page)
+                    page.next_request = remaining[0] if remaining else None
+                else:
+                    page.next_request = self.paginator.next_request(page)
+
+            yield page
 
-                # Grab the requests method based on http method name
+            if remaining:
+                pages = self._fetch_pages_parallel(call, remaining, number)
                 try:
-                    requests_method = getattr(self.api.request, self.method.lower())
-                except AttributeError:
-                    raise TinError("Invalid HTTP method: {}".format(self.method))
-
-                # Common arguments with all methods
-                request_args = {
-                    "headers": call_headers,
-                    "auth": self.api.auth,
-                    "verify": self.api.conf.ssl["verify"],
-                    "params": urllib.parse.urlencode(
-                        params, quote_via=urllib.parse.quote
-                    ),
-                }
-
-                if self.api.conf.ssl.get("cert", None):
-                    request_args["cert"] = self.api.conf.ssl["cert"]
-
-                # Add data if we have any
-                if data:
-                    if call_headers.get("content-type") == "application/json":
-                        request_args["data"] = json.dumps(data)
-                    else:
-                        request_args["data"] = data
-
-                # Call the requests method
-                response = requests_method(url, **request_args)
-
-                if response.status_code == 404:
-                    raise TinObjectNotFound(
-                        "Object not found. Tried: {}. "
-                        "Remote API says: {}".format(url, response.text)
-                    )
-                elif response.status_code not in self.expect_return_codes:
-                    raise TinError(
-                        "ERROR at {} Got return code {}, expected {}. "
-                        "Remote API says: {}".format(
-                            url,
-                            response.status_code,
-                            ",".join([str(r) for r in self.expect_return_codes]),
-                            response.text,
-                        )
-                    )
+                    for page, next_request in zip(pages, remaining[1:] + [None]):
+                        fetched += page.count or 0
+                        page.fetched = fetched
+                        if not call.done(page):
+                            page.next_request = next_request
+                        yield page
+                        if page.next_request is None:
+                            break
+                finally:
+                    pages.close()
+                break
+
+            if page.next_request is None:
+                break
+
+            url, params = page.next_request
+            number += 1
+            first = False
+
+    def _iter_pages_ahead(self, call):
+        """Like _iter_pages, but if the call has a read_ahead depth, pages are
+        requested in a background thread, up to that many pages ahead of the one
+        being consumed. The next page's request is then already under way while
+        the caller processes the current one.
+
+        Args:
+            call (TinApiCall): The prepared call
 
-                if response.status_code == 204:
-                    response_data = None
+        Returns:
+            generator: Yields a TinPage per page
+        """
+        if call.read_ahead < 1 or not call.paginate:
+            yield from self._iter_pages(call)
+            return
+
+        pages = queue.Queue()
+        stop = threading.Event()
+        done = object()
+
+        # One slot per page that may be fetched but not yet finished with: the one
+        # the caller holds, plus the read ahead ones
+        slots = threading.Semaphore(call.read_ahead + 1)
+
+        def acquire():
+            # Wait for a free slot, but give up if the caller has gone away
+            while not stop.is_set():
+                if slots.acquire(timeout=0.1):
+                    return True
+            return False
+
+        def produce():
+            iter_pages = self._iter_pages(call)
+            try:
+                while acquire():
+                    page = next(iter_pages, done)
+                    pages.put(page)
+                    if page is done:
+                        break
+            except Exception as e:
+                pages.put(e)
+            finally:
+                iter_pages.close()
+
+        producer = threading.Thread(
+            target=produce, name="{}-read-ahead".format(self), daemon=True
+        )
+        producer.start()
+
+        try:
+            while True:
+                page = pages.get()
+                if page is done:
                     break
-                else:
-                    try:
-                        current_response_data = response.json()
-                    except Exception:
-                        # FIXME: excessively generic exception
-                        raise TinError(
-                            "ERROR decoding response JSON. "
-                            "Raw response is: {}".format(response.content)
-                        )
+                if isinstance(page, Exception):
+                    raise page
+                yield page
+                # The caller has moved on from this page, freeing its slot
+                slots.release()
+        finally:
+            stop.set()
+            producer.join()
+
+    def _spill(self, call, response_data, spilled, fetched_bytes):
+        """Moves merged items out of memory, once past the call's spill threshold
+
+        Args:
+            call (TinApiCall): The call
+            response_data (list|dict): The pages merged so far
+            spilled (TinSpilledList|None): Items already moved, if any
+            fetched_bytes (int): Bytes of page bodies fetched so far
+
+        Returns:
+            TinSpilledList|None: The moved items, or None if nothing was moved
+        """
+        items = self.paginator.items(response_data)
+        if items is None:
+            return spilled
+
+        if spilled is None:
+            if fetched_bytes <= call.spill_threshold:
+                return None
+            spilled = TinSpilledList(self.spill_dir)
+
+        if call.limit is not None:
+            spilled.extend(items[: max(call.limit - len(spilled), 0)])
+        else:
+            spilled.extend(items)
+        # Emptied in place, so the merged data keeps holding the (empty) list
+        del items[:]
+
+        return spilled
+
+    def _fetch_page(self, call, url, params, number):
+        """Requests and decodes a single page
+
+        Returns:
+            TinPage: The page. Its fetched count is left for the caller to set.
+        """
+        response = self._request(
+            url, params, call.headers, call.request_body(), timing=call.timing
+        )
+
+        if response.status_code == 204:
+            data = None
+        else:
+            data = self._decode(response)
+
+        items = self.paginator.items(data)
+        count = len(items) if items is not None else None
+
+        return TinPage(url, params, response, data, number, count=count)
+
+    def _fetch_pages_parallel(self, call, requests_to_make, number):
+        """Fetches pages over a bounded thread pool, sharing the API's session, and
+        yields them in request order
 
-                    # If we're paginating, this recursively merges the current response
-                    # with preceding ones
-                    if response_data:
-                        response_data = always_merger.merge(
-                            response_data, current_response_data
+        At most twice the pool size is requested ahead of the page being
+        yielded, so a slow consumer doesn't pile up every page in memory.
+
+        Args:
+            call (TinApiCall): The prepared call
+            requests_to_make (list): (url, params) tuples, in page order
+            number (int): Number of the page before the first of these
+
+        Returns:
+            generator: Yields a TinPage per page
+        """
+        pending = collections.deque()
+        requests_iter = enumerate(requests_to_make, number + 1)
+
+        executor = futures.ThreadPoolExecutor(max_workers=call.parallel_pages)
+        try:
+            for page_number, (url, params) in itertools.islice(
+                requests_iter, call.parallel_pages * 2
+            ):
+                pending.append(
+                    executor.submit(self._fetch_page, call, url, params, page_number)
+                )
+
+            while pending:
+                page = pending.popleft().result()
+
+                next_request = next(requests_iter, None)
+                if next_request is not None:
+                    page_number, (url, params) = next_request
+                    pending.append(
+                        executor.submit(
+                            self._fetch_page, call, url, params, page_number
                         )
-                    else:
-                        response_data = current_response_data
+                    )
 
-                    if "next" not in response.links or not paginate:
-                        break
-                    else:
-                        url = response.links["next"]["url"]
-
-                # This next bit appears to have been almost exclusively for Oomnitza and
-                # their weird header-based paginating.  I'll leave it here for reference
-                # if we find enough APIs that do something like this but otherwise I
-                # think this would be better in the code using Tin.
-
-                # # Handle pagination types
-                # # "header_count" expects a total passed over in the HTTP header
-                # if (hasattr(self.api.conf, "pagination")) and (
-                #     self.api.conf.pagination["type"] == "header_count"
-                # ):
-                #     header_count = response.headers.get(
-                #         self.api.conf.pagination["header"], "0"
-                #     )  # if the specified header doesn't exist, assume 0 addt'l pages
-                #
-                #     response_count["current"] = len(current_response_data)
-                #     response_count["total"] = len(response_data)
-                #
-                #     # If we haven't fetched all the records, set the config'd
-                #     # path or params then continue
-                #     if response_count["total"] < int(header_count):
-                #
-                #         v = self.api.conf.pagination["value"]
-                #
-                #         if "param" in self.api.conf.pagination:
-                #             p = self.api.conf.pagination["param"]
-                #             params[p] = response_count[v]
-                #         elif "path" in self.api.conf.pagination:
-                #             n = self.api.conf.pagination["path"]
-                #             path = n % response_count[v]
-                #             url = "%s/%s" % (url, path)
-                #     else:
-                #         break
+                yield page
+        finally:
+            for future in pending:
+                future.cancel()
+            executor.shutdown(wait=True)
+
+    def _request(self, url, params, headers, body, stream=False, timing=None):
+        """Makes a single HTTP request for this method and checks the return code
+
+        Args:
+            url (str): The fully tokenized url to request
+            params (dict): Query parameters
+            headers (dict): Request headers, with lowered key names
+            body (any): Optional request body, as returned by _encode_body()
+            stream (bool): If True, the response body is not read up front
+            timing (dict): Optional timing data gathered while preparing the
+                request, which is added to the response's tin_timing
+
+        Returns:
+            requests.Response: The response, if its code was expected
+        """
 
+        query = urllib.parse.urlencode(params, quote_via=urllib.parse.quote)
+
+        try:
+            # Sent with the API's transport, requests unless configured otherwise
+            response = self.api.transport.request(
+                self.method, url, query, headers, body, stream=stream
+            )
         except requests.exceptions.HTTPError as e:
             raise TinError("ERROR: %s" % e)
 
-        return self._response_factory(response_data, response, self, nomodel)
+        response.tin_timing = {"elapsed": response.elapsed.total_seconds()}
+        if timing:
+            response.tin_timing.update(timing)
+
+        if response.status_code == 404:
+            raise TinObjectNotFound(
+                "Object not found. Tried: {}. "
+                "Remote API says: {}".format(url, response.text)
+            )
+        elif response.status_code not in self.expect_return_codes:
+            raise TinError(
+                "ERROR at {} Got return code {}, expected {}. "
+                "Remote API says: {}".format(
+                    url,
+                    response.status_code,
+                    ",".join([str(r) for r in self.expect_return_codes]),
+                    response.text,
+                )
+            )
+
+        return response
+
+    def _encode_body(self, data, headers):
+        """Prepares call data to be sent as a request body
+
+        Bytes and file objects are sent as they are, with a known length. Iterators,
+        such as generators, are sent with chunked transfer encoding, unless a
+        content-length header was given for them. Anything else is serialized to
+        JSON if the content type is JSON, or otherwise left for requests to encode.
+
+        Args:
+            data (any): The data passed to the call
+            headers (dict): Request headers, with lowered key names
+
+        Returns:
+            any: A body suitable for passing to requests as data
+        """
+        if not data:
+            return None
+
+        if isinstance(data, (bytes, bytearray, memoryview)) or hasattr(data, "read"):
+            return data
+
+        if hasattr(data, "__next__"):
+            if "content-length" in headers:
+                return TinSizedIterable(data, int(headers["content-length"]))
+            return data
+
+        if headers.get("content-type") == "application/json":
+            return json.dumps(data)
+
+        return data
+
+    def _compress_body(self, body, headers):
+        """Compresses an in-memory request body if the method is configured to,
+        and the body is large enough. Streamed bodies are left alone.
+
+        Args:
+            body (any): A body as returned by _encode_body()
+            headers (dict): Request headers, with lowered key names. A
+                content-encoding header is added if the body is compressed
+
+        Returns:
+            tuple: The body, and a dict of compression timing data, which is
+                empty if nothing was compressed
+        """
+        if self.compress_request is None or not body:
+            return body, {}
+
+        if isinstance(body, str):
+            raw = body.encode("utf-8")
+        elif isinstance(body, (bytes, bytearray, memoryview)):
+            raw = bytes(body)
+        else:
+            return body, {}
+
+        if len(raw) < self.compress_min_size:
+            return body, {}
+
+        start = time.perf_counter()
+        if self.compress_request == "gzip":
+            compressed = gzip.compress(raw)
+        else:
+            compressed = zlib.compress(raw)
+        compress_time = time.perf_counter() - start
+
+        headers["content-encoding"] = self.compress_request
+
+        return compressed, {
+            "compress_time": compress_time,
+            "compress_ratio": len(compressed) / len(raw),
+            "uncompressed_size": len(raw),
+            "compressed_size": len(compressed),
+        }
+
+    def _decode(self, response):
+        """Decodes a JSON response body"""
+        try:
+            return response.json()
+        except Exception:
+            # FIXME: excessively generic exception
+            raise TinError(
+                "ERROR decoding response JSON. "
+                "Raw response is: {}".format(response.content)
+            )
+
+    def _download(self, response, output=None):
+        """Streams a response body in chunks into output, without holding the whole
+        body in memory.
+
+        Args:
+            response (requests.Response): An already checked response, requested
+                with stream=True
+            output (any): A file object or anything else with a write() method, a
+                path to write to, a bytearray to extend, or None to spool to an
+                anonymous temporary file
+
+        Returns:
+            tuple: The output written to and the number of bytes written
+        """
+        if output is None:
+            target = tempfile.TemporaryFile()
+        elif isinstance(output, (str, os.PathLike)):
+            target = open(output, "wb")
+        elif isinstance(output, bytearray):
+            target = None
+        else:
+            target = output
+
+        size = 0
+        try:
+            for chunk in response.iter_content(chunk_size=self.chunk_size):
+                if target is None:
+                    output.extend(chunk)
+                else:
+                    target.write(chunk)
+                size += len(chunk)
+        finally:
+            response.close()
+            if isinstance(output, (str, os.PathLike)):
+                target.close()
+
+        if output is None:
+            target.flush()
+            target.seek(0)
+            output = target
+
+        return output, size
+
+    def _iter_ndjson(self, call, url, params, response):
+        """Yields decoded objects from a newline-delimited JSON response, one line
+        at a time, moving on to following pages if paginating. Stops after the
+        call's limit of lines, or max_pages pages.
+
+        Args:
+            call (TinApiCall): The prepared call
+            url (str): The url of the first page
+            params (dict): The params of the first page
+            response (requests.Response): The first, already checked, response.
+                It must have been requested with stream=True
+        """
+        number = 1
+        fetched = 0
+
+        while True:
+            count = 0
+            try:
+                for line in response.iter_lines():
+                    if not line.strip():
+                        continue
+                    try:
+                        obj = json.loads(line)
+                    except json.JSONDecodeError:
+                        raise TinError(
+                            "ERROR decoding NDJSON line. Raw line is: {}".format(line)
+                        )
+                    count += 1
+                    yield obj
+                    if call.limit is not None and fetched + count >= call.limit:
+                        return
+            finally:
+                response.close()
+
+            if not call.paginate:
+                break
+
+            # Lines aren't kept, so strategies that need the body, like cursors,
+            # find no next page here
+            fetched += count
+            page = TinPage(url, params, response, None, number, fetched, count)
+            if call.done(page):
+                break
+            next_request = self.paginator.next_request(page)
+            if next_request is None:
+                break
+
+            url, params = next_request
+            number += 1
+            if call.limit is not None:
+                url, params = self.paginator.shrink_request(
+                    url, params, call.limit - fetched, number
+                )
+            response = self._request(
+                url,
+                params,
+                call.headers,
+                call.request_body(),
+                stream=True,
+                timing=call.timing,
+            )
@@ -19,5 +19,6 @@ class HTTPGenericParameterAuth(AuthBase):
         self.params = params
 
     def __call__(self, r):
-        r.params.update(self.headers)
+        # Prepared requests have no params left, just the url to add them to
+        r.prepare_url(r.url, self.params)
         return r
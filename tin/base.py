@@ -1,4 +1,22 @@
 import json
+import os
+import threading
+
+from .exceptions import TinError
+from .registry import rebuild_object
+
+# Held while building pending classes, so two threads can't build one twice
+_build_lock = threading.RLock()
+
+
+def _new_locks():
+    # As pool._new_locks() does
+    global _build_lock
+    _build_lock = threading.RLock()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_new_locks)
 
 
 class TinApiBase(object):
@@ -28,26 +46,70 @@ class TinApiClass(TinApiBase):
     """Simple class for holding additional TinApiClass's and TinApiMethod's"""
 
     _model = None
+    _registry_key = None
 
     def __init__(self, obj_path=None):
         self._methods = []
         self._classes = {}
+        self._pending = {}
         if obj_path:
             self.obj_path = obj_path
         super().__init__()
 
+    def __reduce__(self):
+        # Classes are built at runtime, so they unpickle as the class at the same
+        # obj_path in the registered API
+        if self._registry_key is None:
+            raise TinError("{} is not part of a registered API".format(self))
+        return (rebuild_object, (self._registry_key, self.obj_path))
+
     def add_method(self, name, method):
         setattr(self, name, method)
         self._methods.append(name)
 
+    def __getattr__(self, name):
+        # Only called for attributes that aren't set, which includes classes that
+        # haven't been built yet
+        if "_pending" in self.__dict__:
+            self._build_pending(name)
+            if name in self.__dict__:
+                return self.__dict__[name]
+
+        raise AttributeError(
+            "'{}' object has no attribute '{}'".format(type(self).__name__, name)
+        )
+
     def add_class(self, name, cls):
         setattr(self, name, cls)
         self._classes[name] = cls
 
+    def add_pending_class(self, name, build):
+        """Adds a class that is built on first access
+
+        Args:
+            name (str): The class's attribute name
+            build (callable): Builds the class and adds it with add_class()
+        """
+        self._pending[name] = build
+        # Holds the class's place, so classes are listed in the order they were added
+        self._classes[name] = None
+
+        # A name that shadows one of our own attributes wouldn't reach __getattr__
+        if hasattr(type(self), name):
+            self._build_pending(name)
+
+    def _build_pending(self, name):
+        with _build_lock:
+            if name in self._pending:
+                self._pending[name]()
+                del self._pending[name]
+
     def methods(self):
         return [getattr(self, mth) for mth in self._methods]
 
     def classes(self):
+        for name in list(self._pending):
+            self._build_pending(name)
         return [cls for cls in self._classes.values()]
 
     @property
@@ -59,6 +121,7 @@ class TinApiClass(TinApiBase):
         self._model = model
 
     def get_class(self, name):
+        self._build_pending(name)
         return self._classes[name]
 
     def _recurse(self, obj, toplevel=True, strings=False):
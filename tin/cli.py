@@ -0,0 +1,74 @@
+import argparse
+import os
+import sys
+
+from .config import TinConfig
+from .exceptions import TinError
+from .generate import generate
+
+
+def _generate(args):
+    conf = TinConfig(
+        config_file=args.config, environment=args.environment, env_prefix=args.prefix
+    )
+    source = generate(conf, class_name=args.class_name)
+
+    if args.output is None:
+        sys.stdout.write(source)
+        return
+
+    # Written in place only once complete, so importers never see half a module
+    tmp_path = "{}.{}.tmp".format(args.output, os.getpid())
+    with open(tmp_path, "w") as fh:
+        fh.write(source)
+    os.replace(tmp_path, args.output)
+
+
+def parser():
+    """Returns the argument parser for the tin command"""
+    tin_parser = argparse.ArgumentParser(prog="tin")
+    commands = tin_parser.add_subparsers(dest="command")
+    # Set here, as add_subparsers() only takes required from Python 3.7
+    commands.required = True
+
+    generate_parser = commands.add_parser(
+        "generate",
+        help="Write a Python module with an API class for a config",
+        description="Writes a Python module with an API class for a config. The "
+        "resolved config is included, so the class is built without reading any "
+        "config files. Credentials are loaded when it's built.",
+    )
+    generate_parser.add_argument("config", help="The config file")
+    generate_parser.add_argument(
+        "-e", "--environment", help="The environment to generate the API for"
+    )
+    generate_parser.add_argument(
+        "-o", "--output", help="The module file to write. Defaults to stdout."
+    )
+    generate_parser.add_argument(
+        "-n", "--class-name", help="Name of the API class, e.g. MyServiceApi"
+    )
+    generate_parser.add_argument(
+        "-p", "--prefix", help="Env var prefix, as for TinConfig's env_prefix"
+    )
+    generate_parser.set_defaults(func=_generate)
+
+    return tin_parser
+
+
+def main(argv=None):
+    """Runs the tin command
+
+    Args:
+        argv (list): Arguments, defaulting to sys.argv's
+
+    Returns:
+        int: The exit status
+    """
+    args = parser().parse_args(argv)
+    try:
+        args.func(args)
+    except TinError as e:
+        sys.stderr.write("tin {}: {}\n".format(args.command, e))
+        return 1
+    return 0
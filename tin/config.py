@@ -1,10 +1,19 @@
+import copy
 import logging
 import os
-import simplejson as json
-import yaml
+import pickle
+import threading
+from stat import S_IWGRP, S_IWOTH
 
-from deepmerge import always_merger
 from .exceptions import TinConfigNotFound, TinError
+from .lazy import lazy_import
+from .version import VERSION
+
+# Loaded when first used, see lazy_import()
+deepmerge = lazy_import("deepmerge")
+hashlib = lazy_import("hashlib")
+json = lazy_import("simplejson")
+yaml = lazy_import("yaml")
 
 
 # We only do JSON APIs right now
@@ -22,9 +31,184 @@ DEFAULTS = {
 }
 
 
-logging.basicConfig(level=logging.INFO)
+def safe_loader():
+    """Returns libyaml's loader, which is many times faster, if PyYAML was built
+    with it, or PyYAML's own"""
+    return getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+
+
+def supported_encodings():
+    """Returns the content encodings urllib3 can decode here. br and zstd depend
+    on optional packages"""
+    from urllib3.util.request import ACCEPT_ENCODING
+
+    return ACCEPT_ENCODING.split(",")
+
+
+def __getattr__(name):
+    # Module constants that need heavy imports, worked out when first used
+    if name == "SafeLoader":
+        return safe_loader()
+    if name == "SUPPORTED_ENCODINGS":
+        return supported_encodings()
+    raise AttributeError("module {} has no attribute {}".format(__name__, name))
+
+
+# Bumped whenever the cached config layout changes
+SNAPSHOT_VERSION = 1
+
+# TinConfig attributes saved in cached configs
+SNAPSHOT_ATTRS = [
+    "api_name",
+    "config_src",
+    "config_dir",
+    "config_data",
+    "environment",
+    "headers",
+    "apidata",
+    "models",
+]
+
 logger = logging.getLogger(__name__)
 
+# Parsed API and model files, shared by every TinConfig in the process. Keyed by
+# path, holding the file's mtime and size when parsed, and the read-only data.
+_spec_cache = {}
+_spec_cache_lock = threading.Lock()
+
+# Read-only copies of the API and model data of snapshots built from, like the
+# literals in generated modules. Keyed by the snapshot's id, holding the snapshot
+# too, so the id isn't reused.
+_snapshot_specs = {}
+
+# Parsed env var overlays, by prefix, with the env vars they were parsed from
+_env_overlays = {}
+_env_overlays_lock = threading.Lock()
+
+
+def _new_locks():
+    # As pool._new_locks() does
+    global _spec_cache_lock, _env_overlays_lock
+    _spec_cache_lock = threading.Lock()
+    _env_overlays_lock = threading.Lock()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_new_locks)
+
+
+def env_vars(prefix):
+    """Returns the config env vars for a prefix, e.g. TIN__HOST for TIN
+
+    Args:
+        prefix (str): The env var prefix
+
+    Returns:
+        tuple: Sorted (name, value) pairs
+    """
+    start = "{}__".format(prefix)
+    return tuple(sorted((k, v) for k, v in os.environ.items() if k.startswith(start)))
+
+
+def owned_privately(stat_result):
+    """Returns True if a file or directory is owned by the current user, and no
+    one else may write to it. Always True where there are no user ids.
+
+    Args:
+        stat_result (os.stat_result): The file's stat
+
+    Returns:
+        bool
+    """
+    if not hasattr(os, "getuid"):
+        return True
+    return stat_result.st_uid == os.getuid() and not (
+        stat_result.st_mode & (S_IWGRP | S_IWOTH)
+    )
+
+
+def env_overlay(prefix):
+    """Returns the config set by env vars with a prefix, as one nested dict, e.g.
+    {"environments": {"prod": {"host": "x"}}} for TIN__ENVIRONMENTS__PROD__HOST=x.
+    Keys are lower case.
+
+    The result is shared by every TinConfig with the prefix, and parsed again only
+    when the env vars change, so it mustn't be modified.
+
+    Args:
+        prefix (str): The env var prefix
+
+    Returns:
+        dict
+    """
+    variables = env_vars(prefix)
+    with _env_overlays_lock:
+        cached = _env_overlays.get(prefix, None)
+        if cached is not None and cached[0] == variables:
+            return cached[1]
+
+    overlay = {}
+    for var, val in variables:
+        parts = [v.lower() for v in var.split("__")[1:]]
+        current = overlay
+        for part in parts[:-1]:
+            # A value set by a shorter var is replaced, as a merge would
+            if not isinstance(current.get(part, None), dict):
+                current[part] = {}
+            current = current[part]
+        current[parts[-1]] = val
+
+    with _env_overlays_lock:
+        _env_overlays[prefix] = (variables, overlay)
+    return overlay
+
+
+class TinReadOnlyDict(dict):
+    """A dict that can't be changed, for parsed data shared between configs"""
+
+    def _readonly(self, *args, **kwargs):
+        raise TypeError("{} is read-only".format(type(self).__name__))
+
+    __setitem__ = __delitem__ = __ior__ = _readonly
+    clear = pop = popitem = setdefault = update = _readonly
+
+    def __reduce__(self):
+        return (type(self), (dict(self),))
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+
+class TinReadOnlyList(list):
+    """A list that can't be changed, for parsed data shared between configs"""
+
+    def _readonly(self, *args, **kwargs):
+        raise TypeError("{} is read-only".format(type(self).__name__))
+
+    __setitem__ = __delitem__ = __iadd__ = __imul__ = _readonly
+    append = clear = extend = insert = pop = remove = reverse = sort = _readonly
+
+    def __reduce__(self):
+        return (type(self), (list(self),))
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+
+def readonly(data):
+    """Returns a read-only copy of nested dicts and lists"""
+    if isinstance(data, dict):
+        return TinReadOnlyDict((k, readonly(v)) for k, v in data.items())
+    if isinstance(data, list):
+        return TinReadOnlyList(readonly(v) for v in data)
+    return data
+
 
 class TinConfig(object):
     """Class which represents the configuration of an API
@@ -73,13 +257,21 @@ class TinConfig(object):
     And so on.  This also leaves open the possiblity of loading the entire
     config from individual env vars
 
+    If a cache directory is given, or set in the TIN_CACHE_DIR env var, the fully
+    resolved config is saved there and reused by later TinConfigs for the same
+    file, environment and env vars, until any of the files it was loaded from
+    change. Credentials are never saved, they are loaded each time.
+
     Args:
         config_file (str): Relative or absolute path to the YAML or JSON config file
         environment (str): Optional name of the API environment to load
+        cache_dir (str): Optional directory to cache resolved configs in
 
     """
 
-    def __init__(self, config_file=None, environment=None, env_prefix=None):
+    def __init__(
+        self, config_file=None, environment=None, env_prefix=None, cache_dir=None
+    ):
 
         self.api_name = None
         self.config_src = None
@@ -87,7 +279,7 @@ class TinConfig(object):
         self.config_data = None
         self.environment = None
 
-        self._api_config = dict(DEFAULTS)
+        self._api_config = copy.deepcopy(DEFAULTS)
 
         ######################
         # Env prefix
@@ -105,6 +297,22 @@ class TinConfig(object):
         else:
             self.environment = environment
 
+        ######################
+        # Cached config
+        if cache_dir is None:
+            cache_dir = os.environ.get(f"{self._env_prefix}_CACHE_DIR", None)
+
+        cache_path = self._cache_path(cache_dir, config_file) if cache_dir else None
+        if cache_path and self._load_cached(cache_path):
+            logger.info(
+                "Using cached config: {} Environment: {}".format(
+                    self.config_src,
+                    self.environment if self.environment else "default (none)",
+                )
+            )
+            self._load_credentials()
+            return
+
         ######################
         # Config loading
         # Handle being passed config data from the environment, as a file or as JSON or
@@ -174,17 +382,19 @@ class TinConfig(object):
         # Build the final _api_config
         if self.environment:
             # Merge common env config into _api_config
-            self._api_config = always_merger.merge(
+            self._api_config = deepmerge.always_merger.merge(
                 self._api_config, self.config_data.get("common", {})
             )
 
             # Now merge env-specific settings into that result
-            self._api_config = always_merger.merge(
+            self._api_config = deepmerge.always_merger.merge(
                 self._api_config, self.config_data["environments"][self.environment]
             )
         else:
             # If there's no environment, all the config keys should already be top-level
-            self._api_config = always_merger.merge(self._api_config, self.config_data)
+            self._api_config = deepmerge.always_merger.merge(
+                self._api_config, self.config_data
+            )
 
         # At this point, we must have an api_file or there's no point in continuing
         if self._api_config.get("api_file", None) is None:
@@ -203,8 +413,61 @@ class TinConfig(object):
         elif "config_dir" in self._api_config:
             self.config_dir = self._api_config["config_dir"]
 
+        ######################
+        # Headers
+        self.headers = {
+            "Content-type": self._api_config.get("content_type", False)
+            or DEFAULT_CONTENT_TYPE,
+            "Accept": self._api_config.get("accept", False) or DEFAULT_ACCEPT,
+        }
+
+        # Only advertise encodings we can actually decode
+        if self._api_config.get("accept_encoding", None) is not None:
+            self.headers["Accept-Encoding"] = self._accept_encoding(
+                self._api_config["accept_encoding"]
+            )
+
+        # Merge in any headers from the config
+        if self._api_config.get("headers", None) is not None:
+            self.headers = deepmerge.always_merger.merge(
+                self.headers, self._api_config["headers"]
+            )
+
+        ######################
+        # Minor data checks
+        try:
+            self._api_config["port"] = int(self._api_config["port"])
+        except ValueError:
+            raise TinError("Invalid port, must be an integer")
+
+        # Env var values are strings, and a string verify is a CA bundle path
+        ssl = self._api_config.get("ssl", None)
+        if isinstance(ssl, dict) and isinstance(ssl.get("verify", None), str):
+            if ssl["verify"].lower() in ["true", "false"]:
+                ssl["verify"] = ssl["verify"].lower() == "true"
+
+        ######################
+        # Additional file-based configs
+        # API and Model configs must be files
+        self.apidata = self._load_spec_file(self.api_file)
+
+        self.models = (
+            self._load_spec_file(self._api_config.get("model_file", None))
+            if "model_file" in self._api_config
+            else {}
+        )
+
         ######################
         # Credentials
+        credentials_src = self._api_config.get("credentials", None)
+        self._load_credentials()
+
+        if cache_path:
+            self._save_cached(cache_path, credentials_src)
+
+    def _load_credentials(self):
+        """Loads credentials from the file, or JSON or YAML data, named by the
+        credentials config key"""
         if (
             self._api_config.get("auth_type") in [None, "none"]
             or "credentials" not in self._api_config
@@ -227,37 +490,191 @@ class TinConfig(object):
                     # doesn't load as json or yaml, may be a custom string
                     self.credentials = self._api_config["credentials"]
 
-        ######################
-        # Headers
-        self.headers = {
-            "Content-type": self._api_config.get("content_type", False)
-            or DEFAULT_CONTENT_TYPE,
-            "Accept": self._api_config.get("accept", False) or DEFAULT_ACCEPT,
-        }
+    def _cache_path(self, cache_dir, config_file):
+        """Returns the path of the cached config for a config file, environment and
+        set of env vars, or None if the config doesn't come from a file
 
-        # Merge in any headers from the config
-        if self._api_config.get("headers", None) is not None:
-            self.headers = always_merger.merge(
-                self.headers, self._api_config["headers"]
-            )
+        Arguments:
+            cache_dir (str): The cache directory
+            config_file (str|None): The config_file argument
+
+        Returns:
+            str|None
+        """
+        if config_file is None:
+            config_file = os.environ.get(f"{self._env_prefix}_CONFIG", None)
+            if config_file is None or not os.path.isfile(config_file):
+                return None
 
-        ######################
-        # Minor data checks
         try:
-            self._api_config["port"] = int(self._api_config["port"])
-        except ValueError:
-            raise TinError("Invalid port, must be an integer")
+            config_path = self.find_config(config_file)
+        except TinConfigNotFound:
+            # Left for the uncached load to report
+            return None
 
-        ######################
-        # Additional file-based configs
-        # API and Model configs must be files
-        self.apidata = self._load_config_from_file(self.api_file)
+        # Env vars override the files, so they're part of the key. Their values are
+        # hashed, never stored.
+        key = json.dumps(
+            [
+                VERSION,
+                config_path,
+                self.environment,
+                self._env_prefix,
+                env_vars(self._env_prefix),
+            ]
+        )
+        digest = hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+        return os.path.join(os.path.expanduser(cache_dir), f"{digest}.pickle")
+
+    def _source_files(self):
+        """Returns the paths of the files the config was loaded from, credentials
+        aside"""
+        files = [self.config_src, self.find_config(self.api_file)]
+        if "model_file" in self._api_config:
+            files.append(self.find_config(self._api_config["model_file"]))
+        return files
+
+    def _snapshot_state(self):
+        """Returns the resolved config, without credentials"""
+        state = {attr: self.__dict__[attr] for attr in SNAPSHOT_ATTRS}
+        state["_api_config"] = dict(self._api_config)
+        state["_api_config"].pop("credentials", None)
+
+        config_data = copy.deepcopy(self.config_data)
+        config_data.pop("credentials", None)
+        config_data.get("common", {}).pop("credentials", None)
+        for env_data in config_data.get("environments", {}).values():
+            if isinstance(env_data, dict):
+                env_data.pop("credentials", None)
+        state["config_data"] = config_data
+
+        return state
+
+    def _restore_state(self, state):
+        """Restores a resolved config from _snapshot_state()"""
+        self.__dict__.update(state)
+
+    @classmethod
+    def from_snapshot(cls, state, credentials=None, env_prefix=None):
+        """Builds a config from a resolved one, without reading any config files or
+        env vars. Modules written by `tin generate` start their APIs this way.
 
-        self.models = (
-            self._load_config_from_file(self._api_config.get("model_file", None))
-            if "model_file" in self._api_config
-            else {}
+        Arguments:
+            state (dict): From _snapshot_state()
+            credentials (any): The credentials config value, a file name or JSON or
+                YAML, as in a config file, or already loaded credentials
+            env_prefix (str): Optional env var prefix, as for TinConfig()
+
+        Returns:
+            TinConfig
+        """
+        conf = cls.__new__(cls)
+        if env_prefix:
+            conf._env_prefix = "TIN_{}".format(env_prefix).upper()
+        else:
+            conf._env_prefix = "TIN"
+        # The state may be shared, e.g. a literal in a generated module. Its API and
+        # model data are only read, so every config built from it shares one copy.
+        specs = _snapshot_specs.get(id(state), None)
+        if specs is None or specs[0] is not state:
+            specs = (state, readonly(state["apidata"]), readonly(state["models"]))
+            _snapshot_specs[id(state)] = specs
+        conf._restore_state(
+            copy.deepcopy(
+                {k: v for k, v in state.items() if k not in ("apidata", "models")}
+            )
         )
+        conf.apidata = specs[1]
+        conf.models = specs[2]
+
+        if credentials is None or isinstance(credentials, str):
+            if credentials is not None:
+                conf._api_config["credentials"] = credentials
+            conf._load_credentials()
+        else:
+            conf.credentials = credentials
+
+        return conf
+
+    def _load_cached(self, cache_path):
+        """Restores the config from the cache, if it's there and none of its files
+        have changed since it was saved. Cached configs are pickles, so they're only
+        loaded if the cache directory and file belong to the current user, and no
+        one else can write to them.
+
+        Returns:
+            bool: True if the cached config was used
+        """
+        try:
+            if not owned_privately(os.stat(os.path.dirname(cache_path))):
+                logger.warning(
+                    "Not using the config cache in {}, as other users can write to "
+                    "it".format(os.path.dirname(cache_path))
+                )
+                return False
+            with open(cache_path, "rb") as fh:
+                if not owned_privately(os.fstat(fh.fileno())):
+                    logger.warning(
+                        "Not using cached config {}, as other users can write to "
+                        "it".format(cache_path)
+                    )
+                    return False
+                snapshot = pickle.load(fh)
+            if snapshot["version"] != SNAPSHOT_VERSION:
+                return False
+            for path, mtime, size in snapshot["files"]:
+                stat = os.stat(path)
+                if (stat.st_mtime_ns, stat.st_size) != (mtime, size):
+                    return False
+        except Exception:
+            # Missing, unreadable or from an older tin. Either way, load afresh
+            return False
+
+        self._restore_state(snapshot["state"])
+        self._api_config["credentials"] = snapshot["credentials"]
+        return True
+
+    def _save_cached(self, cache_path, credentials_src):
+        """Saves the resolved config to the cache
+
+        Arguments:
+            cache_path (str): From _cache_path()
+            credentials_src (any): The credentials config value, before loading
+        """
+        # Only a credentials file name is saved. Inline credentials aren't written
+        # anywhere, so configs with them aren't cached.
+        if credentials_src is not None:
+            try:
+                self.find_config(credentials_src)
+            except (TinConfigNotFound, TypeError):
+                return
+
+        try:
+            files = []
+            for path in self._source_files():
+                stat = os.stat(path)
+                files.append((path, stat.st_mtime_ns, stat.st_size))
+
+            snapshot = {
+                "version": SNAPSHOT_VERSION,
+                "files": files,
+                "state": self._snapshot_state(),
+                "credentials": credentials_src,
+            }
+
+            os.makedirs(os.path.dirname(cache_path), mode=0o700, exist_ok=True)
+            if not owned_privately(os.stat(os.path.dirname(cache_path))):
+                # Never loaded from, see _load_cached()
+                return
+            tmp_path = "{}.{}.tmp".format(cache_path, os.getpid())
+            fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with os.fdopen(fd, "wb") as fh:
+                pickle.dump(snapshot, fh, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, cache_path)
+        except (OSError, pickle.PicklingError) as e:
+            # The cache is only an optimization
+            logger.debug("Could not cache config {}: {}".format(self.config_src, e))
 
     def _update_from_env(self, config_data, environment=None):
         """Read configuration from environment variables
@@ -266,38 +683,60 @@ class TinConfig(object):
 
         TIN__[ENVIRONMENTS__]<ENVIRONMENT|KEY>__<KEY>.. = <VALUE>
 
-        See the class docs for more detail.
+        See the class docs for more detail. The env vars are parsed by env_overlay(),
+        and merged in one go.
 
         Arguments:
             config_data (dict): A dict into which keys and values will be loaded
-            environment (string|None): Optional environment name
+            environment (string|None): Optional environment name. If given, only
+                that environment's vars are used, whatever the case of its name.
 
         Returns:
             see _loadfile()
         """
-        for var, val in os.environ.items():
-            if var.startswith(
-                "{}__{}".format(
-                    self._env_prefix,
-                    "ENVIRONMENTS__{}".format(environment.upper())
-                    if environment is not None
-                    else "",
-                )
-            ):
-                env_parts = [v.lower() for v in var.split("__")[1:]]
-                dict_from_list = current = {}
-                # Some confusing iteration that turns a list into nested dict keys
-                for i in range(0, len(env_parts)):
-                    part = env_parts[i]
-                    if i == len(env_parts) - 1:
-                        current[part] = val
-                    else:
-                        current[part] = {}
-                    current = current[part]
-
-                config_data = always_merger.merge(config_data, dict_from_list)
-
-        return config_data
+        overlay = env_overlay(self._env_prefix)
+
+        if environment is not None:
+            env_data = overlay.get("environments", {}).get(environment.lower(), None)
+            if not isinstance(env_data, dict):
+                return config_data
+
+            # Env var names are upper case, so match the environment's own name
+            name = environment
+            for configured in config_data.get("environments", {}) or {}:
+                if str(configured).lower() == environment.lower():
+                    name = configured
+                    break
+            overlay = {"environments": {name: env_data}}
+        elif not overlay:
+            return config_data
+
+        # The overlay is shared, so config_data mustn't end up holding parts of it
+        return deepmerge.always_merger.merge(config_data, copy.deepcopy(overlay))
+
+    def _accept_encoding(self, encodings):
+        """Builds an Accept-Encoding header value from the configured encodings,
+        dropping any that can't be decoded with the installed packages
+
+        Arguments:
+            encodings (list|str): Encoding names, as a list or comma separated string
+
+        Returns:
+            str: The header value
+        """
+        if isinstance(encodings, str):
+            encodings = encodings.split(",")
+
+        supported = supported_encodings()
+        usable = []
+        for encoding in encodings:
+            encoding = encoding.strip().lower()
+            if encoding in supported or encoding == "identity":
+                usable.append(encoding)
+            else:
+                logger.debug("Not accepting unsupported encoding {}".format(encoding))
+
+        return ", ".join(usable) if usable else "identity"
 
     def __getattr__(self, item):
         """Look up referenced attrs in _api_config before __dict__
@@ -308,6 +747,10 @@ class TinConfig(object):
         Returns:
             Value of the attribute key
         """
+        # Unpickling looks attributes up before __dict__ is restored
+        if "_api_config" not in self.__dict__:
+            self.method_missing(item)
+
         if item in self._api_config:
             return self._api_config[item]
         elif item in self.__dict__:
@@ -343,6 +786,30 @@ class TinConfig(object):
         """
         return self._loadfile(self.find_config(filename))
 
+    def _load_spec_file(self, filename):
+        """Load an API or model file, parsing it only if it isn't already parsed
+        in this process, or has changed since.
+
+        Arguments:
+            filename (str): Relative or absolute path to a file
+
+        Returns:
+            TinReadOnlyDict: The parsed file, shared with other configs
+        """
+        filepath = self.find_config(filename)
+        stat = os.stat(filepath)
+        version = (stat.st_mtime_ns, stat.st_size)
+
+        with _spec_cache_lock:
+            cached = _spec_cache.get(filepath, None)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+
+        data = readonly(self._loadfile(filepath))
+        with _spec_cache_lock:
+            _spec_cache[filepath] = (version, data)
+        return data
+
     def _load_main_config_from_file(self, filename):
         """Load main configuration from a file.
 
@@ -368,7 +835,7 @@ class TinConfig(object):
         """
         with open(filepath, "rb") as fh:
             if filepath.endswith(".yml") or filepath.endswith(".yaml"):
-                return yaml.safe_load(fh.read())
+                return yaml.load(fh.read(), Loader=safe_loader())
             elif filepath.endswith(".json"):
                 return json.loads(fh.read())
 
@@ -386,7 +853,7 @@ class TinConfig(object):
         except json.decoder.JSONDecodeError:
             # Explicitly making this a dict works around the fact that
             # pyyaml will load a single plain string without error
-            loaded = dict(yaml.safe_load(data))
+            loaded = dict(yaml.load(data, Loader=safe_loader()))
 
         return loaded
 
@@ -0,0 +1,281 @@
+import ast
+import copy
+import keyword
+import re
+
+from .api import TinApi, TinApiMethod
+from .exceptions import TinConfigNotFound, TinError
+from .version import VERSION
+
+LINE_WIDTH = 88
+
+
+def python_name(name):
+    """Turns a name from the config, or a dotted obj_path, into a Python identifier
+
+    Args:
+        name (str): The name
+
+    Returns:
+        str
+    """
+    name = re.sub(r"\W", "_", name)
+    if not name or name[0].isdigit() or keyword.iskeyword(name):
+        name = "_{}".format(name)
+    return name
+
+
+def api_class_name(api_name):
+    """Returns the default name for a generated API class, e.g. MyServiceApi for
+    my_service"""
+    parts = re.split(r"[\W_]+", api_name)
+    return python_name("".join(p[:1].upper() + p[1:] for p in parts) + "Api")
+
+
+def _format(value, indent, room):
+    """Formats a literal in black's style, one item per line if it doesn't fit in
+    room"""
+    text = repr(value)
+    if len(text) <= room or not isinstance(value, (dict, list)) or not value:
+        return text
+
+    inner = " " * (indent + 4)
+    if isinstance(value, dict):
+        items = [
+            "{}{!r}: {},".format(
+                inner, k, _format(v, indent + 4, LINE_WIDTH - indent - len(repr(k)) - 7)
+            )
+            for k, v in value.items()
+        ]
+        brackets = "{}"
+    else:
+        items = [
+            "{}{},".format(inner, _format(v, indent + 4, LINE_WIDTH - indent - 5))
+            for v in value
+        ]
+        brackets = "[]"
+    return "{}\n{}\n{}{}".format(
+        brackets[0], "\n".join(items), " " * indent, brackets[1]
+    )
+
+
+def _literal(prefix, value):
+    """Returns value as Python source following prefix, e.g. an assignment,
+    checking it reads back the same"""
+    indent = len(prefix) - len(prefix.lstrip())
+    text = _format(value, indent, LINE_WIDTH - len(prefix))
+    try:
+        if ast.literal_eval(text) != value:
+            raise ValueError(text)
+    except (SyntaxError, ValueError):
+        raise TinError(
+            "Config value can't be written as a Python literal: {}".format(text)
+        )
+    return prefix + text
+
+
+def _docstring(lines, indent):
+    """Returns lines as a docstring at the given indent"""
+    lines = [(" " * indent + line).rstrip() for line in lines]
+    lines[0] = '{}"""{}'.format(" " * indent, lines[0].lstrip())
+    if len(lines) == 1:
+        return lines[0] + '"""'
+    return "\n".join(lines + [" " * indent + '"""'])
+
+
+def _bases(name, bases):
+    """Returns the source of a dict of base classes by obj_path"""
+    lines = ["    {} = {{".format(name)]
+    for obj_path, base in bases:
+        line = "        {!r}: {},".format(obj_path, base)
+        if len(line) > LINE_WIDTH:
+            # In black's style, the value on a line of its own
+            line = "        {!r}: (\n            {}\n        ),".format(obj_path, base)
+        lines.append(line)
+    lines.append("    }")
+    return "\n".join(lines)
+
+
+def _walk(cls):
+    """Yields each class under cls, depth first, in config order"""
+    for child in cls.classes():
+        yield child
+        yield from _walk(child)
+
+
+def _class_source(cls, name):
+    """Returns the source of the base class for one class of the API"""
+    lines = ["class {}(TinApiClass):".format(name)]
+
+    doc = [cls.obj_path]
+    methods = cls.methods()
+    if methods:
+        width = max(len(m.name) for m in methods)
+        doc.append("")
+        doc.extend(
+            "{} {} {}".format(m.name.ljust(width), m.method.upper(), m.url)
+            for m in methods
+        )
+    lines.append(_docstring(doc, 4))
+
+    for attr in ["list_data_key", "singleton_data_key"]:
+        if attr in type(cls).__dict__:
+            lines.append("")
+            lines.append(_literal("    {} = ".format(attr), getattr(cls, attr)))
+
+    return "\n".join(lines)
+
+
+def _model_source(model, model_data, name):
+    """Returns the source of the base class for one model of the API"""
+    lines = ["class {}(TinApiModel):".format(name), _docstring([model._obj_path], 4)]
+
+    attrs = [
+        (k, v)
+        for k, v in model_data.items()
+        if k.isidentifier() and not keyword.iskeyword(k)
+    ]
+    if attrs:
+        lines.append("")
+    for key, value in attrs:
+        lines.append(_literal("    {} = ".format(key), value))
+
+    return "\n".join(lines)
+
+
+def _credentials_src(conf):
+    """Returns the credentials config value, as it was before being loaded"""
+    config_data = conf.config_data
+    if conf.environment:
+        env_data = config_data["environments"][conf.environment] or {}
+        return env_data.get(
+            "credentials", config_data.get("common", {}).get("credentials", None)
+        )
+    return config_data.get("credentials", None)
+
+
+def generate(conf, class_name=None):
+    """Writes the source of a Python module with an API class for a config
+
+    The module holds the resolved config as a literal, so the API is built without
+    reading YAML, merging environments or looking at env vars. The API class holds
+    every method's URL, headers, path tokens and other settings already worked
+    out. Each class and model gets a named base class, listing its methods and
+    their URLs, that the classes and models built at runtime inherit from.
+    Credentials aren't written, they are loaded when the API is built.
+
+    Args:
+        conf (TinConfig): The config
+        class_name (str): Name of the API class. Defaults to one from the API name.
+
+    Returns:
+        str: The module source
+    """
+    # Only built to walk its classes and work out method settings, so it's
+    # kept from opening connections, whatever the config's prewarm says
+    walk_conf = copy.copy(conf)
+    walk_conf._api_config = dict(conf._api_config)
+    walk_conf._api_config.pop("prewarm", None)
+    api = TinApi(config=walk_conf)
+    state = conf._snapshot_state()
+
+    # Only a credentials file name is written. Inline credentials must be passed
+    # when the API is built.
+    credentials = _credentials_src(conf)
+    if credentials is not None:
+        try:
+            conf.find_config(credentials)
+        except (TinConfigNotFound, TypeError):
+            credentials = None
+
+    if class_name is None:
+        class_name = api_class_name(conf.api_name)
+    elif not class_name.isidentifier() or keyword.iskeyword(class_name):
+        raise TinError("Invalid class name: {}".format(class_name))
+
+    classes = []
+    methods = []
+    models = []
+    for cls in _walk(api):
+        classes.append((cls.obj_path, python_name(cls.obj_path), cls))
+        for method in cls.methods():
+            methods.append(
+                (
+                    method.obj_path,
+                    TinApiMethod.settings(method.api, method._method_data),
+                )
+            )
+        if cls.model is not None:
+            model_data = conf.models.get(cls.model.__name__, {})
+            model_path = cls.model._obj_path
+            models.append((model_path, python_name(model_path), cls.model, model_data))
+
+    header = [
+        _docstring(
+            [
+                "{} API client{}".format(
+                    conf.api_name,
+                    (
+                        ", {} environment".format(conf.environment)
+                        if conf.environment
+                        else ""
+                    ),
+                ),
+                "",
+                "Written by `tin generate` with tin {}, from".format(VERSION),
+                "",
+                "    {}".format(conf.config_src),
+                "",
+                "Generate it again, rather than editing it, when the config changes.",
+            ],
+            0,
+        ),
+        "from tin.api import TinApi\n"
+        "from tin.base import TinApiClass\n"
+        "from tin.config import TinConfig\n"
+        "from tin.models import TinApiModel",
+        "TIN_VERSION = {!r}\n\n"
+        "# The resolved config, without credentials\n"
+        "{}\n\n"
+        "# The credentials config value, loaded each time the API is built\n"
+        "CREDENTIALS = {!r}".format(VERSION, _literal("CONFIG = ", state), credentials),
+    ]
+    definitions = [_class_source(cls, name) for _, name, cls in classes]
+    definitions.extend(
+        _model_source(model, model_data, name) for _, name, model, model_data in models
+    )
+
+    api_lines = [
+        "class {}(TinApi):".format(class_name),
+        _docstring(
+            [
+                "The {} API, built from the config above".format(conf.api_name),
+                "",
+                "Args:",
+                "    config (TinConfig): Optional config to use instead",
+                "    credentials (any): The credentials config value, or loaded "
+                "credentials",
+                "    env_prefix (str): Optional env var prefix, as for TinConfig",
+            ],
+            4,
+        ),
+        "",
+        _bases("_class_bases", [(p, n) for p, n, _ in classes]),
+        _bases("_model_bases", [(p, n) for p, n, _, _ in models]),
+        "",
+        "    # The methods' settings, worked out from the config",
+        _literal("    _method_settings = ", dict(methods)),
+        "",
+        "    def __init__("
+        "self, config=None, credentials=CREDENTIALS, env_prefix=None):\n"
+        "        if config is None:\n"
+        "            config = TinConfig.from_snapshot("
+        "CONFIG, credentials, env_prefix)\n"
+        "        else:\n"
+        "            # The methods' settings were worked out from CONFIG\n"
+        "            self._method_settings = {}\n"
+        "        super().__init__(config=config)",
+    ]
+    definitions.append("\n".join(api_lines))
+
+    return "\n\n".join(header) + "\n\n\n" + "\n\n\n".join(definitions) + "\n"
@@ -0,0 +1,55 @@
+import importlib
+import importlib.util
+import sys
+
+
+class TinLazyModule(object):
+    """Stands in for a module until one of its attributes is first used, and then
+    imports it
+
+    The module is imported as usual, by importlib.import_module(), which holds
+    the import lock while it loads. Threads using it at once all wait for it to
+    be loaded, and sys.modules only ever holds the module itself.
+
+    Args:
+        name (str): The module name
+    """
+
+    def __init__(self, name):
+        self._lazy_name = name
+        self._lazy_module = None
+
+    def __getattr__(self, attr):
+        # Only called for attributes the stand-in doesn't have itself
+        module = self._lazy_module
+        if module is None:
+            module = self._lazy_module = importlib.import_module(self._lazy_name)
+        return getattr(module, attr)
+
+    def __repr__(self):
+        return "<lazy module '{}'>".format(self._lazy_name)
+
+
+def lazy_import(name):
+    """Imports a module on first attribute access, rather than now
+
+    Importing requests, yaml and the like takes a good part of the time it takes
+    to start tin, and isn't needed until an API is built or a call is made.
+
+    Args:
+        name (str): The module name
+
+    Returns:
+        module|TinLazyModule: The module if it's imported already, or a stand-in
+            that imports it when first used
+
+    Raises:
+        ImportError: If the module isn't installed
+    """
+    if name in sys.modules:
+        return sys.modules[name]
+
+    if importlib.util.find_spec(name) is None:
+        raise ImportError("No module named '{}'".format(name), name=name)
+
+    return TinLazyModule(name)
@@ -1,15 +1,19 @@
 from .base import TinApiBase
 from .exceptions import TinModelError, TinError
-from deepmerge import always_merger
-import simplejson as json
+from .registry import rebuild_model
+from .lazy import lazy_import
+
+# Loaded when first used, see lazy_import()
+deepmerge = lazy_import("deepmerge")
+json = lazy_import("simplejson")
 
 CRUD_METHODS = {"create": None, "read": None, "update": None, "delete": None}
 DEFAULT_ID_ATTR = "id"
 
 
 class TinApiModelFactory(object):
-    def __call__(self, name, data):
-        new_model_type = type(name, (TinApiModel,), data)
+    def __call__(self, name, data, base=None):
+        new_model_type = type(name, (base or TinApiModel,), data)
         new_model_type.API_METHODS = dict()
         new_model_type.CRUD_METHODS = dict(CRUD_METHODS)
         new_model_type.id_attr = data.get("id_attr", False) or str(DEFAULT_ID_ATTR)
@@ -20,6 +24,7 @@ class TinApiModelFactory(object):
 class TinApiModel(TinApiBase):
 
     _initialized = False
+    _registry_key = None
 
     def __init__(self, data={}):
         TinApiBase.__init__(self)
@@ -33,6 +38,13 @@ class TinApiModel(TinApiBase):
 
         self._initialized = True
 
+    def __reduce__(self):
+        # Model types are built at runtime, so instances pickle as their type's
+        # obj_path and their data
+        if self._registry_key is None:
+            raise TinError("{} is not part of a registered API".format(type(self)))
+        return (rebuild_model, (self._registry_key, self._obj_path, self._data))
+
     def __setattr__(self, key, value):
         if self._initialized:
             if key not in self._immutables:
@@ -164,7 +176,7 @@ class TinApiModel(TinApiBase):
 
     def merge(self, data):
         self._check_id(data)
-        self._data = always_merger.merge(self._data, data)
+        self._data = deepmerge.always_merger.merge(self._data, data)
 
     @property
     def id(self):
@@ -0,0 +1,427 @@
+from .exceptions import TinError
+
+DEFAULT_PAGINATION = "link"
+
+
+class TinPage(object):
+    """A single fetched page of a paginated call
+
+    Args:
+        url (str): The url the page was requested from
+        params (dict): Query parameters the page was requested with
+        response (requests.Response): The response
+        data (any): The decoded response data, None for 204s
+        number (int): Page number, counting from 1
+        fetched (int): Number of items in this page and all preceding pages
+
+    Attributes:
+        count (int|None): Number of items in this page, if they can be found
+        next_request (tuple|None): The url and params of the following page, or
+            None if this is the last page to fetch
+    """
+
+    def __init__(self, url, params, response, data, number=1, fetched=0, count=None):
+        self.url = url
+        self.params = params
+        self.response = response
+        self.data = data
+        self.number = number
+        self.count = count
+        self.fetched = fetched
+        self.next_request = None
+
+
+class TinPaginator(object):
+    """Base pagination strategy
+
+    Paginators decide, from a fetched page, which request gets the next page, or
+    that there is no next page. They hold no state of their own, so one instance
+    serves every call of a method.
+
+    Args:
+        method (TinApiMethod): The method being paginated
+        **options: Strategy options from the API config
+
+    Options common to all strategies:
+        data_key (str): Dotted key path to the list of items in a dict response.
+            Defaults to the class's list_data_key.
+        total_key (str): Dotted key path to the total number of items, if the API
+            reports it in the body
+        total_header (str): Header carrying the total number of items
+    """
+
+    def __init__(self, method, **options):
+        self.method = method
+        self.options = options
+        self.data_key = options.get("data_key", None) or getattr(
+            method.cls, "list_data_key", None
+        )
+        self.total_key = options.get("total_key", None)
+        self.total_header = options.get("total_header", None)
+
+    def items(self, data):
+        """Returns the list of items in a page's data, or None if there isn't one"""
+        if isinstance(data, list):
+            return data
+        if isinstance(data, dict) and self.data_key:
+            items = lookup(data, self.data_key)
+            if isinstance(items, list):
+                return items
+        return None
+
+    def replace_items(self, data, items):
+        """Returns the data with its list of items replaced by the given one"""
+        if isinstance(data, list):
+            return items
+
+        parent = data
+        keys = self.data_key.split(".")
+        for key in keys[:-1]:
+            parent = parent[key]
+        parent[keys[-1]] = items
+        return data
+
+    def total(self, page):
+        """Returns the total number of items reported by the API, if it is"""
+        total = None
+        if self.total_header:
+            total = page.response.headers.get(self.total_header, None)
+        elif self.total_key and isinstance(page.data, dict):
+            total = lookup(page.data, self.total_key)
+
+        try:
+            return int(total) if total is not None else None
+        except ValueError:
+            raise TinError("Invalid total item count from the API: {}".format(total))
+
+    def first_request(self, url, params):
+        """Returns the url and params for the first page"""
+        return url, params
+
+    def next_request(self, page):
+        """Returns the url and params for the page after the given one, or None
+        when there are no more pages"""
+        raise NotImplementedError
+
+    def shrink_request(self, url, params, remaining, number):
+        """Returns the url and params for a page request, with the page size
+        reduced to the number of items still wanted, if the strategy can do that
+        without changing which items the page holds. Page sizes are never grown.
+
+        Args:
+            url (str): The url of the request
+            params (dict): The params of the request
+            remaining (int): Number of items still wanted
+            number (int): Number of the page being requested, counting from 1
+        """
+        return url, params
+
+    def remaining_requests(self, page):
+        """Returns the url and params of every page after the given one, in order,
+        if they can be worked out without fetching them. Returns None if they
+        can't, in which case pages must be fetched one after another."""
+        return None
+
+
+class TinLinkPaginator(TinPaginator):
+    """Follows RFC 5988 Link: rel=next headers"""
+
+    def next_request(self, page):
+        if "next" not in page.response.links:
+            return None
+        return page.response.links["next"]["url"], page.params
+
+
+class TinOffsetPaginator(TinPaginator):
+    """Offset/limit pagination
+
+    Options:
+        offset_param (str): Query parameter for the offset. Default "offset"
+        limit_param (str): Query parameter for the page size. Default "limit"
+        limit (int): Page size to request. If unset, the API's default is used
+            and pagination stops at the first empty page or the reported total.
+        start (int): Offset of the first page. Default 0
+    """
+
+    def __init__(self, method, **options):
+        super().__init__(method, **options)
+        self.offset_param = options.get("offset_param", "offset")
+        self.limit_param = options.get("limit_param", "limit")
+        self.limit = int(options["limit"]) if options.get("limit") else None
+        self.start = int(options.get("start", 0))
+
+    def first_request(self, url, params):
+        params = dict(params)
+        params.setdefault(self.offset_param, self.start)
+        if self.limit:
+            params.setdefault(self.limit_param, self.limit)
+        return url, params
+
+    def page_size(self, params):
+        size = params.get(self.limit_param, None)
+        return int(size) if size is not None else None
+
+    def shrink_request(self, url, params, remaining, number):
+        size = self.page_size(params)
+        if size is None or remaining >= size:
+            return url, params
+        params = dict(params)
+        params[self.limit_param] = remaining
+        return url, params
+
+    def next_request(self, page):
+        if not page.count:
+            return None
+
+        total = self.total(page)
+        size = self.page_size(page.params)
+        offset = int(page.params.get(self.offset_param, self.start)) + page.count
+
+        if total is not None and offset >= total:
+            return None
+        if total is None and size is not None and page.count < size:
+            return None
+
+        params = dict(page.params)
+        params[self.offset_param] = offset
+        return page.url, params
+
+    def remaining_requests(self, page):
+        total = self.total(page)
+        if total is None or not page.count:
+            return None
+
+        size = self.page_size(page.params)
+        offset = int(page.params.get(self.offset_param, self.start)) + page.count
+        if size is not None and page.count < size and offset < total:
+            # A short page before the end means the API caps page sizes, and
+            # there's no telling what size it'll cap the next pages to
+            return None
+
+        requests = []
+        while offset < total:
+            params = dict(page.params)
+            params[self.offset_param] = offset
+            requests.append((page.url, params))
+            offset += page.count
+
+        return requests
+
+
+class TinHeaderCountPaginator(TinOffsetPaginator):
+    """Offset/limit pagination that stops at a total item count sent in a header
+
+    Options:
+        header (str): The header with the total. Default "X-Total-Count"
+        Plus those of TinOffsetPaginator
+    """
+
+    def __init__(self, method, **options):
+        super().__init__(method, **options)
+        self.total_header = options.get("header", None) or "X-Total-Count"
+
+    def next_request(self, page):
+        if self.total(page) is None:
+            return None
+        return super().next_request(page)
+
+
+class TinPageNumberPaginator(TinPaginator):
+    """Page number pagination
+
+    Options:
+        page_param (str): Query parameter for the page number. Default "page"
+        size_param (str): Query parameter for the page size, if any
+        size (int): Page size to request, if size_param is set
+        start (int): Number of the first page. Default 1
+        total_pages_key (str): Dotted key path to the number of pages, if the API
+            reports it in the body
+    """
+
+    def __init__(self, method, **options):
+        super().__init__(method, **options)
+        self.page_param = options.get("page_param", "page")
+        self.size_param = options.get("size_param", None)
+        self.size = int(options["size"]) if options.get("size") else None
+        self.start = int(options.get("start", 1))
+        self.total_pages_key = options.get("total_pages_key", None)
+
+    def first_request(self, url, params):
+        params = dict(params)
+        params.setdefault(self.page_param, self.start)
+        if self.size_param and self.size:
+            params.setdefault(self.size_param, self.size)
+        return url, params
+
+    def page_size(self, params):
+        if self.size_param and params.get(self.size_param, None) is not None:
+            return int(params[self.size_param])
+        return None
+
+    def shrink_request(self, url, params, remaining, number):
+        # Page numbers are counted in pages of the original size, so only the
+        # first page can be made smaller
+        size = self.page_size(params)
+        if number != 1 or size is None or remaining >= size:
+            return url, params
+        params = dict(params)
+        params[self.size_param] = remaining
+        return url, params
+
+    def total_pages(self, page):
+        """Returns the total number of pages, if the API reports it or it can be
+        worked out from the total number of items"""
+        if self.total_pages_key and isinstance(page.data, dict):
+            pages = lookup(page.data, self.total_pages_key)
+            if pages is not None:
+                return int(pages)
+
+        total = self.total(page)
+        if total is None or not page.count:
+            return None
+
+        # Pages the API capped to fewer items than asked for are counted in its
+        # size. Only the last page may be short otherwise.
+        size = self.page_size(page.params)
+        if size is None or (page.count < size and page.fetched < total):
+            size = page.count
+        return -(-total // size)
+
+    def capped(self, page):
+        """Whether the API sent fewer items than the page asked for, before
+        reaching the total number of items"""
+        total = self.total(page)
+        size = self.page_size(page.params)
+        return (
+            total is not None
+            and size is not None
+            and page.count is not None
+            and page.count < size
+            and page.fetched < total
+        )
+
+    def next_request(self, page):
+        if not page.count:
+            return None
+
+        number = int(page.params.get(self.page_param, self.start))
+        total_pages = self.total_pages(page)
+        size = self.page_size(page.params)
+
+        if total_pages is not None and number - self.start + 1 >= total_pages:
+            return None
+        if total_pages is None and size is not None and page.count < size:
+            return None
+
+        params = dict(page.params)
+        params[self.page_param] = number + 1
+        return page.url, params
+
+    def remaining_requests(self, page):
+        total_pages = self.total_pages(page)
+        if total_pages is None or self.capped(page):
+            return None
+
+        requests = []
+        number = int(page.params.get(self.page_param, self.start)) + 1
+        while number < self.start + total_pages:
+            params = dict(page.params)
+            params[self.page_param] = number
+            requests.append((page.url, params))
+            number += 1
+
+        return requests
+
+
+class TinCursorPaginator(TinPaginator):
+    """Cursor pagination, with the next cursor in the response body
+
+    Options:
+        cursor_key (str): Dotted key path to the next cursor. Default "next_cursor"
+        cursor_param (str): Query parameter to send the cursor in. Default "cursor"
+        has_more_key (str): Dotted key path to a boolean saying whether there are
+            more pages, for APIs that always send a cursor
+        limit_param (str): Query parameter for the page size, if any
+        limit (int): Page size to request, if limit_param is set
+    """
+
+    def __init__(self, method, **options):
+        super().__init__(method, **options)
+        self.cursor_key = options.get("cursor_key", "next_cursor")
+        self.cursor_param = options.get("cursor_param", "cursor")
+        self.has_more_key = options.get("has_more_key", None)
+        self.limit_param = options.get("limit_param", None)
+        self.limit = int(options["limit"]) if options.get("limit") else None
+
+    def first_request(self, url, params):
+        if self.limit_param and self.limit:
+            params = dict(params)
+            params.setdefault(self.limit_param, self.limit)
+        return url, params
+
+    def shrink_request(self, url, params, remaining, number):
+        if not self.limit_param or params.get(self.limit_param, None) is None:
+            return url, params
+        if remaining >= int(params[self.limit_param]):
+            return url, params
+        params = dict(params)
+        params[self.limit_param] = remaining
+        return url, params
+
+    def next_request(self, page):
+        if not isinstance(page.data, dict):
+            return None
+
+        if self.has_more_key and not lookup(page.data, self.has_more_key):
+            return None
+
+        cursor = lookup(page.data, self.cursor_key)
+        if not cursor:
+            return None
+
+        params = dict(page.params)
+        params[self.cursor_param] = cursor
+        return page.url, params
+
+
+PAGINATORS = {
+    "link": TinLinkPaginator,
+    "offset": TinOffsetPaginator,
+    "header_count": TinHeaderCountPaginator,
+    "page": TinPageNumberPaginator,
+    "cursor": TinCursorPaginator,
+}
+
+
+def lookup(data, key_path):
+    """Looks up a dotted key path, like "meta.next_cursor", in nested dicts"""
+    for key in key_path.split("."):
+        if not isinstance(data, dict) or key not in data:
+            return None
+        data = data[key]
+    return data
+
+
+def build_paginator(method, config=None):
+    """Builds the pagination strategy for a method
+
+    Args:
+        method (TinApiMethod): The method to paginate
+        config (dict|str|None): The pagination config. A dict with a "type" key
+            and strategy options, or just the type name. Defaults to Link headers.
+
+    Returns:
+        TinPaginator
+    """
+    if config is None:
+        config = {"type": DEFAULT_PAGINATION}
+    elif isinstance(config, str):
+        config = {"type": config}
+
+    options = dict(config)
+    pagination_type = options.pop("type", DEFAULT_PAGINATION)
+
+    if pagination_type not in PAGINATORS:
+        raise TinError("Unknown pagination type: {}".format(pagination_type))
+
+    return PAGINATORS[pagination_type](method, **options)
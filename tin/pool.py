@@ -0,0 +1,202 @@
+import os
+import threading
+
+DEFAULT_PORTS = {"http": 80, "https": 443}
+
+# Transport adapters, and so connection pools, shared by every TinApi in the
+# process. Keyed by pool_key().
+_adapters = {}
+_adapters_lock = threading.Lock()
+
+# urllib3 pool managers shared by APIs using the urllib3 transport. Keyed by
+# ssl settings and socket path, as each one pools connections to any origin.
+_pool_managers = {}
+
+# httpx clients shared by APIs using the http2 transport, keyed the same way
+_http2_clients = {}
+
+# TLS contexts, by ssl settings and ALPN protocols, shared by every adapter and
+# client in the process, see adapters.ssl_context(). Kept here, so they're given
+# a new lock in forked children before APIs mount adapters again.
+_ssl_contexts = {}
+_ssl_contexts_lock = threading.Lock()
+
+
+def _new_locks():
+    # A thread may have held one when the process forked. It isn't in the child
+    # to release it, so the child starts with its own.
+    global _adapters_lock, _ssl_contexts_lock
+    _adapters_lock = threading.Lock()
+    _ssl_contexts_lock = threading.Lock()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_new_locks)
+
+
+def _hashable(value):
+    if isinstance(value, (list, tuple)):
+        return tuple(value)
+    return value
+
+
+def pool_key(scheme, host, port, verify=True, cert=None, socket_path=None):
+    """Returns the key of the shared pool for an origin and TLS settings
+
+    Connections are only shared between APIs that would make them the same way,
+    so APIs that verify certificates never get connections made by ones that
+    don't, or made with another client certificate, or over another socket.
+
+    Args:
+        scheme (str): http or https
+        host (str): The host name
+        port (int|str): The port
+        verify (bool|str): The ssl verify setting, True, False or a CA bundle path
+        cert (str|list|None): The ssl cert setting, a client cert path, or cert
+            and key paths
+        socket_path (str|None): A Unix domain socket connections are made over,
+            rather than TCP
+
+    Returns:
+        tuple
+    """
+    return (
+        scheme.lower(),
+        host.lower(),
+        int(port),
+        _hashable(verify),
+        _hashable(cert),
+        socket_path,
+    )
+
+
+def mount_prefixes(scheme, host, port):
+    """Returns the URL prefixes a session mounts an origin's adapter on. URLs
+    without a port, e.g. in next page links, get it too if the port is the
+    scheme's default."""
+    scheme = scheme.lower()
+    prefixes = ["{}://{}:{}/".format(scheme, host.lower(), int(port))]
+    if DEFAULT_PORTS.get(scheme, None) == int(port):
+        prefixes.append("{}://{}/".format(scheme, host.lower()))
+    return prefixes
+
+
+def new_adapter(key):
+    """Returns a new transport adapter for a pool key, whose HTTPS connections
+    share one TLS context built from the key's ssl settings. Keys with a socket
+    path get an adapter connecting over it.
+
+    Args:
+        key (tuple): From pool_key()
+
+    Returns:
+        tin.adapters.TinHTTPAdapter
+    """
+    # Imported here, as it imports requests
+    from .adapters import TinHTTPAdapter, UnixSocketAdapter
+
+    if key[5] is not None:
+        return UnixSocketAdapter(key[5], verify=key[3], cert=key[4])
+    return TinHTTPAdapter(verify=key[3], cert=key[4])
+
+
+def shared_adapter(key):
+    """Returns the process's transport adapter for a pool key, creating it if
+    needed
+
+    Args:
+        key (tuple): From pool_key()
+
+    Returns:
+        tin.adapters.TinHTTPAdapter
+    """
+    with _adapters_lock:
+        adapter = _adapters.get(key, None)
+        if adapter is None:
+            adapter = _adapters[key] = new_adapter(key)
+        return adapter
+
+
+def new_pool_manager(verify=True, cert=None, socket_path=None):
+    """Returns a new urllib3 pool manager making connections as new_adapter()'s
+    adapters do
+
+    Args:
+        verify (bool|str): The ssl verify setting
+        cert (str|list|None): The ssl cert setting
+        socket_path (str|None): A Unix domain socket to connect over
+
+    Returns:
+        urllib3.PoolManager
+    """
+    # Imported here, as it imports requests
+    from .adapters import pool_manager
+
+    return pool_manager(verify, cert, socket_path)
+
+
+def shared_pool_manager(verify=True, cert=None, socket_path=None):
+    """Returns the process's urllib3 pool manager for ssl settings and a socket
+    path, creating it if needed
+
+    Args:
+        verify (bool|str): The ssl verify setting
+        cert (str|list|None): The ssl cert setting
+        socket_path (str|None): A Unix domain socket to connect over
+
+    Returns:
+        urllib3.PoolManager
+    """
+    key = (_hashable(verify), _hashable(cert), socket_path)
+    with _adapters_lock:
+        manager = _pool_managers.get(key, None)
+        if manager is None:
+            manager = _pool_managers[key] = new_pool_manager(*key)
+        return manager
+
+
+def new_http2_client(verify=True, cert=None, socket_path=None):
+    """Returns a new httpx client for the http2 transport
+
+    Args:
+        verify (bool|str): The ssl verify setting
+        cert (str|list|None): The ssl cert setting
+        socket_path (str|None): A Unix domain socket to connect over
+
+    Returns:
+        httpx.Client
+    """
+    # Imported here, as httpx is optional
+    from .transports import http2_client
+
+    return http2_client(verify, cert, socket_path)
+
+
+def shared_http2_client(verify=True, cert=None, socket_path=None):
+    """Returns the process's httpx client for ssl settings and a socket path,
+    creating it if needed
+
+    Args:
+        verify (bool|str): The ssl verify setting
+        cert (str|list|None): The ssl cert setting
+        socket_path (str|None): A Unix domain socket to connect over
+
+    Returns:
+        httpx.Client
+    """
+    key = (_hashable(verify), _hashable(cert), socket_path)
+    with _adapters_lock:
+        client = _http2_clients.get(key, None)
+        if client is None:
+            client = _http2_clients[key] = new_http2_client(*key)
+        return client
+
+
+def reset():
+    """Forgets every shared adapter, pool manager and client. Called in forked
+    children, so they don't share the parent's pooled connections. Their sockets
+    belong to the parent, so they aren't closed."""
+    with _adapters_lock:
+        _adapters.clear()
+        _pool_managers.clear()
+        _http2_clients.clear()
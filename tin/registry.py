@@ -0,0 +1,132 @@
+import uuid
+import weakref
+
+from .exceptions import TinError
+
+# Every live TinApi in this process, by its registry key
+_apis = weakref.WeakValueDictionary()
+
+
+class TinRegistryKey(object):
+    """Identifies one TinApi, so pickled classes, methods and models find their
+    way back to the API they came from, and not another built from the same API
+    and environment with different settings. Pickles as its token and the API's
+    config, so the API can be built again where it isn't registered.
+
+    Args:
+        conf (TinConfig): The config of the API
+        token (str|None): The key's token. Defaults to a new, random one.
+    """
+
+    __slots__ = ("conf", "token")
+
+    def __init__(self, conf, token=None):
+        self.conf = conf
+        self.token = token or uuid.uuid4().hex
+
+    def __eq__(self, other):
+        return isinstance(other, TinRegistryKey) and other.token == self.token
+
+    def __hash__(self):
+        return hash(self.token)
+
+    def __reduce__(self):
+        return (TinRegistryKey, (self.conf, self.token))
+
+    def __repr__(self):
+        return "<{} {} {} {}>".format(
+            type(self).__name__, self.conf.api_name, self.conf.environment, self.token
+        )
+
+
+def registry_key(conf):
+    """Returns a new key to register an API built from a config under
+
+    Args:
+        conf (TinConfig): The config
+
+    Returns:
+        TinRegistryKey
+    """
+    return TinRegistryKey(conf)
+
+
+def register(api, key=None):
+    """Registers an API, so its classes, methods and models can be found again by
+    obj_path when they are unpickled in this process
+
+    Args:
+        api (TinApi): The API
+        key (TinRegistryKey|None): The key to register it under, replacing its
+            own. Must be given before any of the API's classes are built.
+    """
+    if key is not None:
+        api._registry_key = key
+    _apis[api._registry_key] = api
+
+
+def get_api(key):
+    """Returns the registered API for a key, building it again from the key's
+    config if it isn't registered in this process, or has been garbage collected
+
+    Args:
+        key (TinRegistryKey): A key from registry_key()
+
+    Returns:
+        TinApi
+    """
+    api = _apis.get(key, None)
+    if api is None:
+        # Imported here, as the api module imports this one
+        from .api import TinApi
+
+        api = TinApi(config=key.conf)
+        register(api, key)
+    return api
+
+
+def resolve(api, obj_path):
+    """Finds the method or class at an obj_path, like "myapi.things.list", in an
+    API's tree
+
+    Args:
+        api (TinApi): The API
+        obj_path (str): The obj_path
+
+    Returns:
+        TinApiMethod|TinApiClass
+    """
+    obj = api
+    for name in obj_path.split(".")[1:]:
+        obj = getattr(obj, name, None)
+        if obj is None:
+            raise TinError("{} not found in {}".format(obj_path, api))
+    return obj
+
+
+def rebuild_api(key, state):
+    """Unpickles a TinApi, building it from its key's config. It's registered
+    under the key, unless the API it was pickled from is still registered here."""
+    from .api import TinApi
+
+    api = TinApi(config=key.conf)
+    if key not in _apis:
+        register(api, key)
+    api.__dict__.update(state)
+    return api
+
+
+def rebuild_object(key, obj_path):
+    """Unpickles a class or method, as the one at its obj_path in the registered
+    API"""
+    return resolve(get_api(key), obj_path)
+
+
+def rebuild_model(key, obj_path, data):
+    """Unpickles a model instance, as an instance of the model of the class it
+    came from, in the registered API"""
+    cls_path, _ = obj_path.rsplit(".", 1)
+    cls = resolve(get_api(key), cls_path)
+    if cls.model is None:
+        raise TinError("{} has no model".format(cls_path))
+    return cls.model(data)
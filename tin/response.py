@@ -1,4 +1,9 @@
+import mmap
+
+from collections.abc import Sequence
+
 from .exceptions import TinError
+from .spill import TinSpilledList
 
 
 class TinApiResponse(object):
@@ -19,6 +24,12 @@ class TinApiResponse(object):
     def raw(self):
         return self._response_data
 
+    @property
+    def timing(self):
+        """Timing data for the (last) request, such as elapsed seconds and, if the
+        request body was compressed, compression time and ratio"""
+        return getattr(self._response, "tin_timing", {})
+
 
 class TinApiResponseDict(TinApiResponse, dict):
     def __init__(self, response_data, response, method, nomodel=False):
@@ -32,9 +43,12 @@ class TinApiResponseDict(TinApiResponse, dict):
             and getattr(method.cls, "list_data_key") in response_data
         ):
 
-            if method.cls.model and not nomodel:
+            object_data = response_data[method.cls.list_data_key]
+            if isinstance(object_data, TinSpilledList):
+                if method.cls.model and not nomodel:
+                    object_data.with_model(method.cls.model)
+            elif method.cls.model and not nomodel:
                 new_data[method.cls.list_data_key] = []
-                object_data = response_data[method.cls.list_data_key]
                 for obj in object_data:
                     new_data[method.cls.list_data_key].append(method.cls.model(obj))
 
@@ -56,6 +70,35 @@ class TinApiResponseList(TinApiResponse, list):
         list.__init__(self, obj_list)
 
 
+class TinApiResponseSpilled(TinApiResponse, Sequence):
+    """A list result that was moved to a temporary file as pages were merged.
+
+    response_data is a TinSpilledList. Items are read back, and wrapped as the
+    method's model, as they are accessed.
+    """
+
+    def __init__(self, response_data, response, method, nomodel=False):
+        TinApiResponse.__init__(self, response_data, response, method)
+        if method.cls.model and not nomodel:
+            response_data.with_model(method.cls.model)
+
+    def __len__(self):
+        return len(self._response_data)
+
+    def __getitem__(self, index):
+        return self._response_data[index]
+
+    def __iter__(self):
+        return iter(self._response_data)
+
+    def __eq__(self, other):
+        return self._response_data == other
+
+    def close(self):
+        """Deletes the temporary file"""
+        self._response_data.close()
+
+
 class TinApiResponseString(TinApiResponse, str):
     def __init__(self, response_data, response, method):
         TinApiResponse.__init__(self, response_data, response, method)
@@ -98,13 +141,68 @@ class TinApiResponseSingleton(TinApiResponse, dict):
         return self.model_instance if self.model_instance else self
 
 
+class TinApiResponseStream(TinApiResponse):
+    """Lazily iterates over objects decoded from a streamed response.
+
+    response_data is an iterator of decoded objects, which are wrapped as the
+    method's model as they are consumed. Iterating a second time yields nothing.
+    """
+
+    def __init__(self, response_data, response, method, nomodel=False):
+        TinApiResponse.__init__(self, response_data, response, method)
+        self._nomodel = nomodel
+        self._items = self._wrap_items()
+
+    def _wrap_items(self):
+        model = None if self._nomodel else self._method.cls.model
+        for obj_data in self._response_data:
+            if model and isinstance(obj_data, dict):
+                yield model(obj_data)
+            else:
+                yield obj_data
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        return next(self._items)
+
+
+class TinApiResponseBinary(TinApiResponse):
+    """A downloaded body, written to a file or buffer rather than held in memory.
+
+    response_data is a tuple of the output the body was written to, and its size
+    """
+
+    def __init__(self, response_data, response, method):
+        TinApiResponse.__init__(self, response_data, response, method)
+        self.output, self.size = response_data
+
+    @property
+    def headers(self):
+        return self._response.headers
+
+    def mmap(self):
+        """Memory-maps the downloaded body read-only. Only works when the output
+        is a real file, which includes the default temporary file."""
+        if self.size == 0:
+            raise TinError("Cannot memory-map an empty download")
+        return mmap.mmap(self.output.fileno(), 0, access=mmap.ACCESS_READ)
+
+
 class TinApiResponseFactory(object):
     def __call__(self, response_data, response, method, nomodel=False):
+        if method.response_format == "ndjson":
+            return TinApiResponseStream(response_data, response, method, nomodel)
+        if method.response_format == "binary":
+            return TinApiResponseBinary(response_data, response, method)
         if method.singleton:
             singleton = TinApiResponseSingleton(
                 response_data, response, method, nomodel
             )
             return singleton.instance()
+        if isinstance(response_data, TinSpilledList):
+            return TinApiResponseSpilled(response_data, response, method, nomodel)
         if isinstance(response_data, list):
             return TinApiResponseList(response_data, response, method, nomodel)
         elif isinstance(response_data, dict):
@@ -0,0 +1,160 @@
+import os
+
+from .exceptions import TinError
+from .lazy import lazy_import
+
+json = lazy_import("simplejson")
+
+CHECKPOINT_VERSION = 1
+
+
+class TinCheckpoint(object):
+    """Where a paginated scan got to, so a new scan can carry on from there
+
+    Checkpoints are opaque to callers. They serialize to JSON, so they can be
+    persisted and loaded by a later process.
+
+    Args:
+        method (str): obj_path of the scanned method
+        url (str|None): The url of the next page to fetch
+        params (dict|None): The params of the next page to fetch
+        number (int): Number of the next page, counting from 1
+        fetched (int): Number of items fetched before the next page
+
+    Attributes:
+        done (bool): True if there are no more pages to fetch
+    """
+
+    def __init__(self, method, url=None, params=None, number=1, fetched=0):
+        self.method = method
+        self.url = url
+        self.params = params
+        self.number = number
+        self.fetched = fetched
+
+    @property
+    def done(self):
+        return self.url is None
+
+    def to_dict(self):
+        return {
+            "version": CHECKPOINT_VERSION,
+            "method": self.method,
+            "url": self.url,
+            "params": self.params,
+            "number": self.number,
+            "fetched": self.fetched,
+        }
+
+    def to_json(self):
+        """Returns the checkpoint as JSON"""
+        return json.dumps(self.to_dict())
+
+    @classmethod
+    def from_json(cls, data):
+        """Builds a checkpoint from the JSON returned by to_json()"""
+        try:
+            loaded = json.loads(data)
+        except json.JSONDecodeError:
+            raise TinError("Invalid checkpoint: {}".format(data))
+
+        if (
+            not isinstance(loaded, dict)
+            or loaded.get("version", None) != CHECKPOINT_VERSION
+        ):
+            raise TinError("Unsupported checkpoint: {}".format(data))
+
+        return cls(
+            loaded["method"],
+            loaded["url"],
+            loaded["params"],
+            loaded["number"],
+            loaded["fetched"],
+        )
+
+    def save(self, path):
+        """Writes the checkpoint to a file, replacing it atomically so a crash
+        mid-write never leaves a broken checkpoint behind"""
+        tmp_path = "{}.tmp".format(path)
+        with open(tmp_path, "w") as fh:
+            fh.write(self.to_json())
+            fh.flush()
+            os.fsync(fh.fileno())
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        """Reads a checkpoint written by save()"""
+        with open(path, "r") as fh:
+            return cls.from_json(fh.read())
+
+
+class TinScan(object):
+    """A resumable iteration over the pages of a method call
+
+    After each page the caller has finished with, the checkpoint moves on to the
+    following page, and is written to checkpoint_file if one was given. A page
+    is only finished with once the caller asks for the next one, so a scan that
+    is interrupted and resumed will see the page it was interrupted on again.
+
+    Args:
+        method (TinApiMethod): The method being scanned
+        call (TinApiCall): The prepared call
+        checkpoint (TinCheckpoint|None): Where to start from. None starts from
+            the first page, or from checkpoint_file if that exists
+        checkpoint_file (str|None): File the checkpoint is saved to
+
+    Attributes:
+        checkpoint (TinCheckpoint): Where a new scan should carry on from
+    """
+
+    def __init__(self, method, call, checkpoint=None, checkpoint_file=None):
+        self.method = method
+        self.checkpoint_file = checkpoint_file
+
+        if checkpoint is None and checkpoint_file:
+            if os.path.isfile(checkpoint_file):
+                checkpoint = TinCheckpoint.load(checkpoint_file)
+
+        if checkpoint is not None:
+            if checkpoint.method != method.obj_path:
+                raise TinError(
+                    "Checkpoint is for {}, not {}".format(
+                        checkpoint.method, method.obj_path
+                    )
+                )
+        else:
+            url, params = call.url, call.params
+            if call.paginate:
+                url, params = method.paginator.first_request(url, params)
+            checkpoint = TinCheckpoint(method.obj_path, url, params)
+
+        self._call = call
+        self.checkpoint = checkpoint
+
+    def _iter_pages(self):
+        if self.checkpoint.done:
+            return
+
+        self._call.resume_from = self.checkpoint
+
+        for page in self.method._iter_pages_ahead(self._call):
+            yield page
+
+            if page.next_request is None:
+                url, params = None, None
+            else:
+                url, params = page.next_request
+            self.checkpoint = TinCheckpoint(
+                self.method.obj_path, url, params, page.number + 1, page.fetched
+            )
+            if self.checkpoint_file:
+                self.checkpoint.save(self.checkpoint_file)
+
+    def __iter__(self):
+        """Yields one response object per page"""
+        return self.method._wrap_pages(self._call, self._iter_pages())
+
+    def items(self):
+        """Yields the items of every page"""
+        return self.method._wrap_items(self._call, self._iter_pages())
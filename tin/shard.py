@@ -0,0 +1,197 @@
+import concurrent.futures
+import multiprocessing
+import queue
+
+from .api import TinApi
+from .exceptions import TinError, TinInvalidArgs
+from .pagination import TinOffsetPaginator
+from .registry import register, resolve
+
+# Per worker process state, set up by _init_worker
+_worker = {}
+
+
+def _init_worker(key, results, stop):
+    """Builds the worker process's own TinApi from the parent's config, registered
+    under the parent API's key so models func returns unpickle as the parent's"""
+    # Pages left unread when a scan is stopped early mustn't keep the worker from
+    # exiting
+    results.cancel_join_thread()
+    _worker["api"] = TinApi(config=key.conf)
+    register(_worker["api"], key)
+    _worker["results"] = results
+    _worker["stop"] = stop
+
+
+def _put(message):
+    """Puts a message on the results queue, giving up if the scan was stopped"""
+    while not _worker["stop"].is_set():
+        try:
+            _worker["results"].put(message, timeout=0.1)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def _scan_shard(shard, obj_path, kwargs, start, end, func):
+    """Fetches the items from offset start up to end, sending each page's items,
+    or func's results for them, back to the parent"""
+    try:
+        method = resolve(_worker["api"], obj_path)
+        model = None if kwargs.pop("nomodel", False) else method.cls.model
+
+        params = dict(kwargs.pop("params", {}))
+        params[method.paginator.offset_param] = start
+        call = method._prepare_call(
+            None, dict(kwargs, params=params, limit=end - start, nomodel=True)
+        )
+
+        remaining = end - start
+        for page in method._iter_pages(call):
+            items = method.paginator.items(page.data) or []
+            items = items[:remaining]
+            remaining -= len(items)
+
+            if func is not None:
+                items = [func(model(i) if model else i) for i in items]
+
+            if items and not _put(("items", items)):
+                return
+            if remaining <= 0 or _worker["stop"].is_set():
+                return
+    finally:
+        _put(("done", shard))
+
+
+def shard_ranges(start, end, shards, size=None):
+    """Splits the offsets from start up to end into at most the given number of
+    contiguous ranges, each a multiple of the page size if there is one
+
+    Returns:
+        list: (start, end) tuples
+    """
+    span = -(-(end - start) // shards)
+    if size:
+        span = -(-span // size) * size
+    span = max(span, 1)
+    return [(offset, min(offset + span, end)) for offset in range(start, end, span)]
+
+
+def scan_sharded(method, shards=2, func=None, mp_context=None, **kwargs):
+    """Scans an offset paginated method from several processes at once
+
+    One small request finds the total number of items, and the offsets are split
+    into one range per shard. Each range is fetched in a worker process with its
+    own TinApi, built from the method's config, so decoding pages and running
+    func happen outside this process. Results are yielded as workers send them
+    back, a page at a time, so the order of items from different shards is not
+    preserved.
+
+    The method must use offset or header_count pagination, and the API must
+    report the total item count.
+
+    Args:
+        method (TinApiMethod): The method to scan
+        shards (int): Number of worker processes, and offset ranges
+        func (callable|None): Called in the worker with each item, as a model
+            unless nomodel is passed. Its return value is yielded instead of the
+            item, so must be picklable. Must itself be picklable, i.e. a module
+            level function.
+        mp_context (multiprocessing.context.BaseContext|None): The multiprocessing
+            context to start workers with. Defaults to the platform default.
+        **kwargs: Same as calling the method. limit caps the number of items.
+
+    Returns:
+        generator: Yields items, or func's results. Closing it stops the workers.
+    """
+    if not isinstance(method.paginator, TinOffsetPaginator):
+        raise TinError(
+            "scan_sharded() needs offset pagination, {} has {}".format(
+                method, type(method.paginator).__name__
+            )
+        )
+    if not isinstance(shards, int) or shards < 1:
+        raise TinInvalidArgs("shards must be a positive integer")
+    method._require_json("scan_sharded")
+
+    kwargs = dict(kwargs)
+    limit = kwargs.pop("limit", None)
+    nomodel = kwargs.get("nomodel", False)
+
+    # Ask for a single item, just to learn the total
+    call = method._prepare_call(None, dict(kwargs))
+    paginator = method.paginator
+    url, params = paginator.first_request(call.url, call.params)
+    size = paginator.page_size(params)
+    probe = method._fetch_page(
+        call, *paginator.shrink_request(url, params, 1, 1), number=1
+    )
+    total = paginator.total(probe)
+    if total is None:
+        raise TinError(
+            "scan_sharded() needs the API to report a total for {}".format(method)
+        )
+
+    start = int(params[paginator.offset_param])
+    end = total if limit is None else min(total, start + limit)
+    if end <= start:
+        return iter([])
+
+    return_models = func is None and method.cls.model and not nomodel
+    return _run_shards(
+        method,
+        shard_ranges(start, end, shards, size),
+        func,
+        mp_context,
+        kwargs,
+        return_models,
+    )
+
+
+def _run_shards(method, ranges, func, mp_context, kwargs, return_models):
+    """Runs a worker per range, yielding what they send back"""
+    ctx = mp_context or multiprocessing.get_context()
+    results = ctx.Queue(maxsize=len(ranges) * 2)
+    stop = ctx.Event()
+
+    pool = concurrent.futures.ProcessPoolExecutor(
+        max_workers=len(ranges),
+        mp_context=ctx,
+        initializer=_init_worker,
+        initargs=(method.api._registry_key, results, stop),
+    )
+    futures = []
+    try:
+        futures = [
+            pool.submit(
+                _scan_shard, shard, method.obj_path, dict(kwargs), start, end, func
+            )
+            for shard, (start, end) in enumerate(ranges)
+        ]
+
+        finished = 0
+        while finished < len(futures):
+            try:
+                kind, value = results.get(timeout=0.1)
+            except queue.Empty:
+                # A worker that died without saying so
+                for future in futures:
+                    if future.done() and future.exception() is not None:
+                        future.result()
+                continue
+
+            if kind == "done":
+                finished += 1
+                # Raises the worker's exception, if it had one
+                futures[value].result()
+                continue
+
+            for item in value:
+                yield method.cls.model(item) if return_models else item
+    finally:
+        stop.set()
+        # Shards that haven't started yet never will
+        for future in futures:
+            future.cancel()
+        pool.shutdown(wait=True)
@@ -0,0 +1,98 @@
+import array
+
+from collections.abc import Sequence
+
+from .exceptions import TinError
+from .lazy import lazy_import
+
+json = lazy_import("simplejson")
+tempfile = lazy_import("tempfile")
+
+
+class TinSpilledList(Sequence):
+    """A list of JSON items kept in a temporary NDJSON file instead of in memory
+
+    Items are appended as JSON lines, and the offset of each line is kept so
+    items can be read back lazily, by index or by iterating. The file is deleted
+    when the list is closed or garbage collected.
+
+    Args:
+        spill_dir (str|None): Directory for the temporary file. Defaults to the
+            system temporary directory.
+
+    Attributes:
+        model (type|None): If set, dict items are wrapped in this model as they
+            are read
+    """
+
+    def __init__(self, spill_dir=None):
+        self._file = tempfile.TemporaryFile(mode="w+b", dir=spill_dir)
+        self._offsets = array.array("q")
+        self._end = 0
+        self.model = None
+
+    def append(self, item):
+        line = json.dumps(item).encode("utf-8") + b"\n"
+        self._file.seek(self._end)
+        self._file.write(line)
+        self._offsets.append(self._end)
+        self._end += len(line)
+
+    def extend(self, items):
+        for item in items:
+            self.append(item)
+
+    def with_model(self, model):
+        """Sets the model items are wrapped in, and returns the list"""
+        self.model = model
+        return self
+
+    def _wrap(self, obj_data):
+        if self.model and isinstance(obj_data, dict):
+            return self.model(obj_data)
+        return obj_data
+
+    def _read(self, index):
+        start = self._offsets[index]
+        end = self._offsets[index + 1] if index + 1 < len(self._offsets) else self._end
+        self._file.seek(start)
+        return json.loads(self._file.read(end - start))
+
+    def __len__(self):
+        return len(self._offsets)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("TinSpilledList index out of range")
+
+        return self._wrap(self._read(index))
+
+    def __iter__(self):
+        if self._file.closed:
+            raise TinError("TinSpilledList has been closed")
+
+        # Lines are read one after another, but the position is kept here so
+        # indexing the list while iterating it doesn't lose our place
+        position = 0
+        for index in range(len(self)):
+            self._file.seek(position)
+            line = self._file.readline()
+            position = self._file.tell()
+            yield self._wrap(json.loads(line))
+
+    def __eq__(self, other):
+        if isinstance(other, (list, tuple, TinSpilledList)):
+            return len(self) == len(other) and all(a == b for a, b in zip(self, other))
+        return NotImplemented
+
+    def close(self):
+        """Deletes the backing file"""
+        self._file.close()
+
+    def __repr__(self):
+        return "<{} of {} items>".format(type(self).__name__, len(self))
@@ -0,0 +1,600 @@
+import importlib
+import os
+import threading
+import time
+import urllib.parse
+import weakref
+
+from . import pool
+from .exceptions import TinError
+from .lazy import lazy_import
+
+# Loaded when first used, see lazy_import()
+datetime = lazy_import("datetime")
+requests = lazy_import("requests")
+urllib3 = lazy_import("urllib3")
+
+# The redirects requests follows before giving up, see requests.models
+MAX_REDIRECTS = 30
+
+# The HTTP2StreamLocks of each httpx client
+_stream_locks = weakref.WeakKeyDictionary()
+_stream_locks_lock = threading.Lock()
+
+
+def _new_locks():
+    # As pool._new_locks() does
+    global _stream_locks, _stream_locks_lock
+    _stream_locks = weakref.WeakKeyDictionary()
+    _stream_locks_lock = threading.Lock()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_new_locks)
+
+
+# Transports the transport config key may name. Anything else is taken to be the
+# dotted path of a TinTransport subclass.
+TRANSPORTS = {
+    "requests": "tin.transports.RequestsTransport",
+    "urllib3": "tin.transports.Urllib3Transport",
+    "http2": "tin.transports.HTTP2Transport",
+}
+
+
+def transport_class(name):
+    """Returns the TinTransport subclass for a transport config value
+
+    Args:
+        name (str): A name from TRANSPORTS, or a dotted path to a class
+
+    Returns:
+        type
+
+    Raises:
+        TinError: If there's no such transport
+    """
+    path = TRANSPORTS.get(name, name)
+    module_name, _, cls_name = path.rpartition(".")
+    try:
+        cls = getattr(importlib.import_module(module_name), cls_name)
+    except (ImportError, AttributeError, ValueError) as e:
+        raise TinError("Unknown transport {}: {}".format(name, e))
+    if not (isinstance(cls, type) and issubclass(cls, TinTransport)):
+        raise TinError("Transport {} is not a TinTransport".format(name))
+    return cls
+
+
+def build_transport(api):
+    """Returns the transport set by an API's transport config key, which defaults
+    to requests
+
+    Args:
+        api (TinApi): The API
+
+    Returns:
+        TinTransport
+    """
+    return transport_class(api.conf.get("transport") or "requests")(api)
+
+
+def add_query(url, query):
+    """Appends an encoded query string to a url, after any query it has, as
+    requests does"""
+    if not query:
+        return url
+    base, hash_mark, fragment = url.partition("#")
+    return "{}{}{}{}{}".format(
+        base, "&" if "?" in base else "?", query, hash_mark, fragment
+    )
+
+
+class TinTransport(object):
+    """Sends the HTTP requests of an API's methods
+
+    Transports are given requests that are ready to send, with the url, query,
+    headers and body worked out by TinApiMethod, and the API's auth and ssl
+    settings. Whatever sends them, they return requests.Response objects, so
+    decoding, pagination and responses work the same for every transport.
+
+    Args:
+        api (TinApi): The API whose requests are sent
+    """
+
+    def __init__(self, api):
+        self.api = api
+
+    @property
+    def pooled(self):
+        """Whether connections are kept between requests, so warm() has a pool
+        to leave them in"""
+        return False
+
+    def request(self, method, url, query, headers, body=None, stream=False):
+        """Sends a request
+
+        Args:
+            method (str): The HTTP method
+            url (str): The url, which may already have a query
+            query (str): An encoded query string to add to the url
+            headers (dict): Request headers, with lowered key names
+            body (any): Optional request body, as returned by
+                TinApiMethod._encode_body()
+            stream (bool): If True, the response body is not read up front
+
+        Returns:
+            requests.Response
+        """
+        raise NotImplementedError
+
+    def connection_pool(self, scheme, host, port):
+        """Returns the urllib3 connection pool requests to an origin use, for
+        warm(), or None if there isn't one to warm
+
+        Args:
+            scheme (str): http or https
+            host (str): The host name
+            port (int): The port
+
+        Returns:
+            urllib3.HTTPConnectionPool|None
+        """
+        return None
+
+
+class RequestsTransport(TinTransport):
+    """Sends requests with the API's requests session, or with requests itself if
+    use_session is off. The default."""
+
+    def __init__(self, api):
+        super().__init__(api)
+        if api.conf.get("socket_path") and api._session is None:
+            raise TinError("socket_path needs use_session, to mount its adapter on")
+
+    @property
+    def pooled(self):
+        return self.api._session is not None
+
+    def request(self, method, url, query, headers, body=None, stream=False):
+        # Grab the requests method based on http method name
+        try:
+            requests_method = getattr(self.api.request, method.lower())
+        except AttributeError:
+            raise TinError("Invalid HTTP method: {}".format(method))
+
+        # Common arguments with all methods
+        request_args = {
+            "headers": headers,
+            "auth": self.api.auth,
+            "verify": self.api.conf.ssl["verify"],
+            "params": query,
+        }
+
+        if self.api.conf.ssl.get("cert", None):
+            request_args["cert"] = self.api.conf.ssl["cert"]
+
+        if stream:
+            request_args["stream"] = True
+
+        # Add a body if we have one
+        if body:
+            request_args["data"] = body
+
+        return requests_method(url, **request_args)
+
+    def connection_pool(self, scheme, host, port):
+        session = self.api._session
+        if session is None:
+            return None
+
+        url = "{}://{}:{}/".format(scheme, host, port)
+        ssl = self.api.conf.ssl or {}
+        settings = session.merge_environment_settings(
+            url, {}, False, ssl.get("verify", True), ssl.get("cert", None)
+        )
+        proxies = settings["proxies"]
+        proxied = proxies.get(scheme.lower()) or proxies.get("all")
+        # Requests over a socket_path ignore proxies
+        if proxied and not self.api.conf.get("socket_path"):
+            return None
+
+        adapter = session.get_adapter(url)
+        if hasattr(adapter, "get_connection_with_tls_context"):
+            conn_pool = adapter.get_connection_with_tls_context(
+                requests.Request("GET", url).prepare(),
+                settings["verify"],
+                cert=settings["cert"],
+            )
+        else:
+            conn_pool = adapter.get_connection(url)
+        adapter.cert_verify(conn_pool, url, settings["verify"], settings["cert"])
+        return conn_pool
+
+
+class DirectTransport(TinTransport):
+    """Base for transports that send requests without requests, but prepare them
+    as requests would: with the same default headers, auth, query and body
+    encoding. The API's auth is applied directly for tin's own auth types, and
+    through a requests.PreparedRequest for any other.
+    """
+
+    def __init__(self, api):
+        super().__init__(api)
+        self._default_headers = None
+
+    @property
+    def pooled(self):
+        return True
+
+    def _settings(self):
+        """Returns the API's ssl verify and cert settings and socket path, as a
+        hashable key"""
+        ssl = self.api.conf.ssl or {}
+        return (
+            pool._hashable(ssl.get("verify", True)),
+            pool._hashable(ssl.get("cert", None)),
+            self.api.conf.get("socket_path"),
+        )
+
+    def _headers(self, headers):
+        """Merges call headers over requests' default ones, dropping any set to
+        None, as a requests session does"""
+        if self._default_headers is None:
+            self._default_headers = requests.utils.default_headers()
+        merged = urllib3._collections.HTTPHeaderDict(self._default_headers)
+        for name, value in headers.items():
+            if value is None:
+                merged.discard(name)
+            else:
+                merged[name] = value
+        return merged
+
+    def _body(self, body, headers):
+        """Encodes form data, and finds the length of files, as requests does"""
+        if isinstance(body, (dict, list, tuple)):
+            if "content-type" not in headers:
+                headers["Content-Type"] = "application/x-www-form-urlencoded"
+            return requests.models.RequestEncodingMixin._encode_params(body)
+        if hasattr(body, "read") and "content-length" not in headers:
+            length = requests.utils.super_len(body)
+            if length:
+                headers["Content-Length"] = str(length)
+        return body
+
+    def _auth(self, auth, method, url, headers, body):
+        """Applies auth to a request, returning its url, headers and body"""
+        from .auth import HTTPGenericHeaderAuth, HTTPGenericParameterAuth
+
+        if type(auth) is requests.auth.HTTPBasicAuth:
+            headers["Authorization"] = requests.auth._basic_auth_str(
+                auth.username, auth.password
+            )
+        elif type(auth) is HTTPGenericHeaderAuth:
+            headers.update(auth.headers)
+        elif type(auth) is HTTPGenericParameterAuth:
+            url = add_query(
+                url, requests.models.RequestEncodingMixin._encode_params(auth.params)
+            )
+        else:
+            prepared = requests.PreparedRequest()
+            prepared.prepare(
+                method=method, url=url, headers=dict(headers), data=body, auth=auth
+            )
+            url, headers, body = prepared.url, prepared.headers, prepared.body
+        return url, headers, body
+
+    def _prepare(self, method, url, query, headers, body):
+        """Returns the method, url, headers and body to send"""
+        method = method.upper()
+        url = add_query(url, query)
+        headers = self._headers(headers)
+        if body:
+            body = self._body(body, headers)
+        else:
+            body = None
+
+        if self.api.auth is not None:
+            url, headers, body = self._auth(self.api.auth, method, url, headers, body)
+        return method, url, headers, body
+
+    def _response(self, raw, status_code, reason, headers, url, start, stream):
+        """Returns a requests.Response, as the requests transport would, for a
+        response whose body is read from raw"""
+        response = requests.Response()
+        response.raw = raw
+        response.status_code = status_code
+        response.reason = reason
+        response.headers = requests.structures.CaseInsensitiveDict(headers)
+        response.encoding = requests.utils.get_encoding_from_headers(response.headers)
+        response.url = url
+        response.elapsed = datetime.timedelta(seconds=time.perf_counter() - start)
+
+        if not stream:
+            # Read now, which also puts the connection back in its pool
+            response.content
+        return response
+
+
+class Urllib3Transport(DirectTransport):
+    """Sends requests straight to a urllib3 PoolManager, skipping the work
+    requests does around each one, e.g. hooks, cookies, environment settings and
+    adapter lookups
+
+    Cookies aren't kept and proxies from the environment aren't used. Pools are
+    shared like the requests transport's, see tin.pool.
+    """
+
+    def __init__(self, api):
+        super().__init__(api)
+        self._manager = None
+        self._manager_key = None
+
+    def _pool_manager(self):
+        """Returns the pool manager for the API's current ssl settings"""
+        key = self._settings()
+        if key != self._manager_key:
+            socket_path = os.path.expanduser(key[2]) if key[2] else None
+            if self.api.conf.get("share_connections") is False:
+                self._manager = pool.new_pool_manager(key[0], key[1], socket_path)
+            else:
+                self._manager = pool.shared_pool_manager(key[0], key[1], socket_path)
+            self._manager_key = key
+        return self._manager
+
+    def _send(self, method, url, headers, body):
+        """Sends a request, raising requests' exceptions for urllib3's"""
+        exceptions = urllib3.exceptions
+        try:
+            return self._pool_manager().urlopen(
+                method,
+                url,
+                body=body,
+                headers=headers,
+                redirect=True,
+                retries=urllib3.Retry(
+                    total=None, connect=0, read=False, redirect=MAX_REDIRECTS
+                ),
+                preload_content=False,
+                decode_content=False,
+            )
+        except exceptions.MaxRetryError as e:
+            if isinstance(e.reason, exceptions.ConnectTimeoutError):
+                raise requests.exceptions.ConnectTimeout(e)
+            if isinstance(e.reason, exceptions.SSLError):
+                raise requests.exceptions.SSLError(e)
+            if isinstance(e.reason, exceptions.ResponseError):
+                raise requests.exceptions.TooManyRedirects(e)
+            raise requests.exceptions.ConnectionError(e)
+        except exceptions.SSLError as e:
+            raise requests.exceptions.SSLError(e)
+        except exceptions.ReadTimeoutError as e:
+            raise requests.exceptions.ReadTimeout(e)
+        except (exceptions.ProtocolError, OSError) as e:
+            raise requests.exceptions.ConnectionError(e)
+
+    def request(self, method, url, query, headers, body=None, stream=False):
+        method, url, headers, body = self._prepare(method, url, query, headers, body)
+
+        start = time.perf_counter()
+        raw = self._send(method, url, headers, body)
+
+        # Where redirects, if any, led
+        for redirect in getattr(raw.retries, "history", ()):
+            if redirect.redirect_location:
+                url = urllib.parse.urljoin(url, redirect.redirect_location)
+
+        return self._response(
+            raw, raw.status, raw.reason, raw.headers, url, start, stream
+        )
+
+    def connection_pool(self, scheme, host, port):
+        return self._pool_manager().connection_from_host(host, int(port), scheme)
+
+
+def http2_client(verify=True, cert=None, socket_path=None):
+    """Returns a new httpx client for the http2 transport, offering HTTP/2 and
+    HTTP/1.1 in ALPN, with the ssl settings' TLS context
+
+    Like requests, it has no timeouts, and uses neither proxies nor CA bundles
+    from the environment. It keeps no cookies, as it may be shared by APIs.
+
+    Args:
+        verify (bool|str): The ssl verify setting
+        cert (str|list|None): The ssl cert setting
+        socket_path (str|None): A Unix domain socket to connect over
+
+    Returns:
+        httpx.Client
+    """
+    import http.cookiejar
+
+    import httpx
+
+    # Imported here, as it imports requests
+    from .adapters import ssl_context
+
+    transport = httpx.HTTPTransport(
+        verify=ssl_context(verify, cert, alpn=("h2", "http/1.1")),
+        http2=True,
+        uds=socket_path,
+        trust_env=False,
+        limits=httpx.Limits(
+            max_connections=None,
+            max_keepalive_connections=requests.adapters.DEFAULT_POOLSIZE,
+        ),
+    )
+    return httpx.Client(
+        transport=transport,
+        cookies=http.cookiejar.CookieJar(
+            policy=http.cookiejar.DefaultCookiePolicy(allowed_domains=[])
+        ),
+        timeout=None,
+        follow_redirects=True,
+        max_redirects=MAX_REDIRECTS,
+        trust_env=False,
+    )
+
+
+class HTTP2StreamLocks(object):
+    """Locks, per origin, for opening HTTP/2 streams over one httpx client
+
+    httpcore takes a stream ID before it sends the headers that open the stream,
+    without a lock. Threads sharing a connection can then open streams out of
+    order, which servers take as a protocol error. Once an HTTP/2 connection to an
+    origin has been set up, each request to it holds the origin's lock until its
+    headers are sent. Connections are never set up under a lock, so a slow origin,
+    or a slow handshake, holds up no other requests.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._locks = {}
+
+    def lock(self, origin):
+        """Returns the origin's lock, or None if no HTTP/2 connection to it has
+        been set up yet"""
+        with self._lock:
+            return self._locks.get(origin, None)
+
+    def connected(self, origin):
+        """Notes that an HTTP/2 connection to the origin was set up"""
+        with self._lock:
+            self._locks.setdefault(origin, threading.Lock())
+
+
+class HTTP2Raw(object):
+    """The raw body of a response from the http2 transport, read as requests reads
+    urllib3's. Its http_version is the protocol the response came over."""
+
+    def __init__(self, response):
+        self._response = response
+        self.http_version = response.http_version
+
+    def stream(self, chunk_size=None, decode_content=True):
+        import httpx
+
+        try:
+            yield from self._response.iter_bytes(chunk_size)
+        except httpx.DecodingError as e:
+            raise requests.exceptions.ContentDecodingError(e)
+        except httpx.TimeoutException as e:
+            raise requests.exceptions.ConnectionError(e)
+        except httpx.TransportError as e:
+            raise requests.exceptions.ChunkedEncodingError(e)
+
+    def close(self):
+        self._response.close()
+
+
+class HTTP2Transport(DirectTransport):
+    """Sends requests with an httpx client, over HTTP/2 where the server offers it
+    in ALPN, and HTTP/1.1 otherwise
+
+    Requests made at once, e.g. pages fetched in parallel or calls from several
+    threads, share a single HTTP/2 connection per origin. HTTP/2 is only
+    negotiated over https, plain http calls use HTTP/1.1. Needs httpx with its
+    http2 extra, installed with tin's: pip install tin[http2].
+
+    Cookies aren't kept and proxies from the environment aren't used. Clients
+    are shared by APIs with the same ssl settings, unless share_connections is
+    off. There are no urllib3 pools for warm() to fill.
+    """
+
+    def __init__(self, api):
+        super().__init__(api)
+        try:
+            import h2  # noqa: F401
+            import httpx  # noqa: F401
+        except ImportError as e:
+            raise TinError(
+                "The http2 transport needs httpx[http2], install tin[http2]: "
+                "{}".format(e)
+            )
+        self._client = None
+        self._client_key = None
+
+    def _http2_client(self):
+        """Returns the httpx client for the API's current ssl settings"""
+        key = self._settings()
+        if key != self._client_key:
+            socket_path = os.path.expanduser(key[2]) if key[2] else None
+            if self.api.conf.get("share_connections") is False:
+                self._client = pool.new_http2_client(key[0], key[1], socket_path)
+            else:
+                self._client = pool.shared_http2_client(key[0], key[1], socket_path)
+            self._client_key = key
+        return self._client
+
+    def _send(self, method, url, headers, body):
+        """Sends a request, raising requests' exceptions for httpx's"""
+        import httpx
+
+        if isinstance(body, (bytearray, memoryview)):
+            body = bytes(body)
+
+        client = self._http2_client()
+        request = client.build_request(method, url, headers=headers, content=body)
+
+        with _stream_locks_lock:
+            stream_locks = _stream_locks.get(client, None)
+            if stream_locks is None:
+                stream_locks = _stream_locks[client] = HTTP2StreamLocks()
+        origin = (request.url.scheme, request.url.host, request.url.port)
+        lock = stream_locks.lock(origin)
+
+        # Held until the request's headers are sent, or it turns out a new
+        # connection is needed, as httpcore's trace extension reports. Requests
+        # made to follow redirects are traced too, but their origins may differ.
+        held = False
+        sent = False
+
+        def release():
+            nonlocal held
+            if held:
+                held = False
+                lock.release()
+
+        def trace(event, info):
+            nonlocal sent
+            if sent:
+                return
+            if event.startswith("connection.connect_"):
+                release()
+            elif event.endswith(".send_request_headers.complete"):
+                sent = True
+                release()
+                if lock is None and event.startswith("http2."):
+                    stream_locks.connected(origin)
+
+        request.extensions["trace"] = trace
+        if lock is not None:
+            lock.acquire()
+            held = True
+        try:
+            return client.send(request, stream=True)
+        except httpx.ConnectTimeout as e:
+            raise requests.exceptions.ConnectTimeout(e)
+        except httpx.ReadTimeout as e:
+            raise requests.exceptions.ReadTimeout(e)
+        except httpx.TooManyRedirects as e:
+            raise requests.exceptions.TooManyRedirects(e)
+        except httpx.TransportError as e:
+            raise requests.exceptions.ConnectionError(e)
+        finally:
+            release()
+
+    def request(self, method, url, query, headers, body=None, stream=False):
+        method, url, headers, body = self._prepare(method, url, query, headers, body)
+
+        start = time.perf_counter()
+        raw = self._send(method, url, headers, body)
+
+        return self._response(
+            HTTP2Raw(raw),
+            raw.status_code,
+            raw.reason_phrase,
+            raw.headers,
+            str(raw.url),
+            start,
+            stream,
+        )